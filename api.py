@@ -1,92 +1,349 @@
 """
 Server file for the Social News Site.
-Uses Flask to define endpoints to GET and POST stories as well as up/downvote
+Uses Flask to define endpoints to GET and POST stories as well as up/downvote.
+Importing it is cheap: the database is connected on the first request that
+needs it, and the scraper is imported when the first scrape runs.
 """
 # pylint: disable=unused-variable, import-error
-import sys
+import atexit
+import hmac
+import time
 from os import environ
-from urllib.error import URLError
-from urllib.request import urlopen
+from urllib.error import HTTPError, URLError
 
 from dotenv import load_dotenv
-from flask import current_app, Flask, jsonify, request, render_template_string
-from psycopg2 import connect, OperationalError
-from psycopg2.extensions import connection
-
-from news_scraper import (get_html,
-                          parse_stories_bs)
-from sql_methods import (delete_story,
-                         get_stories_data,
-                         insert_story,
-                         patch_story,
-                         update_score)
+from flask import abort, current_app, Flask, g, jsonify, request
+from psycopg2 import OperationalError
+
+from change_feed import ChangeFeed, CREATED, DELETED, UPDATED
+import columnar
+from circuit_breaker import CircuitBreaker
+from connection_pool import ConnectionPool, PoolConfigError, PoolTimeoutError
+from metrics import (CONTENT_TYPE,
+                     REGISTRY,
+                     REQUEST_DURATION,
+                     REQUEST_EXCEPTIONS,
+                     SCRAPE_FETCH_DURATION,
+                     SCRAPE_PARSE_DURATION,
+                     SCRAPE_STORIES)
+from response_cache import ResponseCache
+from scrape_jobs import (remaining_time,
+                         ScrapeError,
+                         ScrapeJobQueue,
+                         ScrapeQueueFullError,
+                         ScrapeTimeoutError)
+from slow_queries import SlowQueryLog
+from static_assets import (choose_encoding,
+                           compress,
+                           compress_stream,
+                           compressible,
+                           encodings,
+                           IDENTITY,
+                           IMMUTABLE,
+                           MIN_COMPRESS_SIZE,
+                           StaticAssets)
+from vote_buffer import VoteBuffer, VoteBufferFullError
+from page_fetcher import DEFAULT_CACHE_DIR, Page, PageFetcher
+from sql_methods import QUERIES
+from storage import create_storage
 
 VALID_URL = "https://www.bbc.co.uk/news"
 UPVOTE_DIRECTION = "up"
 UPVOTE_CHAR = 'u'
 DOWNVOTE_CHAR = 'd'
+DOWNVOTE_DIRECTION = "down"
+MAX_VOTE_BATCH = 1000
 ERROR_MSG = "error"
+UNREACHABLE_MSG = "Scrape target unreachable, try again later."
 HOST = "0.0.0.0"
 PORT = 5000
+DEFAULT_PAGE_SIZE = 50
+JSON_COMPRESS_LEVEL = {"br": 4, "gzip": 6}
+CHANGE_STREAM_KEEPALIVE = float(environ.get("CHANGE_STREAM_KEEPALIVE", 15))
+CHANGE_STREAM_RETRY_MS = 3000
+SORT_ALIASES = {"created": "created_at", "modified": "updated_at", "hot": "hot_score"}
+VOTE_SUBMIT_TIMEOUT = 0.1
 
 app = Flask(__name__)
 
 
-def check_internet_connection():
-    """Checks if API server is connected to internet and able to perform scraping."""
+load_dotenv()
+
+
+def database_config() -> dict:
+    """Returns the psycopg2 connection arguments from the environment."""
     try:
-        with urlopen('https://www.google.com/', timeout=10):
-            return True
-    except URLError:
-        return False
+        return {"user": environ["DATABASE_USERNAME"],
+                "password": environ["DATABASE_PASSWORD"],
+                "host": environ["DATABASE_IP"],
+                "port": environ["DATABASE_PORT"],
+                "database": environ["DATABASE_NAME"]}
+    except KeyError as err:
+        raise PoolConfigError(f"{err.args[0]} is not set.") from err
+
+
+def create_db_pool() -> ConnectionPool:
+    """Initialises the pool of DB connections shared by the request handlers.
+    Neither the environment nor the database is read until the first checkout,
+    and a database that is still starting up is retried with backoff."""
+    return ConnectionPool(
+        database_config,
+        min_size=int(environ.get("DATABASE_POOL_MIN", 1)),
+        max_size=int(environ.get("DATABASE_POOL_MAX", 10)),
+        timeout=float(environ.get("DATABASE_POOL_TIMEOUT", 5)),
+        lazy=True,
+        retries=int(environ.get("DATABASE_CONNECT_RETRIES", 3)),
+        retry_delay=float(environ.get("DATABASE_CONNECT_RETRY_DELAY", 0.2))
+    )
+
+
+STORAGE_BACKEND = environ.get("STORAGE_BACKEND", "postgres").lower()
+
+# This has to stay here for testing.
+pool = None
+if STORAGE_BACKEND == "postgres":
+    pool = create_db_pool()
 
+storage = create_storage(STORAGE_BACKEND, pool=pool, path=environ.get("STORAGE_PATH"))
 
-load_dotenv()
+slow_queries = SlowQueryLog(
+    threshold=float(environ.get("SLOW_QUERY_MS", 250)) / 1000,
+    capacity=int(environ.get("SLOW_QUERY_LOG_SIZE", 100)),
+    connection=(pool.connection if pool is not None
+                and environ.get("SLOW_QUERY_EXPLAIN", "1").lower() in ("1", "true", "yes")
+                else None),
+    explain_interval=float(environ.get("SLOW_QUERY_EXPLAIN_INTERVAL", 60)))
+QUERIES.slow_log = slow_queries
 
 
-def get_db_connection() -> connection:
-    """Initalises a DB connection to Pokemon db."""
-    try:
-        return connect(
-            user=environ["DATABASE_USERNAME"],
-            password=environ["DATABASE_PASSWORD"],
-            host=environ["DATABASE_IP"],
-            port=environ["DATABASE_PORT"],
-            database=environ["DATABASE_NAME"]
-        )
-    except OperationalError as err:
-        print(err)
-        print("Could not connect to DB.")
-        return None
+static_assets = StaticAssets(app.static_folder)
 
+with open(static_assets.directory / "page_not_found.html", encoding="utf-8") as template:
+    not_found_template = app.jinja_env.from_string(template.read())
 
-# This has to stay here for testing.
-conn = get_db_connection()
-if not conn:
-    sys.exit()
+
+story_cache = ResponseCache(max_entries=int(environ.get("STORIES_CACHE_SIZE", 256)),
+                            ttl=float(environ.get("STORIES_CACHE_TTL", 30)))
+
+
+change_feed = ChangeFeed(capacity=int(environ.get("CHANGE_FEED_SIZE", 1000)))
+
+
+def publish_stories(change: str, ids: list[int]) -> None:
+    """Adds the stored rows of the given stories to the change feed, so clients
+    get the new state without querying for it."""
+    rows = storage.get_stories(sorted(set(ids))) if ids else []
+    if isinstance(rows, list) and rows:
+        change_feed.publish([(change, row["id"], row) for row in rows])
+
+
+def flush_votes(votes: list[tuple[int, str]]) -> int:
+    """Writes a batch of buffered votes to the DB; returns how many were stored.
+    Raises on a failed write, so the buffer keeps the batch and retries it."""
+    res = storage.insert_votes(votes)
+    if ERROR_MSG in res:
+        raise RuntimeError(res["message"])
+    story_cache.invalidate()
+    publish_stories(UPDATED, [story_id for story_id, _ in votes])
+    return res["inserted"]
+
+
+vote_buffer = None
+if environ.get("VOTE_BUFFER_ENABLED", "").lower() in ("1", "true", "yes"):
+    vote_buffer = VoteBuffer(flush_votes,
+                             batch_size=int(environ.get("VOTE_BUFFER_BATCH_SIZE", 500)),
+                             flush_interval=int(environ.get("VOTE_BUFFER_FLUSH_MS", 50)) / 1000,
+                             max_size=int(environ.get("VOTE_BUFFER_MAX_SIZE", 10000)))
+    atexit.register(vote_buffer.close)
+
+
+def endpoint_label() -> str:
+    """Names the route that matched the request, keeping metric labels bounded."""
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+@app.before_request
+def start_request_timer() -> None:
+    """Notes when the request started, for the request duration histogram."""
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    """Records the request's duration by method, route and status."""
+    start = g.pop("request_start", None)
+    if start is not None:
+        REQUEST_DURATION.observe(time.perf_counter() - start, request.method,
+                                 endpoint_label(), str(response.status_code))
+    return response
+
+
+@app.teardown_request
+def record_exception(exception=None) -> None:
+    """Counts requests that ended in an unhandled exception."""
+    if exception is not None:
+        REQUEST_EXCEPTIONS.inc(1, request.method, endpoint_label())
+
+
+@app.after_request
+def compress_response(response):
+    """Compresses JSON and other text bodies according to Accept-Encoding.
+    Bodies from the stories cache are compressed once per coding and reused."""
+    return encode_response(response, request.accept_encodings, g.pop("encoded_bodies", None))
+
+
+def encode_response(response, accept, cached: dict | None = None):
+    """Compresses a response in the best coding in accept, the parsed
+    Accept-Encoding header. cached maps codings to bodies compressed earlier."""
+    if (response.direct_passthrough or response.is_streamed or response.content_encoding
+            or not compressible(response.mimetype)):
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.status_code in (204, 304) or response.content_length < MIN_COMPRESS_SIZE:
+        return response
+    encoding = choose_encoding(accept, encodings())
+    if encoding == IDENTITY:
+        return response
+
+    body = cached.get(encoding) if cached is not None else None
+    if body is None:
+        body = compress(response.get_data(), encoding, JSON_COMPRESS_LEVEL[encoding])
+        if cached is not None:
+            cached[encoding] = body
+    response.set_data(body)
+    response.content_encoding = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def send_asset(asset, cache_control: str):
+    """Sends an asset in the best coding the client accepts."""
+    encoding = choose_encoding(request.accept_encodings, asset.bodies)
+    response = current_app.response_class(asset.bodies[encoding], mimetype=asset.mimetype)
+    if encoding != IDENTITY:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(f"{asset.etag}-{encoding}")
+    response.headers["Cache-Control"] = cache_control
+    return response.make_conditional(request)
 
 
 @app.route("/", methods=["GET"])
 def index():
     """Gets root of server."""
-    return current_app.send_static_file("index.html")
+    return send_asset(static_assets.page("index.html"), "no-cache")
 
 
 @app.route("/add", methods=["GET"])
 def addstory():
     """Gets add story page."""
-    return current_app.send_static_file("./addstory/index.html")
+    return send_asset(static_assets.page("addstory/index.html"), "no-cache")
 
 
 @app.route("/scrape", methods=["GET"])
 def scrape():
     """Sends a scrape page to website."""
-    return current_app.send_static_file("./scrape/index.html")
+    return send_asset(static_assets.page("scrape/index.html"), "no-cache")
+
+
+@app.route("/assets/<path:url_path>", methods=["GET"])
+def get_asset(url_path: str):
+    """Sends a fingerprinted static file, which never changes under its URL."""
+    asset = static_assets.asset(url_path)
+    if asset is None:
+        abort(404)
+    return send_asset(asset, IMMUTABLE)
+
+
+scrape_breaker = CircuitBreaker(
+    failure_threshold=int(environ.get("SCRAPE_BREAKER_FAILURES", 3)),
+    reset_timeout=float(environ.get("SCRAPE_BREAKER_RESET", 30)))
+
+
+page_fetcher = PageFetcher(cache_dir=environ.get("SCRAPE_CACHE_DIR", DEFAULT_CACHE_DIR) or None)
+
+
+def get_page(url: str, timeout: float, page_fetcher: PageFetcher) -> Page:
+    """Fetches a page with news_scraper, which is only imported once a scrape runs."""
+    # pylint: disable=import-outside-toplevel, redefined-outer-name
+    import news_scraper
+    return news_scraper.get_page(url, timeout=timeout, page_fetcher=page_fetcher)
+
+
+def parse_page(url: str, page: Page) -> list[tuple[str, str]]:
+    """Parses the stories on a fetched page with news_scraper."""
+    # pylint: disable=import-outside-toplevel
+    import news_scraper
+    return news_scraper.parse_page(url, page)
+
+
+def fetch_page(url: str, deadline: float) -> Page:
+    """Fetches a page through the scrape circuit breaker, recording whether the
+    target could be reached."""
+    timeout = remaining_time(deadline)
+    if not scrape_breaker.allow_request():
+        raise ScrapeError(UNREACHABLE_MSG)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        page = get_page(url, timeout=timeout, page_fetcher=page_fetcher)
+        outcome = "not_modified" if page.not_modified else "fetched"
+    except HTTPError as err:
+        if err.code >= 500:
+            scrape_breaker.record_failure(f"HTTP {err.code}")
+        else:
+            scrape_breaker.record_success()
+        raise ScrapeError(f"Could not fetch page: HTTP {err.code}") from err
+    except URLError as err:
+        scrape_breaker.record_failure(str(err.reason))
+        if isinstance(err.reason, TimeoutError):
+            raise ScrapeTimeoutError("Timed out fetching page.") from err
+        raise ScrapeError(f"Could not fetch page: {err.reason}") from err
+    except OSError as err:
+        scrape_breaker.record_failure(str(err) or type(err).__name__)
+        if isinstance(err, TimeoutError):
+            raise ScrapeTimeoutError("Timed out fetching page.") from err
+        raise ScrapeError(f"Could not fetch page: {err}") from err
+    except Exception:
+        scrape_breaker.record_success()
+        raise
+    finally:
+        SCRAPE_FETCH_DURATION.observe(time.perf_counter() - start, outcome)
+    scrape_breaker.record_success()
+    return page
+
+
+def run_scrape(url: str, deadline: float) -> dict:
+    """Fetches, parses and stores the stories for one scrape job on a worker thread."""
+    page = fetch_page(url, deadline)
+    remaining_time(deadline)
+    start = time.perf_counter()
+    scraped_data = parse_page(url, page)
+    SCRAPE_PARSE_DURATION.observe(time.perf_counter() - start)
+    remaining_time(deadline)
+
+    res = storage.insert_stories(scraped_data)
+    story_cache.invalidate()
+    if ERROR_MSG in res:
+        raise ScrapeError(res["message"])
+    publish_stories(CREATED, res.get("ids", []))
+    SCRAPE_STORIES.inc(len(scraped_data), "found")
+    SCRAPE_STORIES.inc(res["inserted"], "inserted")
+    SCRAPE_STORIES.inc(res["skipped"], "skipped")
+    return {"found": len(scraped_data), "inserted": res["inserted"], "skipped": res["skipped"]}
+
+
+scrape_jobs = ScrapeJobQueue(run_scrape,
+                             workers=int(environ.get("SCRAPE_WORKERS", 2)),
+                             timeout=float(environ.get("SCRAPE_TIMEOUT", 30)),
+                             max_pending=int(environ.get("SCRAPE_MAX_PENDING", 100)))
 
 
 @app.route("/scrape", methods=["POST"])
 def scrape_post() -> tuple[dict, int]:
-    """Scrapes stories from BBC news website and adds to stories."""
+    """Queues a scrape of a BBC news page; poll the returned status URL for the result."""
     data = request.json
     if not "url" in data:
         return jsonify({"error": True, "message": "Request must contain URL"}), 400
@@ -95,31 +352,137 @@ def scrape_post() -> tuple[dict, int]:
     if VALID_URL not in url:
         return jsonify({"error": True, "message": f"URL must start with {VALID_URL}"}), 400
 
-    if not check_internet_connection():
-        return jsonify({"error": True, "message": "API not connected to internet."}), 400
-    html = get_html(url)
-    scraped_data = parse_stories_bs(url, html)
+    if scrape_breaker.is_open():
+        return jsonify({"error": True, "message": UNREACHABLE_MSG,
+                        "retry_after": scrape_breaker.stats()["retry_after"]}), 503
 
-    for story in scraped_data:
-        insert_story(conn, story[0], story[1])
+    try:
+        job = scrape_jobs.submit(url)
+    except ScrapeQueueFullError:
+        return jsonify({"error": True, "message": "Too many scrapes queued, try again later."}), 503
 
-    return jsonify({"message": "successful"}), 200
+    return jsonify({"message": "queued",
+                    "job_id": job.id,
+                    "status_url": f"/scrape/{job.id}"}), 202
+
+
+@app.route("/scrape/health", methods=["GET"])
+def get_scrape_health() -> tuple[dict, int]:
+    """Returns the circuit breaker state for the scrape target."""
+    return jsonify(scrape_breaker.stats()), 200
+
+
+@app.route("/scrape/stats", methods=["GET"])
+def get_scrape_fetch_stats() -> tuple[dict, int]:
+    """Returns request, revalidation and transfer counts for scrape fetches."""
+    return jsonify(page_fetcher.stats()), 200
+
+
+@app.route("/scrape/<job_id>", methods=["GET"])
+def get_scrape_job(job_id: str) -> tuple[dict, int]:
+    """Returns the state, timings and story counts of a scrape job."""
+    job = scrape_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": True, "message": "Scrape job not found."}), 404
+    return jsonify(job), 200
 
 
 @app.route("/stories", methods=["GET"])
 def get_stories() -> tuple[dict, int]:
-    """Returns all stories stored on the server."""
-
-    args = request.args.to_dict()
+    """Returns all stories stored on the server.
+    Passing limit and/or cursor returns a single page along with the next cursor.
+    Responses are cached until the next write and carry an ETag for conditional requests."""
+
+    listing = story_listing(request.args)
+    if listing is None:
+        return jsonify({"error": True, "message": "Limit must be a number"}), 400
+    search, sort, order, limit, cursor = listing
+
+    response_format = request.args.get("format", "").lower()
+    if response_format == "columnar":
+        return columnar_stories(search, sort, order, limit, cursor)
+    if response_format not in ("", "rows"):
+        return jsonify({"error": True, "message": "Format must be rows or columnar"}), 400
+
+    cached = story_cache.get_or_compute(
+        story_cache_key(*listing), lambda: query_stories(search, sort, order, limit, cursor))
+    response = current_app.response_class(cached.body, status=cached.status,
+                                          mimetype="application/json")
+    g.encoded_bodies = cached.encoded
+    if cached.status == 200:
+        response.set_etag(cached.etag)
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+    return response
+
+
+def story_listing(args) -> tuple[str, str, bool, int | None, str | None] | None:
+    """Reads (search, sort, order, limit, cursor) from the GET /stories query
+    string. limit is None unless a page was asked for; returns None if the
+    limit is not a number."""
     search = args.get("search", "")
-    sort = args.get("sort").lower()
-    order = args.get("order").lower() == "descending"
-    sort = "created_at" if sort == "created" else "updated_at" if sort == "modified" else sort
-
-    res = get_stories_data(conn, search, sort, order)
+    sort = args.get("sort", "").lower()
+    order = args.get("order", "").lower() == "descending"
+    sort = SORT_ALIASES.get(sort, sort)
+
+    limit = None
+    if "limit" in args or "cursor" in args:
+        try:
+            limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return None
+    return search, sort, order, limit, args.get("cursor")
+
+
+def story_cache_key(search: str, sort: str, order: bool,
+                    limit: int | None, cursor: str | None) -> tuple:
+    """Normalizes a listing into its key in the stories cache."""
+    return search.lower(), sort, order, limit, cursor
+
+
+def columnar_stories(search: str, sort: str, order: bool,
+                     limit: int | None, cursor: str | None):
+    """Streams GET /stories?format=columnar, compressing it on the fly when the
+    client accepts it. These bodies are not kept in the response cache."""
+    fields = {}
+    if limit is None:
+        res = storage.list_story_columns(search, sort, order)
+    else:
+        res = storage.list_stories_page(search, sort, order, limit, cursor)
+        if ERROR_MSG not in res:
+            columns, rows = columnar.from_dicts(res["stories"])
+            fields["next_cursor"] = res["next_cursor"]
+            res = {"columns": columns, "rows": rows}
+    if ERROR_MSG in res:
+        return jsonify(res), 404 if res["message"] == "No stories were found" else 400
+
+    body = columnar.encode(res["columns"], res["rows"], **fields)
+    encoding = choose_encoding(request.accept_encodings, encodings())
+    if encoding != IDENTITY:
+        body = compress_stream(body, encoding, JSON_COMPRESS_LEVEL[encoding])
+    response = current_app.response_class(body, mimetype="application/json")
+    if encoding != IDENTITY:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def query_stories(search: str, sort: str, order: bool,
+                  limit: int | None, cursor: str | None) -> tuple[bytes, int]:
+    """Queries the stories for GET /stories and serializes them for the response cache."""
+    if limit is None:
+        res = storage.list_stories(search, sort, order)
+    else:
+        res = storage.list_stories_page(search, sort, order, limit, cursor)
+    return story_body(res)
+
+
+def story_body(res: list | dict) -> tuple[bytes, int]:
+    """Serializes a story listing, or the error in its place, with its status."""
+    status = 200
     if ERROR_MSG in res:
-        return jsonify(res), 404
-    return jsonify(res), 200
+        status = 404 if res["message"] == "No stories were found" else 400
+    return app.json.response(res).get_data(), status
 
 
 @app.route("/stories", methods=["POST"])
@@ -130,9 +493,14 @@ def post_stories() -> tuple[dict, int]:
     if not ("url" in data and "title" in data) or not data["url"] or not data["title"]:
         return jsonify({"error": True, "message": "Request must contain URL & title"}), 500
 
-    res = insert_story(conn, data["url"], data["title"])
+    res = storage.insert_story(data["url"], data["title"])
+    story_cache.invalidate()
+    if res.get("duplicate"):
+        return jsonify({"error": True, "message": res["message"], "id": res["id"]}), 409
     if ERROR_MSG in res:
         return jsonify({"message": "Request not successful"}), 500
+    if "id" in res:
+        publish_stories(CREATED, [res["id"]])
     return jsonify({"message": "Success"}), 200
 
 
@@ -144,13 +512,68 @@ def update_stories_votes(id_num: int) -> tuple[dict, int]:
         return jsonify({"error": True, "message": "Request must contain if it is up or down"}, 500)
 
     direction_char = UPVOTE_CHAR if data["direction"] == UPVOTE_DIRECTION else DOWNVOTE_CHAR
-    res = update_score(conn, id_num, direction_char)
+    if vote_buffer is not None:
+        try:
+            vote_buffer.submit(id_num, direction_char, timeout=VOTE_SUBMIT_TIMEOUT)
+        except VoteBufferFullError:
+            return jsonify({"error": True, "message": "Too many votes queued, try again later."}), 503
+        return jsonify({"message": "accepted"}), 202
+
+    res = storage.vote(id_num, direction_char)
+    story_cache.invalidate()
     if ERROR_MSG in res:
         return jsonify({"message": res["message"]}), 404
+    publish_stories(UPDATED, [id_num])
 
     return jsonify({"message": "successful"}), 200
 
 
+@app.route("/votes", methods=["POST"])
+def post_votes() -> tuple[dict, int]:
+    """Applies a batch of {story_id, direction} votes in one transaction and
+    returns a result for each entry, in the same order.
+    Votes sent this way are written straight away, even with the vote buffer on."""
+    data = request.json
+    votes = data.get("votes") if isinstance(data, dict) else None
+    if not isinstance(votes, list) or not votes:
+        return jsonify({"error": True, "message": "Request must contain a list of votes"}), 400
+    if len(votes) > MAX_VOTE_BATCH:
+        return jsonify({"error": True,
+                        "message": f"At most {MAX_VOTE_BATCH} votes per request"}), 400
+
+    results = []
+    batch = []
+    for entry in votes:
+        story_id = entry.get("story_id") if isinstance(entry, dict) else None
+        direction = entry.get("direction") if isinstance(entry, dict) else None
+        if (not isinstance(story_id, int) or isinstance(story_id, bool)
+                or direction not in (UPVOTE_DIRECTION, DOWNVOTE_DIRECTION)):
+            results.append({"story_id": story_id, "error": True, "message": "Invalid vote"})
+            continue
+        results.append({"story_id": story_id})
+        batch.append((story_id, UPVOTE_CHAR if direction == UPVOTE_DIRECTION else DOWNVOTE_CHAR))
+
+    res = storage.apply_votes(batch)
+    if ERROR_MSG in res:
+        return jsonify({"error": True, "message": res["message"]}), 409
+    if batch:
+        story_cache.invalidate()
+        publish_stories(UPDATED, [story_id for (story_id, _), found
+                                  in zip(batch, res["found"]) if found])
+
+    found = iter(res["found"])
+    for result in results:
+        if ERROR_MSG in result:
+            continue
+        if next(found):
+            result["success"] = True
+        else:
+            result.update({"error": True, "message": "Incorrect ID."})
+    applied = sum(1 for result in results if "success" in result)
+    return jsonify({"results": results, "applied": applied,
+                    "failed": len(results) - applied}), 200
+
+
 @app.route("/stories/<int:num_id>", methods=["PATCH"])
 def patch_story_data(num_id: int) -> tuple[dict, int]:
     """Patches the values stored at the title/url key for a specific story."""
@@ -159,9 +582,11 @@ def patch_story_data(num_id: int) -> tuple[dict, int]:
     if not data["url"] and not data["title"]:
         return {"error": True, "message": "Request must contain URL and/or title."}, 500
 
-    res = patch_story(conn, num_id, data["url"], data["title"])
+    res = storage.patch_story(num_id, data["url"], data["title"])
+    story_cache.invalidate()
     if ERROR_MSG in res:
         return jsonify({"message": "Not successful"}), 404
+    publish_stories(UPDATED, [num_id])
     return jsonify({"message": "Successful"}), 200
 
 
@@ -169,16 +594,166 @@ def patch_story_data(num_id: int) -> tuple[dict, int]:
 def delete_story_data(num_id: int) -> tuple[dict, int]:
     """Deletes a story from the API."""
 
-    res = delete_story(conn, num_id)
+    res = storage.delete_story(num_id)
+    story_cache.invalidate()
     if ERROR_MSG in res:
         return jsonify({"message": "Not successful"}), 404
+    change_feed.publish([(DELETED, num_id, None)])
     return jsonify({"message": "successful"}), 200
 
 
+@app.route("/stories/changes", methods=["GET"])
+def get_story_changes() -> tuple[dict, int]:
+    """Returns the latest change to each story created, updated, re-scored or
+    deleted since the since token, with the token to pass next time.
+    Without since, only the current token is returned. An expired token gets
+    410, and the client should reload the stories."""
+    since = request.args.get("since")
+    if not since:
+        return jsonify({"token": change_feed.token(), "changes": []}), 200
+    changes = change_feed.since(since)
+    if changes is None:
+        return jsonify({"error": True,
+                        "message": "Change token expired, reload the stories."}), 410
+    return jsonify(changes), 200
+
+
+@app.route("/stories/events", methods=["GET"])
+def stream_story_changes():
+    """Streams the changes from GET /stories/changes as server-sent events,
+    starting at Last-Event-ID or since. A reset event means the token expired."""
+    token = (request.headers.get("Last-Event-ID") or request.args.get("since")
+             or change_feed.token())
+    encoder = current_app.json
+
+    def events(token: str):
+        yield f"retry: {CHANGE_STREAM_RETRY_MS}\n\n"
+        while True:
+            changes = change_feed.wait(token, CHANGE_STREAM_KEEPALIVE)
+            if changes is None:
+                yield "event: reset\ndata: {}\n\n"
+                return
+            if not changes["changes"]:
+                yield ": keepalive\n\n"
+                continue
+            token = changes["token"]
+            yield f"id: {token}\nevent: changes\ndata: {encoder.dumps(changes)}\n\n"
+
+    response = current_app.response_class(events(token), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/pool/stats", methods=["GET"])
+def get_pool_stats() -> tuple[dict, int]:
+    """Returns usage statistics for the DB connection pool."""
+    if pool is None:
+        return jsonify({"error": True,
+                        "message": f"The {STORAGE_BACKEND} backend has no connection pool."}), 404
+    return jsonify(pool.stats()), 200
+
+
+@app.route("/storage/stats", methods=["GET"])
+def get_storage_stats() -> tuple[dict, int]:
+    """Returns the configured storage backend and its usage statistics."""
+    return jsonify(storage.stats()), 200
+
+
+@app.route("/stories/changes/stats", methods=["GET"])
+def get_change_feed_stats() -> tuple[dict, int]:
+    """Returns the size and position of the change feed."""
+    return jsonify(change_feed.stats()), 200
+
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats() -> tuple[dict, int]:
+    """Returns hit/miss statistics for the GET /stories response cache."""
+    return jsonify(story_cache.stats()), 200
+
+
+@app.route("/votes/buffer/stats", methods=["GET"])
+def get_vote_buffer_stats() -> tuple[dict, int]:
+    """Returns queue and flush metrics for the write-behind vote buffer."""
+    if vote_buffer is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **vote_buffer.stats()}), 200
+
+
+def admin_authorized() -> bool:
+    """Checks the bearer token against ADMIN_TOKEN. Admin routes expose query
+    parameters and plans, so without a token they stay closed unless
+    ADMIN_OPEN=1 opens them explicitly, for local development."""
+    token = environ.get("ADMIN_TOKEN")
+    if not token:
+        return environ.get("ADMIN_OPEN") == "1"
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+@app.route("/admin/slow-queries", methods=["GET"])
+def get_slow_queries() -> tuple[dict, int]:
+    """Returns the most recent slow queries, newest first, with their plans."""
+    if not admin_authorized():
+        return jsonify({"error": True, "message": "Unauthorized"}), 401
+    try:
+        limit = int(request.args.get("limit", slow_queries.capacity))
+    except ValueError:
+        return jsonify({"error": True, "message": "Limit must be a number"}), 400
+    return jsonify({**slow_queries.stats(), "queries": slow_queries.recent(limit)}), 200
+
+
+@app.route("/admin/slow-queries/<int:entry_id>", methods=["GET"])
+def get_slow_query(entry_id: int) -> tuple[dict, int]:
+    """Returns one captured slow query."""
+    if not admin_authorized():
+        return jsonify({"error": True, "message": "Unauthorized"}), 401
+    entry = slow_queries.get(entry_id)
+    if entry is None:
+        return jsonify({"error": True, "message": "Slow query not found."}), 404
+    return jsonify(entry), 200
+
+
+@app.route("/healthz", methods=["GET"])
+def get_health() -> tuple[dict, int]:
+    """Tells whether the process is up, without touching the database."""
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route("/readyz", methods=["GET"])
+def get_readiness() -> tuple[dict, int]:
+    """Tells whether the storage backend can serve requests, connecting to the
+    database if that has not happened yet."""
+    res = storage.ping()
+    if ERROR_MSG in res:
+        return jsonify({"status": "unavailable", "backend": STORAGE_BACKEND,
+                        "message": res["message"]}), 503
+    return jsonify({"status": "ready", "backend": STORAGE_BACKEND}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Returns request, query and scrape metrics in the Prometheus text format."""
+    return current_app.response_class(REGISTRY.render(), mimetype=None,
+                                      content_type=CONTENT_TYPE)
+
+
+@app.errorhandler(PoolTimeoutError)
+def pool_timeout(error):
+    """Tells the client to retry when every DB connection is busy."""
+    return jsonify({"error": True, "message": "Database busy, try again later."}), 503
+
+
+@app.errorhandler(PoolConfigError)
+@app.errorhandler(OperationalError)
+def database_unavailable(error):
+    """Tells the client to retry when the database cannot be reached."""
+    return jsonify({"error": True, "message": "Database unavailable, try again later."}), 503
+
+
 @app.errorhandler(404)
 def page_not_found(error):
-    with open("./static/page_not_found.html", "r", encoding="utf-8") as f:
-        return render_template_string(f.read().format(error)), 404
+    """Sends the not found page, compiled once at startup."""
+    return not_found_template.render(error=error), 404
 
 
 if __name__ == "__main__":
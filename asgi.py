@@ -0,0 +1,319 @@
+"""Asyncio entry point for the API, for serving under an ASGI server:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+The routes that take the most traffic or are held open the longest run on
+the event loop. With the Postgres backend, GET /stories and story votes query
+the database through async_db, so a slow query waits on a socket rather than
+occupying a thread. GET /stories/events waits for changes without holding a
+thread at all, whatever the backend. Every other request, and any case these
+handlers leave to Flask (other formats, bad input, the vote buffer), is run
+by the Flask app from api.py on a thread pool of ASGI_THREADS threads, so
+all of the routes behave the same as under app.run. Scrapes already run on
+the scrape job workers, so POST /scrape never waits on the target site."""
+# pylint: disable=import-error
+
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+
+from psycopg2 import OperationalError
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request, Response
+
+import api
+import async_db
+from change_feed import UPDATED
+from connection_pool import PoolConfigError, PoolTimeoutError
+from metrics import REQUEST_DURATION, REQUEST_EXCEPTIONS
+
+ASGI_THREADS = int(environ.get("ASGI_THREADS", 32))
+EXECUTOR_COMPRESS_SIZE = 64 * 1024
+
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi-wsgi")
+
+db_pool = None
+
+
+def get_db_pool() -> async_db.AsyncConnectionPool:
+    """Returns the async connection pool, creating it on first use inside the loop."""
+    global db_pool  # pylint: disable=global-statement
+    if db_pool is None:
+        db_pool = async_db.AsyncConnectionPool(
+            api.database_config,
+            max_size=int(environ.get("DATABASE_POOL_MAX", 10)),
+            timeout=float(environ.get("DATABASE_POOL_TIMEOUT", 5)))
+    return db_pool
+
+
+def json_response(obj, status: int = 200) -> Response:
+    """Serializes obj the same way as flask.jsonify."""
+    response = api.app.json.response(obj)
+    response.status_code = status
+    return response
+
+
+async def get_stories(request: Request) -> Response | None:
+    """GET /stories for the rows format, cached and conditional like the Flask route."""
+    listing = api.story_listing(request.args)
+    if listing is None or request.args.get("format", "").lower() not in ("", "rows"):
+        return None
+    search, sort, order, limit, cursor = listing
+
+    async def compute() -> tuple[bytes, int]:
+        async with get_db_pool().connection() as conn:
+            if limit is None:
+                res = await async_db.get_stories_data(conn, search, sort, order)
+            else:
+                res = await async_db.get_stories_page(conn, search, sort, order, limit, cursor)
+        return await asyncio.get_running_loop().run_in_executor(executor, api.story_body, res)
+
+    cached = await api.story_cache.get_or_compute_async(api.story_cache_key(*listing), compute)
+    response = Response(cached.body, status=cached.status, mimetype="application/json")
+    if cached.status == 200:
+        response.set_etag(cached.etag)
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+    if response.status_code == 200 and len(cached.body) >= EXECUTOR_COMPRESS_SIZE:
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, api.encode_response, response, request.accept_encodings, cached.encoded)
+    return api.encode_response(response, request.accept_encodings, cached.encoded)
+
+
+async def update_stories_votes(request: Request, id_num: int) -> Response | None:
+    """POST /stories/<id>/votes written straight to the database."""
+    data = request.get_json(silent=True)
+    if api.vote_buffer is not None or not isinstance(data, dict) or "direction" not in data:
+        return None
+    direction_char = (api.UPVOTE_CHAR if data["direction"] == api.UPVOTE_DIRECTION
+                      else api.DOWNVOTE_CHAR)
+
+    async with get_db_pool().connection() as conn:
+        res = await async_db.update_score(conn, id_num, direction_char)
+        api.story_cache.invalidate()
+        if api.ERROR_MSG in res:
+            return json_response({"message": res["message"]}, 404)
+        rows = await async_db.get_stories_by_id(conn, [id_num])
+    if isinstance(rows, list) and rows:
+        api.change_feed.publish([(UPDATED, row["id"], row) for row in rows])
+    return json_response({"message": "successful"})
+
+
+async def stream_story_changes(request: Request, receive, send) -> int:
+    """GET /stories/events, woken by the change feed instead of a blocked thread."""
+    token = (request.headers.get("Last-Event-ID") or request.args.get("since")
+             or api.change_feed.token())
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def notify():
+        loop.call_soon_threadsafe(changed.set)
+
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                            (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no")]})
+    api.change_feed.subscribe(notify)
+    gone = asyncio.ensure_future(disconnected())
+    try:
+        await send_event(send, f"retry: {api.CHANGE_STREAM_RETRY_MS}\n\n")
+        while True:
+            changed.clear()
+            changes = api.change_feed.since(token)
+            if changes is None:
+                await send_event(send, "event: reset\ndata: {}\n\n")
+                break
+            if changes["changes"]:
+                token = changes["token"]
+                await send_event(send, f"id: {token}\nevent: changes\n"
+                                       f"data: {api.app.json.dumps(changes)}\n\n")
+                continue
+            woken = asyncio.ensure_future(changed.wait())
+            done, _ = await asyncio.wait({woken, gone}, timeout=api.CHANGE_STREAM_KEEPALIVE,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            if gone in done:
+                break
+            if woken not in done:
+                await send_event(send, ": keepalive\n\n")
+        if not gone.done():
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        gone.cancel()
+        api.change_feed.unsubscribe(notify)
+    return 200
+
+
+async def send_event(send, event: str) -> None:
+    """Sends one server-sent event and keeps the response open."""
+    await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+
+
+DATABASE_HANDLERS = {"get_stories": get_stories,
+                     "update_stories_votes": update_stories_votes}
+STREAM_HANDLERS = {"stream_story_changes": stream_story_changes}
+
+
+def wsgi_environ(scope: dict, body: bytes) -> dict:
+    """Builds the WSGI environ for an ASGI HTTP request."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ_ = {"REQUEST_METHOD": scope["method"],
+                "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+                "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+                "QUERY_STRING": scope["query_string"].decode("latin-1"),
+                "SERVER_NAME": server[0],
+                "SERVER_PORT": str(server[1]),
+                "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+                "REMOTE_ADDR": client[0],
+                "wsgi.version": (1, 0),
+                "wsgi.url_scheme": scope.get("scheme", "http"),
+                "wsgi.input": io.BytesIO(body),
+                "wsgi.errors": sys.stderr,
+                "wsgi.multithread": True,
+                "wsgi.multiprocess": False,
+                "wsgi.run_once": False}
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = value.decode("latin-1")
+        environ_[name] = f"{environ_[name]},{value}" if name in environ_ else value
+    if body:
+        # The body has been read in full, whether or not it was sent chunked.
+        environ_["CONTENT_LENGTH"] = str(len(body))
+    return environ_
+
+
+async def send_response(response: Response, environ_: dict, send) -> int:
+    """Sends a werkzeug response built on the loop."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = int(status.split(" ", 1)[0]), headers
+
+    body = b"".join(response(environ_, start_response))
+    await send({"type": "http.response.start", "status": started["status"],
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                            for name, value in started["headers"]]})
+    await send({"type": "http.response.body", "body": body})
+    return started["status"]
+
+
+async def call_flask(environ_: dict, send) -> int:
+    """Runs the Flask app on the thread pool, streaming what it returns."""
+    loop = asyncio.get_running_loop()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = int(status.split(" ", 1)[0]), headers
+
+    def first_chunk():
+        chunks = iter(api.app.wsgi_app(environ_, start_response))
+        return chunks, next(chunks, None)
+
+    chunks, chunk = await loop.run_in_executor(executor, first_chunk)
+    try:
+        await send({"type": "http.response.start", "status": started["status"],
+                    "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                for name, value in started["headers"]]})
+        while True:
+            following = (None if chunk is None
+                         else await loop.run_in_executor(executor, next, chunks, None))
+            if following is None:
+                await send({"type": "http.response.body", "body": chunk or b""})
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = following
+    finally:
+        if hasattr(chunks, "close"):
+            await loop.run_in_executor(executor, chunks.close)
+    return started["status"]
+
+
+async def read_body(receive) -> bytes:
+    """Reads the whole request body."""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    return bytes(body)
+
+
+async def lifespan(receive, send) -> None:
+    """Handles server startup and shutdown."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if db_pool is not None:
+                db_pool.close()
+            executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    """The ASGI application."""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    start = time.perf_counter()
+    body = await read_body(receive)
+    environ_ = wsgi_environ(scope, body)
+    try:
+        rule, args = api.app.url_map.bind_to_environ(environ_).match(return_rule=True)
+    except HTTPException:
+        rule, args = None, {}
+    handler = None
+    if rule is not None:
+        handler = STREAM_HANDLERS.get(rule.endpoint)
+        if handler is None and api.STORAGE_BACKEND == "postgres":
+            handler = DATABASE_HANDLERS.get(rule.endpoint)
+    if handler is None:
+        await call_flask(environ_, send)
+        return
+
+    request = Request(environ_)
+    status = 500
+    try:
+        if rule.endpoint in STREAM_HANDLERS:
+            status = await handler(request, receive, send)
+            return
+        try:
+            response = await handler(request, **args)
+        except PoolTimeoutError:
+            response = json_response({"error": True,
+                                      "message": "Database busy, try again later."}, 503)
+        except (OperationalError, PoolConfigError):
+            response = json_response({"error": True,
+                                      "message": "Database unavailable, try again later."}, 503)
+        if response is None:
+            # Flask records its own metrics for the requests it handles.
+            status = None
+            await call_flask({**environ_, "wsgi.input": io.BytesIO(body)}, send)
+            return
+        status = await send_response(response, environ_, send)
+    except Exception:
+        REQUEST_EXCEPTIONS.inc(1, scope["method"], rule.rule)
+        raise
+    finally:
+        if status is not None:
+            REQUEST_DURATION.observe(time.perf_counter() - start, scope["method"], rule.rule,
+                                     str(status))
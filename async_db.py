@@ -0,0 +1,197 @@
+"""Non-blocking Postgres access for the asyncio entry point in asgi.py.
+Connections are opened in psycopg2's asynchronous mode, where every call only
+starts the work and conn.poll() says whether the driver is waiting to read or
+to write the socket. The event loop watches the socket instead of a thread
+sitting in the call, so a slow query holds a connection but no thread.
+The statements are the QueryRegistry statements the threaded handlers run,
+prepared once per connection, and asynchronous connections are always in
+autocommit mode, which suits these single-statement queries."""
+# pylint: disable=import-error
+
+import asyncio
+import time
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+
+from psycopg2 import connect, OperationalError
+from psycopg2.extensions import connection, POLL_OK, POLL_READ, POLL_WRITE
+from psycopg2.extras import RealDictCursor, RealDictRow
+
+from connection_pool import PoolClosedError, PoolTimeoutError, resolve
+from metrics import QUERY_ERRORS
+import sql_methods
+from sql_methods import QUERIES
+
+
+async def wait(conn: connection) -> None:
+    """Drives an asynchronous connection until its current operation is done."""
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == POLL_OK:
+            return
+        if state not in (POLL_READ, POLL_WRITE):
+            raise OperationalError(f"Unexpected poll state {state}")
+        ready = loop.create_future()
+        fileno = conn.fileno()
+        watch, unwatch = ((loop.add_reader, loop.remove_reader) if state == POLL_READ
+                          else (loop.add_writer, loop.remove_writer))
+        watch(fileno, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            unwatch(fileno)
+
+
+async def execute(cur, name: str, params: tuple = (), **choices) -> None:
+    """Runs a registered query on a cursor of an asynchronous connection,
+    like QueryRegistry.execute."""
+    query = QUERIES.queries[name]
+    statement, text = QUERIES.statement(query, choices)
+    conn = cur.connection
+    start = time.perf_counter()
+    try:
+        prepare = QUERIES.prepare_command(conn, query, statement, text)
+        if prepare is not None:
+            cur.execute(prepare)
+            await wait(conn)
+            QUERIES.mark_prepared(conn, statement)
+        cur.execute(*QUERIES.execute_command(query, statement, text, params))
+        await wait(conn)
+    except Exception:
+        QUERY_ERRORS.inc(1, "postgres", name)
+        raise
+    QUERIES.record(query, statement, text, params, time.perf_counter() - start, cur.rowcount)
+
+
+async def fetch(conn: connection, name: str, params: tuple = (), **choices) -> list[RealDictRow]:
+    """Runs a registered query and returns all of its rows as dicts."""
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        await execute(cur, name, params, **choices)
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+
+class AsyncConnectionPool:
+    """Keeps up to max_size asynchronous connections for one event loop.
+    Connections are opened on demand; one that is broken, or still busy because
+    its caller was cancelled mid-query, is closed instead of being reused.
+    connect_kwargs may be a callable returning the arguments, as for ConnectionPool."""
+
+    def __init__(self, connect_kwargs: dict | Callable[[], dict], max_size: int = 10, timeout: float = 5.0):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self.max_size = max_size
+        self.timeout = timeout
+        self._connect_kwargs = connect_kwargs
+        self._slots = asyncio.Semaphore(max_size)
+        self._idle = []
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._checkouts = 0
+        self._checkout_timeouts = 0
+        self._discarded = 0
+
+    @asynccontextmanager
+    async def connection(self):
+        """Checks a connection out for the body of an async with block."""
+        if self._closed:
+            raise PoolClosedError("Connection pool is closed.")
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._checkout_timeouts += 1
+            raise PoolTimeoutError(
+                f"No connection available after {self.timeout} seconds.") from None
+
+        conn = None
+        try:
+            conn = self._idle.pop() if self._idle else await self._connect()
+            self._in_use += 1
+            self._checkouts += 1
+            try:
+                yield conn
+            finally:
+                self._in_use -= 1
+                self._putconn(conn)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the pool's size and usage."""
+        return {"max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "checkout_timeouts": self._checkout_timeouts,
+                "discarded": self._discarded}
+
+    def close(self) -> None:
+        """Closes every idle connection; busy ones are closed as they are returned."""
+        self._closed = True
+        while self._idle:
+            self._idle.pop().close()
+            self._size -= 1
+
+    async def _connect(self) -> connection:
+        """Opens a new connection without blocking the loop."""
+        conn = connect(async_=1, **resolve(self._connect_kwargs))
+        try:
+            await wait(conn)
+        except BaseException:
+            conn.close()
+            raise
+        self._size += 1
+        return conn
+
+    def _putconn(self, conn: connection) -> None:
+        """Returns a connection to the idle list, or closes it if it cannot be reused."""
+        if conn.closed or conn.isexecuting() or self._closed:
+            if not conn.closed:
+                conn.close()
+            self._size -= 1
+            self._discarded += 1
+            return
+        self._idle.append(conn)
+
+
+async def get_stories_data(conn: connection,
+                           search: str, sort: str, order: bool) -> list[RealDictRow] | dict:
+    """Gets all stories, like sql_methods.get_stories_data."""
+    query = sql_methods.stories_query(search, sort, order)
+    if "error" in query:
+        return query
+    rows = await fetch(conn, "get_stories", query["params"], **query["choices"])
+    if not rows:
+        return {"error": True, "message": "No stories were found"}
+    return rows
+
+
+async def get_stories_page(conn: connection, search: str, sort: str, order: bool,
+                           limit: int, cursor: str | None = None) -> dict:
+    """Gets one page of stories, like sql_methods.get_stories_page."""
+    query = sql_methods.page_query(search, sort, order, limit, cursor)
+    if "error" in query:
+        return query
+    rows = await fetch(conn, "get_stories_page", query["params"], **query["choices"])
+    return sql_methods.page_result(rows, sort, order, limit, cursor)
+
+
+async def get_stories_by_id(conn: connection, ids: list[int]) -> list[RealDictRow] | dict:
+    """Gets the stories with the given ids, like sql_methods.get_stories_by_id."""
+    if not isinstance(ids, list) or not all(isinstance(id_num, int) for id_num in ids):
+        return {"error": True, "message": "Invalid argument type(s)"}
+    if not ids:
+        return []
+    return await fetch(conn, "get_stories_by_id", (ids,))
+
+
+async def update_score(conn: connection, id_num: int, to_add: str) -> dict[bool, str]:
+    """Records a vote and adjusts the story's score, like sql_methods.update_score."""
+    if not isinstance(id_num, int) or not isinstance(to_add, str):
+        return {"error": True, "message": "Invalid argument type(s)"}
+    return sql_methods.vote_result(await fetch(conn, "update_score", (id_num, to_add)))
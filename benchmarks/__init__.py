@@ -0,0 +1,2 @@
+"""Performance benchmarks for the Social News Site.
+Run a module directly, e.g. python -m benchmarks.bench_search"""
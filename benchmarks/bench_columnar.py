@@ -0,0 +1,93 @@
+"""Compares the row and columnar formats of GET /stories.
+For each size, the same stories are serialized the way GET /stories does it
+(jsonify of dict rows with HTTP-date timestamps) and the way
+format=columnar does it (tuples with epoch timestamps, encoded in chunks).
+Reported are the best time and the raw and gzipped body size. With a database
+configured, the Postgres queries behind each format are timed as well, in a
+scratch schema that is dropped afterwards.
+Usage: python -m benchmarks.bench_columnar [--sizes 10000,50000]
+"""
+# pylint: disable=import-error
+
+import argparse
+import gzip
+
+from flask import Flask, jsonify
+from psycopg2 import connect
+from psycopg2.extras import RealDictRow
+
+import columnar
+import sql_methods
+from benchmarks.common import format_seconds, scratch_database, time_call
+from benchmarks.run import make_stories
+
+SCHEMA = "columnar_benchmark"
+
+
+def serializers(size: int) -> dict:
+    """Returns the functions building each format's body for size stories."""
+    stories = make_stories(size)
+    for story in stories:
+        story["hot_score"] = sql_methods.hot_score(story["score"], story["created_at"])
+    rows = [RealDictRow(story) for story in stories]
+    columns, values = columnar.from_dicts(stories)
+    return {"rows": lambda: jsonify(rows).get_data(),
+            "columnar": lambda: b"".join(columnar.encode(columns, values))}
+
+
+def queries(conn) -> dict:
+    """Returns the functions querying and serializing the stored stories in each format."""
+    def rows():
+        return jsonify(sql_methods.get_stories_data(conn, "", "score", True)).get_data()
+
+    def columns():
+        res = sql_methods.get_stories_columns(conn, "", "score", True)
+        return b"".join(columnar.encode(res["columns"], res["rows"]))
+
+    return {"rows": rows, "columnar": columns}
+
+
+def report(title: str, cases: dict, repeat: int) -> None:
+    """Times each case and prints its time and body sizes."""
+    print(f"\n{title}")
+    print(f"  {'format':10}{'best':>12}{'bytes':>12}{'gzipped':>12}")
+    for name, func in cases.items():
+        body = func()
+        best = time_call(func, repeat=repeat)["best"]
+        print(f"  {name:10}{format_seconds(best):>12}{len(body):>12,}"
+              f"{len(gzip.compress(body, 6)):>12,}")
+
+
+def main():
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,50000", help="comma separated story counts")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    with Flask(__name__).app_context():
+        for size in sizes:
+            report(f"{size} stories, serialization only", serializers(size), args.repeat)
+
+        with scratch_database(SCHEMA) as config:
+            if config is None:
+                print("\nNo DATABASE_* environment configured, queries skipped.")
+                return
+            conn = connect(**config)
+            try:
+                loaded = 0
+                for size in sizes:
+                    sql_methods.insert_stories(conn, [
+                        (f"https://bench.example/{i}", story["title"])
+                        for i, story in enumerate(make_stories(size)[loaded:], loaded)])
+                    loaded = size
+                    report(f"{size} stories, query and serialization", queries(conn),
+                           args.repeat)
+            finally:
+                conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compares the log-structured FileStore with the whole-file file_methods backend.
+file_methods reads and rewrites all of stories.json per operation, so its cost
+grows with the data; FileStore appends one log record per write.
+Usage: python -m benchmarks.bench_file_store [--sizes 1000,10000] [--fsync interval]
+"""
+# pylint: disable=import-error
+
+import argparse
+import os
+import tempfile
+
+import file_methods
+from benchmarks.common import format_seconds, make_titles, time_call
+from file_store import FSYNC_POLICIES, FileStore
+
+
+def file_methods_add(title: str) -> None:
+    """Adds a story the way the file backend does: read, append, rewrite."""
+    stories = file_methods.get_stories_from_json("r")
+    stories.append(file_methods.create_story_dict(stories[-1]["id"] + 1, title, "https://b.com"))
+    file_methods.write_to_json(stories)
+
+
+def run(sizes: list[int], fsync: str) -> list[dict]:
+    """Times add, get_max_id and search on both backends at each dataset size."""
+    results = []
+    for size in sizes:
+        titles = make_titles(size)
+        with tempfile.TemporaryDirectory() as directory:
+            file_methods.STORIES_FILE = os.path.join(directory, "legacy.json")
+            file_methods.write_to_json([file_methods.create_story_dict(i + 1, title, "https://a.com")
+                                        for i, title in enumerate(titles)])
+            store = FileStore(os.path.join(directory, "stories.json"), fsync=fsync)
+            for title in titles:
+                store.add_story(title, "https://a.com")
+            store.compact()
+
+            print(f"\n{size} stories (fsync={fsync})")
+            operations = {
+                "add_story": (lambda: file_methods_add("Benchmark story"),
+                              lambda: store.add_story("Benchmark story", "https://b.com")),
+                "get_max_id": (file_methods.get_max_id, store.get_max_id),
+                "search": (lambda: file_methods.get_stories_data("crisis", "", False),
+                           lambda: store.get_stories_data("crisis", "", False)),
+            }
+            for label, (legacy, logged) in operations.items():
+                old = time_call(legacy, repeat=3, number=5)["best"]
+                new = time_call(logged, repeat=3, number=50)["best"]
+                print(f"  {label:12} file_methods {format_seconds(old):>10}  "
+                      f"file_store {format_seconds(new):>10}  x{old / new:.0f}  "
+                      f"({1 / new:,.0f} ops/s)")
+                results.append({"size": size, "operation": label,
+                                "file_methods": old, "file_store": new})
+            store.close()
+    return results
+
+
+def main():
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated dataset sizes")
+    parser.add_argument("--fsync", default="interval", choices=FSYNC_POLICIES,
+                        help="FileStore fsync policy")
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(",")], args.fsync)
+
+
+if __name__ == "__main__":
+    main()
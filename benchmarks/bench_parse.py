@@ -0,0 +1,54 @@
+"""Compares the anchor-only story parser against the BeautifulSoup one.
+Each saved page is parsed by news_scraper.parse_stories and parse_stories_bs,
+after checking that both return the same stories.
+Usage: python -m benchmarks.bench_parse [--fixtures tests/fixtures] [--copies 1,4]
+"""
+# pylint: disable=import-error
+
+import argparse
+from pathlib import Path
+
+from benchmarks.common import format_seconds, time_call
+from news_scraper import parse_stories, parse_stories_bs
+
+DEFAULT_FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+DOMAIN = "https://www.bbc.co.uk"
+
+
+def run(paths: list[Path], copies: list[int]) -> list[dict]:
+    """Times both parsers on every fixture, optionally repeated to make bigger pages."""
+    results = []
+    for path in paths:
+        page = path.read_text(encoding="utf-8")
+        for count in copies:
+            html = page * count
+            stories = parse_stories(DOMAIN, html)
+            assert stories == parse_stories_bs(DOMAIN, html), f"{path.name}: outputs differ"
+            fast = time_call(lambda: parse_stories(DOMAIN, html), repeat=5)
+            soup = time_call(lambda: parse_stories_bs(DOMAIN, html), repeat=5)
+            print(f"  {path.name} x{count} ({len(html) // 1024}KiB, {len(stories)} stories)  "
+                  f"bs4 {format_seconds(soup['best']):>10}  "
+                  f"anchors {format_seconds(fast['best']):>10}  "
+                  f"x{soup['best'] / fast['best']:.1f}")
+            results.append({"fixture": path.name, "copies": count,
+                            "bs4": soup["best"], "anchors": fast["best"]})
+    return results
+
+
+def main():
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES,
+                        help="directory of saved HTML pages")
+    parser.add_argument("--copies", default="1,4",
+                        help="comma separated number of times to repeat each page")
+    args = parser.parse_args()
+    paths = sorted(args.fixtures.glob("*.html"))
+    if not paths:
+        parser.error(f"no .html fixtures in {args.fixtures}")
+
+    run(paths, [int(count) for count in args.copies.split(",")])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Measures the per-call saving of prepared statements over inlined queries.
+Each query is run with its parameters inlined as literals, so Postgres parses
+and plans it on every call as sql_methods used to, and then through the query
+registry's PREPARE/EXECUTE. Everything runs in one transaction that is rolled back.
+Usage: python -m benchmarks.bench_queries [--calls 500]
+"""
+# pylint: disable=import-error
+
+import argparse
+from itertools import count, cycle
+
+from benchmarks.common import database_config, format_seconds, time_call
+from sql_methods import QUERIES
+
+
+def cases(story_ids: list[int]) -> dict:
+    """Returns, per query, a function building the arguments for the next call."""
+    urls = count()
+    stories = cycle(story_ids)
+    return {
+        "insert_story": lambda: (("insert_story",
+                                  (f"https://bench.example/{next(urls)}", "Benchmark story")), {}),
+        "update_score": lambda: (("update_score", (next(stories), "u")), {}),
+        "get_stories_data": lambda: (("get_stories", ("%crisis%",)),
+                                     {"sort": "created_at", "order": "desc"}),
+    }
+
+
+def run(calls: int) -> list[dict]:
+    """Times every query both ways on one connection."""
+    # pylint: disable=import-outside-toplevel
+    from psycopg2 import connect
+
+    config = database_config()
+    if config is None:
+        print("No DATABASE_* environment configured.")
+        return []
+
+    conn = connect(**config)
+    cur = conn.cursor()
+    results = []
+    try:
+        cur.execute("SELECT id FROM stories")
+        story_ids = [row[0] for row in cur.fetchall()]
+        if not story_ids:
+            print("The stories table is empty; seed it first.")
+            return []
+
+        for label, next_call in cases(story_ids).items():
+            def inline():
+                args, choices = next_call()
+                cur.execute(QUERIES.sql(cur, *args, **choices))
+                cur.fetchall()
+
+            def prepared():
+                args, choices = next_call()
+                QUERIES.execute(cur, *args, **choices)
+                cur.fetchall()
+
+            prepared()
+            # Alternate the two so table growth inside the transaction hits both alike.
+            plain, fast = [], []
+            for _ in range(5):
+                plain.append(time_call(inline, repeat=1, number=calls)["best"])
+                fast.append(time_call(prepared, repeat=1, number=calls)["best"])
+            saving = min(plain) - min(fast)
+            print(f"  {label:18} inline {format_seconds(min(plain)):>10}  "
+                  f"prepared {format_seconds(min(fast)):>10}  "
+                  f"saves {'-' if saving < 0 else ''}{format_seconds(abs(saving))}/call")
+            results.append({"query": label, "inline": min(plain), "prepared": min(fast)})
+    finally:
+        conn.rollback()
+        conn.close()
+    return results
+
+
+def main():
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=500, help="calls per timing run")
+    args = parser.parse_args()
+    run(args.calls)
+
+
+if __name__ == "__main__":
+    main()
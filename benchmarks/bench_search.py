@@ -0,0 +1,116 @@
+"""Compares title search through the trigram index against a full scan.
+The scan is what file_methods.get_stories_data used to do per request; with --sql
+the ILIKE query is also timed in Postgres with and without the pg_trgm index.
+Usage: python -m benchmarks.bench_search [--sizes 10000,100000,1000000] [--sql]
+"""
+# pylint: disable=import-error
+
+import argparse
+import io
+import time
+
+from benchmarks.common import database_config, format_seconds, make_titles, time_call
+from search_index import TitleIndex
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+SEARCH_TERMS = ("crisis", "bank deal", "#4321", "wa")
+
+
+def scan_search(stories: list[dict], term: str) -> list[dict]:
+    """The unindexed search: lowercases and scans every title."""
+    return [s for s in stories if term.lower() in s["title"].lower()]
+
+
+def index_search(stories_by_id: dict, index: TitleIndex, term: str) -> list[dict]:
+    """The indexed search, including the lookup of the matching stories."""
+    return [stories_by_id[id_num] for id_num in index.search(term)]
+
+
+def run_python(sizes: list[int]) -> list[dict]:
+    """Times both in-process search paths at each dataset size."""
+    results = []
+    for size in sizes:
+        stories = [{"id": i, "title": title} for i, title in enumerate(make_titles(size))]
+        stories_by_id = {s["id"]: s for s in stories}
+        start = time.perf_counter()
+        index = TitleIndex(stories)
+        print(f"\n{size} stories (index built in {format_seconds(time.perf_counter() - start)})")
+
+        for term in SEARCH_TERMS:
+            scan = time_call(lambda: scan_search(stories, term), repeat=3)
+            indexed = time_call(lambda: index_search(stories_by_id, index, term), repeat=3)
+            assert len(scan_search(stories, term)) == len(index.search(term))
+            print(f"  {term!r:12} scan {format_seconds(scan['best']):>10}  "
+                  f"index {format_seconds(indexed['best']):>10}  "
+                  f"x{scan['best'] / indexed['best']:.1f}")
+            results.append({"size": size, "term": term,
+                            "scan": scan["best"], "index": indexed["best"]})
+    return results
+
+
+def run_sql(sizes: list[int]) -> None:
+    """Times the ILIKE search in a temporary Postgres table, before and after
+    adding the trigram index from migration 003."""
+    # pylint: disable=import-outside-toplevel
+    from psycopg2 import connect, Error
+
+    config = database_config()
+    if config is None:
+        print("\nSkipping SQL benchmark: no DATABASE_* environment configured.")
+        return
+
+    conn = connect(**config)
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        has_trgm = True
+    except Error as err:
+        print(f"\npg_trgm unavailable, only timing the sequential scan: {err}")
+        has_trgm = False
+
+    for size in sizes:
+        cur.execute("DROP TABLE IF EXISTS bench_stories")
+        cur.execute("CREATE TEMP TABLE bench_stories (id SERIAL PRIMARY KEY, title TEXT NOT NULL)")
+        cur.copy_from(io.StringIO("\n".join(make_titles(size)) + "\n"),
+                      "bench_stories", columns=("title",))
+        cur.execute("ANALYZE bench_stories")
+        print(f"\n{size} stories in Postgres")
+
+        timings = {}
+        for label in ("ilike", "trigram"):
+            if label == "trigram":
+                if not has_trgm:
+                    break
+                cur.execute("CREATE INDEX ON bench_stories USING gin (title gin_trgm_ops)")
+                cur.execute("ANALYZE bench_stories")
+            for term in SEARCH_TERMS:
+                timings[label, term] = time_call(lambda: (
+                    cur.execute("SELECT id FROM bench_stories WHERE title ILIKE %s",
+                                (f"%{term}%",)),
+                    cur.fetchall()), repeat=3)["best"]
+
+        for term in SEARCH_TERMS:
+            line = f"  {term!r:12} ilike {format_seconds(timings['ilike', term]):>10}"
+            if ("trigram", term) in timings:
+                line += f"  trigram {format_seconds(timings['trigram', term]):>10}"
+            print(line)
+    conn.close()
+
+
+def main():
+    """Parses the command line and runs the requested benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated dataset sizes")
+    parser.add_argument("--sql", action="store_true", help="also benchmark Postgres ILIKE")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    run_python(sizes)
+    if args.sql:
+        run_sql(sizes)
+
+
+if __name__ == "__main__":
+    main()
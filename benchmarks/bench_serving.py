@@ -0,0 +1,222 @@
+"""Compares the threaded Flask server (app.run) with the ASGI entry point
+(uvicorn asgi:app) at high concurrency.
+Both servers are started against a scratch schema seeded with --stories
+stories. A load generator built on asyncio then keeps --connections
+keep-alive connections busy for --duration seconds with a mix of requests:
+cheap reads of the first page sorted by hot, votes (which invalidate the
+stories cache, so the next reads query the database again) and slow
+searches for random words, which scan the whole table and are never cached.
+Reported are the throughput and the latency percentiles of each kind of
+request, along with any responses that failed, such as 503s when the
+database pool was exhausted.
+Usage: python -m benchmarks.bench_serving [--connections 200] [--duration 10]
+                                          [--stories 20000] [--mix 80,10,10]
+                                          [--servers threaded,asgi]
+"""
+# pylint: disable=import-error
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from psycopg2 import connect
+
+import sql_methods
+from benchmarks.common import format_seconds, make_titles, scratch_database
+
+SCHEMA = "serving_benchmark"
+ROOT = Path(__file__).resolve().parent.parent
+SERVERS = {"threaded": ["-m", "flask", "--app", "api", "run", "--with-threads",
+                        "--host", "127.0.0.1", "--port", "{port}"],
+           "asgi": ["-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", "{port}",
+                    "--log-level", "warning", "--no-access-log"]}
+KINDS = ("read", "vote", "search")
+
+
+def free_port() -> int:
+    """Returns a port nothing is listening on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed(config: dict, size: int) -> list[int]:
+    """Inserts size stories into the scratch schema and returns their ids."""
+    conn = connect(**config)
+    try:
+        titles = make_titles(size)
+        for start in range(0, size, 10_000):
+            sql_methods.insert_stories(conn, [(f"https://bench.example/{i}", titles[i])
+                                              for i in range(start, min(start + 10_000, size))])
+        cur = conn.cursor()
+        cur.execute("ANALYZE stories")
+        cur.execute("SELECT id FROM stories")
+        ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        return ids
+    finally:
+        conn.close()
+
+
+def start_server(name: str, schema: str) -> tuple[subprocess.Popen, int]:
+    """Starts one server on a free port and waits until it answers."""
+    port = free_port()
+    env = {**os.environ, "PGOPTIONS": f"-c search_path={schema}",
+           "SLOW_QUERY_MS": "60000", "STORAGE_BACKEND": "postgres"}
+    command = [sys.executable] + [part.format(port=port) for part in SERVERS[name]]
+    process = subprocess.Popen(command, cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with urlopen(f"http://127.0.0.1:{port}/storage/stats", timeout=1):
+                return process, port
+        except (URLError, OSError):
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"The {name} server did not start.")
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple[int, bool]:
+    """Reads one HTTP/1.1 response and returns its status code and whether
+    the server keeps the connection open."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get("connection", "").lower() != "close"
+
+
+def make_request(kind: str, ids: list[int], rng: random.Random) -> bytes:
+    """Builds the raw request for one kind of work."""
+    if kind == "read":
+        return (b"GET /stories?sort=hot&order=descending&limit=20 HTTP/1.1\r\n"
+                b"Host: bench\r\nAccept-Encoding: gzip\r\n\r\n")
+    if kind == "vote":
+        body = b'{"direction": "up"}'
+        return (f"POST /stories/{rng.choice(ids)}/votes HTTP/1.1\r\nHost: bench\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+                .encode("latin-1") + body)
+    word = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=8))
+    return (f"GET /stories?search={word}&sort=title HTTP/1.1\r\nHost: bench\r\n\r\n"
+            .encode("latin-1"))
+
+
+async def client(port: int, kinds: list[str], ids: list[int], deadline: float,
+                 results: dict, seed_value: int) -> None:
+    """Sends requests over one keep-alive connection until the deadline."""
+    rng = random.Random(seed_value)
+    reader = writer = None
+    while time.monotonic() < deadline:
+        kind = rng.choice(kinds)
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(make_request(kind, ids, rng))
+            status, keep_alive = await read_response(reader)
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            status = None
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+        elapsed = time.perf_counter() - start
+        if status is not None and (status < 400 or status == 404):
+            results[kind].append(elapsed)
+        else:
+            results["failed"][str(status)] = results["failed"].get(str(status), 0) + 1
+    if writer is not None:
+        writer.close()
+
+
+async def load(port: int, connections: int, duration: float, mix: list[int],
+               ids: list[int]) -> dict:
+    """Runs the load generator against one server."""
+    kinds = [kind for kind, weight in zip(KINDS, mix) for _ in range(weight)]
+    results = {**{kind: [] for kind in KINDS}, "failed": {}}
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(client(port, kinds, ids, deadline, results, number)
+                           for number in range(connections)))
+    return results
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Returns the value below which fraction of the sorted values fall."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(name: str, results: dict, duration: float) -> None:
+    """Prints throughput and latency percentiles for one server."""
+    total = sum(len(results[kind]) for kind in KINDS)
+    failed = sum(results["failed"].values())
+    print(f"\n{name}: {total / duration:,.0f} requests/s, {failed} failed"
+          + (f" {results['failed']}" if failed else ""))
+    print(f"  {'kind':8}{'count':>9}{'p50':>11}{'p95':>11}{'p99':>11}{'max':>11}")
+    for kind in KINDS:
+        values = sorted(results[kind])
+        if not values:
+            continue
+        print(f"  {kind:8}{len(values):>9,}"
+              f"{format_seconds(statistics.median(values)):>11}"
+              f"{format_seconds(percentile(values, 0.95)):>11}"
+              f"{format_seconds(percentile(values, 0.99)):>11}"
+              f"{format_seconds(values[-1]):>11}")
+
+
+def main():
+    """Parses the command line and benchmarks each server in turn."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=200, help="concurrent connections")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per server")
+    parser.add_argument("--stories", type=int, default=20_000, help="stories to seed")
+    parser.add_argument("--mix", default="80,10,10", help="weights of read,vote,search")
+    parser.add_argument("--servers", default=",".join(SERVERS), help="servers to compare")
+    args = parser.parse_args()
+    mix = [int(weight) for weight in args.mix.split(",")]
+
+    with scratch_database(SCHEMA) as config:
+        if config is None:
+            print("No DATABASE_* environment configured, nothing to serve.")
+            return
+        ids = seed(config, args.stories)
+        print(f"{len(ids):,} stories, {args.connections} connections, "
+              f"{args.duration:g}s per server, mix read/vote/search {args.mix}")
+        for name in args.servers.split(","):
+            process, port = start_server(name, SCHEMA)
+            try:
+                results = asyncio.run(load(port, args.connections, 1, mix, ids))
+                results = asyncio.run(load(port, args.connections, args.duration, mix, ids))
+            finally:
+                process.terminate()
+                process.wait(10)
+            report(name, results, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Measures how long a fresh process takes to import the API and to serve
+its first requests.
+Each run starts a new interpreter that imports api, then sends GET /healthz
+(no database), GET /readyz (the first database connection), a first page of
+GET /stories (the first query, which is prepared on that connection) and
+finally imports the scraper, as the first scrape would. The phases are
+timed inside the child, and the whole process is timed from outside.
+Usage: python -m benchmarks.bench_startup [--repeat 10]
+"""
+# pylint: disable=import-error
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.common import format_seconds
+
+ROOT = Path(__file__).resolve().parent.parent
+PHASES = ("import", "healthz", "readyz", "first_stories", "import_scraper")
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import api
+timings = {"import": time.perf_counter() - start}
+client = api.app.test_client()
+for phase, path in (("healthz", "/healthz"), ("readyz", "/readyz"),
+                    ("first_stories", "/stories?limit=50")):
+    start = time.perf_counter()
+    status = client.get(path).status_code
+    timings[phase] = time.perf_counter() - start
+    timings[phase + "_status"] = status
+start = time.perf_counter()
+import news_scraper
+timings["import_scraper"] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+
+def run_once() -> dict:
+    """Starts one child process and returns its phase timings and total time."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, capture_output=True,
+                            text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    """Parses the command line, runs the children and prints the medians."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10, help="processes to start")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.repeat)]
+    print(f"{args.repeat} cold starts")
+    print(f"  {'phase':16}{'best':>12}{'median':>12}  status")
+    for phase in (*PHASES, "process"):
+        values = [run[phase] for run in runs]
+        statuses = sorted({str(run[phase + "_status"]) for run in runs
+                           if phase + "_status" in run})
+        print(f"  {phase:16}{format_seconds(min(values)):>12}"
+              f"{format_seconds(statistics.median(values)):>12}  {','.join(statuses)}")
+
+
+if __name__ == "__main__":
+    main()
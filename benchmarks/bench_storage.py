@@ -0,0 +1,115 @@
+"""Compares per-operation latency of the storage backends.
+Each backend is loaded with the same stories and then timed on the operations
+the API performs. Postgres runs in a scratch schema that is dropped afterwards,
+and is left out when no DATABASE_* environment is configured.
+Usage: python -m benchmarks.bench_storage [--size 10000] [--backends file,sqlite,postgres]
+"""
+# pylint: disable=import-error
+
+import argparse
+import os
+import tempfile
+from contextlib import contextmanager
+from itertools import count, cycle
+
+from benchmarks.common import format_seconds, make_titles, scratch_database, time_call
+from connection_pool import ConnectionPool
+from file_store import FileStore
+from storage import BACKENDS, FileStorage, PostgresStorage, SQLiteStorage
+
+SCHEMA = "storage_benchmark"
+
+
+@contextmanager
+def postgres_storage():
+    """Yields a PostgresStorage on a scratch schema, or None without a database."""
+    with scratch_database(SCHEMA) as config:
+        if config is None:
+            yield None
+            return
+        pool = ConnectionPool(config)
+        try:
+            yield PostgresStorage(pool)
+        finally:
+            pool.close()
+
+
+@contextmanager
+def open_backend(name: str, directory: str):
+    """Yields the named backend storing its data under directory."""
+    if name == "postgres":
+        with postgres_storage() as storage:
+            yield storage
+        return
+    storage = (FileStorage(FileStore(os.path.join(directory, "stories.json")))
+               if name == "file" else SQLiteStorage(os.path.join(directory, "stories.db")))
+    try:
+        yield storage
+    finally:
+        storage.close()
+
+
+def operations(storage, story_ids: list[int]) -> dict:
+    """Returns the operations to time, each a function making one call."""
+    urls = count()
+    stories = cycle(story_ids)
+    votes = [(story_id, "u") for story_id in story_ids[:100]]
+    page = storage.list_stories_page("", "score", True, 50)
+    return {
+        "list": lambda: storage.list_stories("", "score", True),
+        "search": lambda: storage.list_stories("crisis", "created_at", True),
+        "page": lambda: storage.list_stories_page("", "score", True, 50),
+        "next_page": lambda: storage.list_stories_page("", "score", True, 50,
+                                                       page["next_cursor"]),
+        "insert": lambda: storage.insert_story(f"https://bench.example/new/{next(urls)}",
+                                               "Benchmark story"),
+        "vote": lambda: storage.vote(next(stories), "u"),
+        "votes_x100": lambda: storage.apply_votes(votes),
+        "patch": lambda: storage.patch_story(next(stories), "", "Patched benchmark story"),
+        "delete": lambda: storage.delete_story(next(stories)),
+    }
+
+
+def run(size: int, backends: list[str], number: int) -> list[dict]:
+    """Loads size stories into each backend and times every operation."""
+    titles = make_titles(size)
+    seed = [(f"https://bench.example/{i}", title) for i, title in enumerate(titles)]
+    timings = {}
+    for name in backends:
+        with tempfile.TemporaryDirectory() as directory, \
+                open_backend(name, directory) as storage:
+            if storage is None:
+                print(f"{name}: no DATABASE_* environment configured, skipped.")
+                continue
+            storage.insert_stories(seed)
+            story_ids = [row["id"] for row in storage.list_stories("", "", False)]
+            for label, operation in operations(storage, story_ids).items():
+                # Reads that return every story are far slower; time fewer of them.
+                calls = max(1, number // 20) if label in ("list", "search") else number
+                timings.setdefault(label, {})[name] = time_call(
+                    operation, repeat=3, number=calls)["best"]
+
+    measured = [name for name in backends if any(name in row for row in timings.values())]
+    print(f"\n{size} stories, best seconds per call")
+    print(f"  {'operation':12}" + "".join(f"{name:>12}" for name in measured))
+    results = []
+    for label, row in timings.items():
+        print(f"  {label:12}" + "".join(f"{format_seconds(row[name]):>12}" for name in measured))
+        results += [{"size": size, "operation": label, "backend": name, "seconds": row[name]}
+                    for name in measured]
+    return results
+
+
+def main():
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=10000, help="stories loaded per backend")
+    parser.add_argument("--backends", default=",".join(BACKENDS),
+                        help="comma separated backends to compare")
+    parser.add_argument("--number", type=int, default=200, help="calls per timing run")
+    args = parser.parse_args()
+    run(args.size, args.backends.split(","), args.number)
+
+
+if __name__ == "__main__":
+    main()
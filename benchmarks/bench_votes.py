@@ -0,0 +1,153 @@
+"""Compares the flat votes table with the monthly partitioned one from
+migration 006, before and after compaction.
+Both layouts are seeded with the same --stories stories and --votes votes
+spread over the past year. Reported are the cost of recording votes, of
+deleting a story (an explicit DELETE of its votes on the flat table, the
+ON DELETE CASCADE on the partitioned one), of compacting the closed months
+into vote_rollups, and of detaching a partition, which only changes the
+catalog and so takes the same time however many votes it holds. Scores are
+checked against the raw votes and rollups with reconcile_scores after
+compaction, which must find no drift.
+Usage: python -m benchmarks.bench_votes [--stories 5000] [--votes 500000]
+"""
+# pylint: disable=import-error
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from psycopg2 import connect
+
+import sql_methods
+from benchmarks.common import format_seconds, make_titles, scratch_database
+
+FLAT_DELETE = ("WITH deleted_votes AS (DELETE FROM votes WHERE story_id = %s) "
+               "DELETE FROM stories WHERE id = %s RETURNING *")
+SEED_VOTES = """
+INSERT INTO votes (story_id, vote, created_at)
+SELECT s.ids[1 + floor(random() * array_length(s.ids, 1))::int]
+     , CASE WHEN random() < 0.7 THEN 'u' ELSE 'd' END
+     , NOW()::timestamp - random() * INTERVAL '365 days'
+  FROM (SELECT array_agg(id) AS ids FROM stories) AS s
+     , generate_series(1, %s);
+
+UPDATE stories AS s
+   SET score = t.score
+  FROM (SELECT story_id, SUM(CASE WHEN vote = 'u' THEN 1 ELSE -1 END) AS score
+          FROM votes
+      GROUP BY story_id) AS t
+ WHERE s.id = t.story_id;
+
+ANALYZE;
+"""
+
+
+def seed(conn, stories: int, votes: int) -> list[int]:
+    """Inserts the stories and votes, sets the scores and returns the story ids."""
+    titles = make_titles(stories)
+    sql_methods.insert_stories(conn, [(f"https://bench.example/{i}", titles[i])
+                                      for i in range(stories)])
+    cur = conn.cursor()
+    cur.execute(SEED_VOTES, (votes,))
+    cur.execute("SELECT id FROM stories")
+    ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return ids
+
+
+def time_votes(conn, ids: list[int], batches: int = 20, size: int = 500) -> float:
+    """Returns the mean seconds per vote recorded through apply_votes."""
+    rng = random.Random(7)
+    start = time.perf_counter()
+    for _ in range(batches):
+        sql_methods.apply_votes(conn, [(rng.choice(ids), "u") for _ in range(size)])
+    return (time.perf_counter() - start) / (batches * size)
+
+
+def time_deletes(conn, ids: list[int], count: int, flat: bool) -> float:
+    """Deletes count stories from the end of ids and returns the mean seconds per delete."""
+    cur = conn.cursor()
+    start = time.perf_counter()
+    for _ in range(count):
+        id_num = ids.pop()
+        if flat:
+            cur.execute(FLAT_DELETE, (id_num, id_num))
+            conn.commit()
+        else:
+            sql_methods.delete_story(conn, id_num)
+    return (time.perf_counter() - start) / count
+
+
+def time_detach(conn, partition: str) -> tuple[float, int]:
+    """Times detaching a partition inside a transaction that is rolled back;
+    returns the seconds taken and the votes the partition held."""
+    cur = conn.cursor()
+    cur.execute(f"SELECT COUNT(*) FROM {partition}")
+    size = cur.fetchone()[0]
+    start = time.perf_counter()
+    cur.execute(f"ALTER TABLE votes DETACH PARTITION {partition}")
+    elapsed = time.perf_counter() - start
+    conn.rollback()
+    return elapsed, size
+
+
+def main():
+    """Parses the command line, builds both layouts and prints the comparison."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stories", type=int, default=5_000, help="stories to seed")
+    parser.add_argument("--votes", type=int, default=500_000, help="votes to seed")
+    parser.add_argument("--deletes", type=int, default=50, help="stories to delete per step")
+    args = parser.parse_args()
+
+    with scratch_database("votes_benchmark_flat", until="005") as flat_config, \
+            scratch_database("votes_benchmark") as config:
+        if config is None:
+            print("No DATABASE_* environment configured, nothing to compare.")
+            return
+        flat, partitioned = connect(**flat_config), connect(**config)
+        try:
+            flat_ids = seed(flat, args.stories, args.votes)
+            ids = seed(partitioned, args.stories, args.votes)
+            now = datetime.now()
+            start = time.perf_counter()
+            created = sql_methods.ensure_vote_partitions(partitioned, now)
+            print(f"{args.stories:,} stories, {args.votes:,} votes over the past year; "
+                  f"{len(created)} monthly partitions created from votes_default "
+                  f"in {format_seconds(time.perf_counter() - start)}\n")
+
+            print(f"  {'step':34}{'flat':>12}{'partitioned':>14}")
+            print(f"  {'apply_votes, per vote':34}"
+                  f"{format_seconds(time_votes(flat, flat_ids)):>12}"
+                  f"{format_seconds(time_votes(partitioned, ids)):>14}")
+            print(f"  {'delete_story, raw votes':34}"
+                  f"{format_seconds(time_deletes(flat, flat_ids, args.deletes, True)):>12}"
+                  f"{format_seconds(time_deletes(partitioned, ids, args.deletes, False)):>14}")
+
+            start = time.perf_counter()
+            compacted = sql_methods.compact_votes(
+                partitioned, sql_methods.add_months(datetime(now.year, now.month, 1), -1))
+            elapsed = time.perf_counter() - start
+            print(f"  {'delete_story, after compaction':34}{'':>12}"
+                  f"{format_seconds(time_deletes(partitioned, ids, args.deletes, False)):>14}")
+
+            votes = sum(row["votes"] for row in compacted)
+            rollups = sum(row["rollups"] for row in compacted)
+            print(f"\ncompacted {len(compacted)} partitions, {votes:,} votes into "
+                  f"{rollups:,} rollups in {format_seconds(elapsed)}")
+            drift = sql_methods.reconcile_scores(partitioned, fix=False)
+            print(f"reconcile_scores after compaction: {len(drift)} drifted score(s)")
+
+            current = sql_methods.vote_partition_name(now)
+            future = sql_methods.vote_partition_name(sql_methods.add_months(now, 1))
+            for partition in (current, future):
+                elapsed, size = time_detach(partitioned, partition)
+                print(f"detach {partition} ({size:,} votes): {format_seconds(elapsed)}")
+        finally:
+            flat.close()
+            partitioned.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Helpers shared by the benchmark modules."""
+# pylint: disable=import-error
+
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from os import environ
+from pathlib import Path
+
+QUERY_DIRECTORY = Path(__file__).resolve().parent.parent / "queries"
+
+WORDS = ("budget", "pensions", "ukraine", "war", "bank", "crisis", "deal", "summit",
+         "vaccine", "election", "voters", "broadband", "bird", "database", "thriller",
+         "football", "weather", "storm", "energy", "prices", "schools", "strike",
+         "rail", "housing", "climate", "court", "police", "health", "market", "music")
+
+
+def make_titles(count: int, seed: int = 42) -> list[str]:
+    """Builds count reproducible pseudo-headlines from a small vocabulary plus a unique tag."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(4, 9))).capitalize() + f" #{i}"
+            for i in range(count)]
+
+
+def time_call(func, repeat: int = 5, number: int = 1) -> dict:
+    """Times func() and returns the best and median seconds per call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {"best": min(timings), "median": statistics.median(timings)}
+
+
+def format_seconds(seconds: float) -> str:
+    """Formats a duration with a readable unit."""
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def database_config() -> dict | None:
+    """Returns psycopg2 connection arguments from the environment, or None when
+    no database has been configured."""
+    try:
+        return {"user": environ["DATABASE_USERNAME"],
+                "password": environ["DATABASE_PASSWORD"],
+                "host": environ["DATABASE_IP"],
+                "port": environ["DATABASE_PORT"],
+                "database": environ["DATABASE_NAME"]}
+    except KeyError:
+        return None
+
+
+@contextmanager
+def scratch_database(schema: str, until: str | None = None):
+    """Builds the migrated tables in a throwaway schema and yields psycopg2
+    connection arguments that use it, or None when no database is configured
+    or reachable. until is the number of the last migration to apply, such as
+    "005"; all of them are applied by default. The schema is dropped on exit."""
+    # pylint: disable=import-outside-toplevel
+    from psycopg2 import connect, Error, OperationalError
+
+    config = database_config()
+    try:
+        admin = connect(**config) if config is not None else None
+    except OperationalError:
+        admin = None
+    if admin is None:
+        yield None
+        return
+
+    admin.autocommit = True
+    cur = admin.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}")
+    migrations = [path for path in sorted((QUERY_DIRECTORY / "migrations").glob("*.sql"))
+                  if until is None or path.name[:len(until)] <= until]
+    for script in [QUERY_DIRECTORY / "tables.sql", QUERY_DIRECTORY / "create_votes_table.sql",
+                   *migrations]:
+        try:
+            cur.execute(script.read_text(encoding="utf-8"))
+        except Error as err:
+            cur.execute("ROLLBACK")
+            print(f"  skipped {script.name}: {str(err).splitlines()[0]}")
+    try:
+        yield {**config, "options": f"-c search_path={schema}"}
+    finally:
+        cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
@@ -0,0 +1,299 @@
+"""Runs the hot-path microbenchmarks and writes the timings to a JSON file.
+Covers story parsing on the saved BBC fixtures, the JSON file backend's
+list/search/sort at several dataset sizes, jsonify of RealDictRow lists and
+the columnar encoding of the same stories, the sql_methods functions against
+a throwaway schema when a database is configured, and the cost of recording
+metrics. With --baseline the run is
+compared against an earlier results file and the exit status is 1 if any
+case is slower by more than --threshold.
+Usage: python -m benchmarks.run [--suites parse,json,serialize,sql,metrics] [--quick]
+                                [--output bench_results.json]
+                                [--baseline old.json] [--threshold 0.10]
+       python -m benchmarks.run --baseline old.json --compare new.json
+"""
+# pylint: disable=import-error
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import count, cycle
+from pathlib import Path
+
+from benchmarks.common import format_seconds, make_titles, scratch_database, time_call
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+DOMAIN = "https://www.bbc.co.uk"
+SCHEMA = "benchmark_run"
+DEFAULT_OUTPUT = "bench_results.json"
+DEFAULT_THRESHOLD = 0.10
+REPEAT = 5
+
+
+def make_stories(size: int, seed: int = 42) -> list[dict]:
+    """Builds size reproducible stories with spread-out timestamps and scores."""
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    stories = []
+    for id_num, title in enumerate(make_titles(size, seed), 1):
+        created = start + timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        stories.append({"id": id_num, "title": title, "url": f"https://bench.example/{id_num}",
+                        "created_at": created, "updated_at": created,
+                        "score": rng.randint(-5, 500)})
+    return stories
+
+
+@contextmanager
+def parse_suite(quick: bool):
+    """Both story parsers on every saved page."""
+    # pylint: disable=import-outside-toplevel, unused-argument
+    from news_scraper import parse_stories, parse_stories_bs
+
+    cases = {}
+    for path in sorted(FIXTURES.glob("*.html")):
+        html = path.read_text(encoding="utf-8")
+        cases[f"parse/{path.stem}/anchor"] = (lambda html=html: parse_stories(DOMAIN, html), 1)
+        cases[f"parse/{path.stem}/bs4"] = (lambda html=html: parse_stories_bs(DOMAIN, html), 1)
+    yield cases
+
+
+@contextmanager
+def json_suite(quick: bool):
+    """file_methods.get_stories_data reading a stories file of each size."""
+    # pylint: disable=import-outside-toplevel
+    import file_methods
+
+    def stories(path, search, sort, order):
+        file_methods.STORIES_FILE = path
+        return file_methods.get_stories_data(search, sort, order)
+
+    previous = file_methods.STORIES_FILE
+    cases = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (1_000,) if quick else (1_000, 10_000):
+            path = os.path.join(directory, f"stories_{size}.json")
+            file_methods.STORIES_FILE = path
+            file_methods.write_to_json([
+                {**story, "created_at": story["created_at"].strftime("%a, %d %b %Y %H:%M:%S GMT"),
+                 "updated_at": story["updated_at"].strftime("%a, %d %b %Y %H:%M:%S GMT")}
+                for story in make_stories(size)])
+
+            number = 20 if size <= 1_000 else 2
+            for case, args in (("list", ("", "", False)),
+                               ("sort_title", ("", "title", False)),
+                               ("sort_score", ("", "score", True)),
+                               ("search", ("crisis", "", True))):
+                cases[f"json/{size}/{case}"] = (lambda path=path, args=args: stories(path, *args),
+                                                number)
+        try:
+            yield cases
+        finally:
+            file_methods.STORIES_FILE = previous
+
+
+@contextmanager
+def serialize_suite(quick: bool):
+    """jsonify of the RealDictRow lists GET /stories returns, inside an app context,
+    and the format=columnar encoding of the same stories."""
+    # pylint: disable=import-outside-toplevel
+    from flask import Flask, jsonify
+    from psycopg2.extras import RealDictRow
+    import columnar
+
+    app = Flask(__name__)
+    cases = {}
+    for size in (50, 1_000) if quick else (50, 1_000, 10_000):
+        stories = make_stories(size)
+        rows = [RealDictRow(story) for story in stories]
+        columns, values = columnar.from_dicts(stories)
+        cases[f"serialize/{size}_rows"] = (lambda rows=rows: jsonify(rows).get_data(),
+                                           max(1, 20_000 // size))
+        cases[f"serialize/{size}_columnar"] = (
+            lambda columns=columns, values=values: b"".join(columnar.encode(columns, values)),
+            max(1, 20_000 // size))
+    with app.app_context():
+        yield cases
+
+
+@contextmanager
+def sql_suite(quick: bool):
+    """The sql_methods functions on a seeded throwaway schema."""
+    # pylint: disable=import-outside-toplevel
+    from psycopg2 import connect
+    import sql_methods
+
+    with scratch_database(SCHEMA) as config:
+        if config is None:
+            yield None
+            return
+        conn = connect(**config)
+        size = 1_000 if quick else 10_000
+        sql_methods.insert_stories(conn, [(story["url"], story["title"])
+                                          for story in make_stories(size)])
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM stories ORDER BY id")
+        story_ids = [row[0] for row in cur.fetchall()]
+        cur.close()
+        stories = cycle(story_ids)
+        urls = count()
+        votes = [(story_id, "u") for story_id in story_ids[:100]]
+        page = sql_methods.get_stories_page(conn, "", "score", True, 50)
+
+        cases = {
+            "sql/get_stories_data/created_at": (
+                lambda: sql_methods.get_stories_data(conn, "", "created_at", True), 2),
+            "sql/get_stories_data/title": (
+                lambda: sql_methods.get_stories_data(conn, "", "title", False), 2),
+            "sql/get_stories_data/search": (
+                lambda: sql_methods.get_stories_data(conn, "crisis", "score", True), 5),
+            "sql/get_stories_page/first": (
+                lambda: sql_methods.get_stories_page(conn, "", "score", True, 50), 50),
+            "sql/get_stories_page/hot": (
+                lambda: sql_methods.get_stories_page(conn, "", "hot_score", True, 50), 50),
+            "sql/get_stories_page/next": (
+                lambda: sql_methods.get_stories_page(conn, "", "score", True, 50,
+                                                     page["next_cursor"]), 50),
+            "sql/insert_story": (
+                lambda: sql_methods.insert_story(conn, f"https://bench.example/new/{next(urls)}",
+                                                 "Benchmark story"), 50),
+            "sql/update_score": (lambda: sql_methods.update_score(conn, next(stories), "u"), 50),
+            "sql/apply_votes_x100": (lambda: sql_methods.apply_votes(conn, votes), 10),
+            "sql/patch_story": (
+                lambda: sql_methods.patch_story(conn, next(stories), "", "Patched story"), 50),
+        }
+        try:
+            yield cases
+        finally:
+            conn.close()
+
+
+@contextmanager
+def metrics_suite(quick: bool):
+    """The cost of recording a request and of rendering GET /metrics."""
+    # pylint: disable=import-outside-toplevel, unused-argument
+    from metrics import Counter, Histogram, MetricsRegistry
+
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram("bench_seconds", "Benchmark.",
+                                            ("method", "endpoint", "status")))
+    counter = registry.register(Counter("bench_total", "Benchmark.", ("query",)))
+    for route in range(20):
+        for status in ("200", "400", "404"):
+            histogram.observe(0.01, "GET", f"/route/{route}", status)
+    yield {"metrics/observe": (lambda: histogram.observe(0.003, "GET", "/stories", "200"),
+                               10_000),
+           "metrics/inc": (lambda: counter.inc(1, "get_stories"), 10_000),
+           "metrics/render": (registry.render, 50)}
+
+
+SUITES = {"parse": parse_suite,
+          "json": json_suite,
+          "serialize": serialize_suite,
+          "sql": sql_suite,
+          "metrics": metrics_suite}
+
+
+def run(suites: list[str], quick: bool) -> dict:
+    """Times every case of the chosen suites; returns {case: timings}."""
+    results = {}
+    for name in suites:
+        with SUITES[name](quick) as cases:
+            if cases is None:
+                print(f"{name}: no database configured, skipped.")
+                continue
+            for label, (func, number) in cases.items():
+                func()
+                timing = time_call(func, repeat=REPEAT, number=number)
+                results[label] = {**timing, "number": number}
+                print(f"  {label:40} best {format_seconds(timing['best']):>10}  "
+                      f"median {format_seconds(timing['median']):>10}")
+    return results
+
+
+def metadata(suites: list[str], quick: bool) -> dict:
+    """Describes where and on what the results were measured."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True, cwd=FIXTURES).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "suites": suites,
+            "quick": quick,
+            "repeat": REPEAT}
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Prints the change in best time for every case in both runs and returns
+    the cases that got slower by more than threshold."""
+    regressions = []
+    print(f"\nAgainst baseline {baseline['meta'].get('commit')} "
+          f"(regression threshold {threshold:.0%})")
+    for label in sorted(set(baseline["results"]) | set(current["results"])):
+        old = baseline["results"].get(label)
+        new = current["results"].get(label)
+        if old is None or new is None:
+            print(f"  {label:40} {'new case' if old is None else 'not measured'}")
+            continue
+        change = new["best"] / old["best"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(label)
+            flag = "  REGRESSION"
+        print(f"  {label:40} {format_seconds(old['best']):>10} -> "
+              f"{format_seconds(new['best']):>10}  {change:+.1%}{flag}")
+    return regressions
+
+
+def load(path: str) -> dict:
+    """Reads a results file written by this module."""
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def main():
+    """Parses the command line, runs or loads the results and compares them."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", default=",".join(SUITES),
+                        help="comma separated suites to run")
+    parser.add_argument("--quick", action="store_true", help="only the smaller datasets")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the results")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--compare", help="compare this results file instead of running")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown of the best time counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error("--compare needs --baseline")
+        current = load(args.compare)
+    else:
+        suites = args.suites.split(",")
+        unknown = set(suites) - set(SUITES)
+        if unknown:
+            parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+        current = {"meta": metadata(suites, args.quick), "results": run(suites, args.quick)}
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(current, file, indent=2)
+        print(f"\nWrote {len(current['results'])} results to {args.output}")
+
+    if args.baseline:
+        regressions = compare(load(args.baseline), current, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
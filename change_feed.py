@@ -0,0 +1,111 @@
+"""In-memory feed of recent changes to the stories, so clients can catch up
+on what was created, updated, re-scored or deleted since they last looked
+instead of fetching the whole list again.
+Each change gets a sequence number, and a token names a point in the feed.
+Tokens also carry an id for this process, so a token issued before a restart
+is recognized as expired rather than silently skipping changes. The feed
+keeps the last capacity changes; older tokens are expired too, and the client
+must reload the list."""
+
+import secrets
+import threading
+from collections import deque
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+
+class ChangeFeed:
+    """Thread-safe ring buffer of (sequence, change, story id, story row)."""
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self._epoch = secrets.token_hex(4)
+        self._changes = deque(maxlen=capacity)
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._subscribers = []
+
+    def token(self) -> str:
+        """Returns the token for the current end of the feed."""
+        with self._condition:
+            return self._token(self._sequence)
+
+    def publish(self, changes: list[tuple[str, int, dict | None]]) -> str:
+        """Appends (change, story id, story row) entries and wakes waiting readers.
+        The row is None for deletions. Returns the new end token."""
+        with self._condition:
+            for change, id_num, story in changes:
+                self._sequence += 1
+                self._changes.append((self._sequence, change, id_num, story))
+            if changes:
+                self._condition.notify_all()
+            token = self._token(self._sequence)
+            subscribers = list(self._subscribers) if changes else []
+        for callback in subscribers:
+            callback()
+        return token
+
+    def subscribe(self, callback) -> None:
+        """Calls callback() after every publish, for readers that cannot block in
+        wait, such as those on an event loop. It runs on the publishing thread."""
+        with self._condition:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        """Stops calling a callback passed to subscribe."""
+        with self._condition:
+            self._subscribers.remove(callback)
+
+    def since(self, token: str) -> dict | None:
+        """Returns {"token", "changes"} for everything after token, keeping only
+        the latest change to each story. Returns None if the token has expired."""
+        with self._condition:
+            return self._since(token)
+
+    def wait(self, token: str, timeout: float) -> dict | None:
+        """Like since, but blocks for up to timeout seconds until there is a change."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._parse(token) != self._sequence, timeout)
+            return self._since(token)
+
+    def stats(self) -> dict:
+        """Returns how many changes are held and the current sequence number."""
+        with self._condition:
+            return {"capacity": self.capacity,
+                    "changes": len(self._changes),
+                    "subscribers": len(self._subscribers),
+                    "sequence": self._sequence,
+                    "oldest": self._changes[0][0] if self._changes else None}
+
+    def _token(self, sequence: int) -> str:
+        return f"{self._epoch}-{sequence}"
+
+    def _parse(self, token: str) -> int | None:
+        """Returns the sequence number in a token from this process, or None."""
+        epoch, _, sequence = token.partition("-")
+        if epoch != self._epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def _since(self, token: str) -> dict | None:
+        """Collects the changes after token. Must be called with the lock held."""
+        sequence = self._parse(token)
+        oldest = self._changes[0][0] if self._changes else self._sequence + 1
+        if sequence is None or sequence > self._sequence or sequence < oldest - 1:
+            return None
+
+        latest = {}
+        for number, change, id_num, story in reversed(self._changes):
+            if number <= sequence:
+                break
+            if id_num not in latest:
+                latest[id_num] = (number, change, story)
+            elif change == CREATED and latest[id_num][1] == UPDATED:
+                # The client has never seen the story, so it is still new to them.
+                latest[id_num] = (latest[id_num][0], CREATED, latest[id_num][2])
+        changes = [{"change": change, "id": id_num, "story": story}
+                   for id_num, (number, change, story)
+                   in sorted(latest.items(), key=lambda item: item[1][0])]
+        return {"token": self._token(self._sequence), "changes": changes}
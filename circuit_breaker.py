@@ -0,0 +1,102 @@
+"""Circuit breaker tracking whether the scrape target is reachable.
+Health is inferred from the outcome of real fetches: after enough consecutive
+failures the circuit opens and scrapes are rejected without touching the
+network, until a single half-open trial fetch shows the target is back."""
+
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Thread-safe closed/open/half-open circuit breaker."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 clock=time.monotonic):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1.")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._last_error = None
+        self._last_success = None
+        self._last_failure = None
+        self._successes_total = 0
+        self._failures_total = 0
+        self._rejected = 0
+
+    def is_open(self) -> bool:
+        """True while the circuit is open and not yet due a half-open trial."""
+        with self._lock:
+            self._update_state()
+            return self._state == OPEN
+
+    def allow_request(self) -> bool:
+        """Decides whether a fetch may go ahead; in half-open state only one
+        trial is let through until its outcome is recorded."""
+        with self._lock:
+            self._update_state()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        """Records a fetch that reached the target, closing the circuit."""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+            self._last_success = time.time()
+            self._successes_total += 1
+
+    def record_failure(self, error: str) -> None:
+        """Records a fetch that could not reach the target, opening the circuit
+        once the threshold is hit or if the half-open trial failed."""
+        with self._lock:
+            self._failures += 1
+            self._failures_total += 1
+            self._last_error = error
+            self._last_failure = time.time()
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        """Returns the circuit state and recent fetch outcomes."""
+        with self._lock:
+            self._update_state()
+            retry_after = None
+            if self._state == OPEN:
+                retry_after = round(self._opened_at + self.reset_timeout - self._clock(), 3)
+            return {"state": self._state,
+                    "healthy": self._state == CLOSED,
+                    "consecutive_failures": self._failures,
+                    "failure_threshold": self.failure_threshold,
+                    "reset_timeout": self.reset_timeout,
+                    "retry_after": retry_after,
+                    "last_error": self._last_error,
+                    "last_success": self._last_success,
+                    "last_failure": self._last_failure,
+                    "successes": self._successes_total,
+                    "failures": self._failures_total,
+                    "rejected": self._rejected}
+
+    def _update_state(self) -> None:
+        """Moves an open circuit to half-open once the reset timeout has passed.
+        Must be called with the lock held."""
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
@@ -0,0 +1,58 @@
+"""Column-oriented JSON for GET /stories?format=columnar.
+Instead of one object per story, the body names each column once and then
+gives one array of values per column, with timestamps as seconds since the
+Unix epoch:
+
+    {"columns": ["id", "title", ...], "count": 2,
+     "values": [[1, 2], ["First", "Second"], ...], "next_cursor": null}
+
+The body is produced in chunks of at most chunk_rows values, so a large
+listing is never held in memory as one JSON string."""
+
+import json
+from datetime import datetime
+from typing import Iterator
+
+from sql_methods import TIMESTAMP_COLUMNS, UNIX_EPOCH
+
+CHUNK_ROWS = 2000
+COLUMNS = ("id", "title", "url", "created_at", "updated_at", "score", "hot_score")
+
+_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def epoch(value: datetime) -> float:
+    """Returns a naive UTC datetime as seconds since the Unix epoch."""
+    return (value - UNIX_EPOCH).total_seconds()
+
+
+def from_dicts(rows: list[dict]) -> tuple[list[str], list[tuple]]:
+    """Converts story dicts, as the other listing methods return them, to column
+    names and value tuples with epoch timestamps."""
+    if not rows:
+        return list(COLUMNS), []
+    columns = sorted(rows[0], key=lambda column: (column not in COLUMNS,
+                                                  COLUMNS.index(column)
+                                                  if column in COLUMNS else 0))
+    converters = [epoch if column in TIMESTAMP_COLUMNS else None for column in columns]
+    values = [tuple(row[column] if convert is None else convert(row[column])
+                    for column, convert in zip(columns, converters))
+              for row in rows]
+    return columns, values
+
+
+def encode(columns: list[str], rows: list[tuple], chunk_rows: int = CHUNK_ROWS,
+           **fields) -> Iterator[bytes]:
+    """Yields the columnar JSON body for rows, followed by any extra fields."""
+    yield (f'{{"columns":{_encoder.encode(columns)},"count":{len(rows)},"values":['
+           .encode("utf-8"))
+    for index, column in enumerate(zip(*rows) if rows else [() for _ in columns]):
+        yield b"[" if index == 0 else b",["
+        for start in range(0, len(column), chunk_rows):
+            chunk = _encoder.encode(column[start:start + chunk_rows])[1:-1]
+            yield (chunk if start == 0 else "," + chunk).encode("utf-8")
+        yield b"]"
+    yield b"]"
+    for name, value in fields.items():
+        yield f",{_encoder.encode(name)}:{_encoder.encode(value)}".encode("utf-8")
+    yield b"}"
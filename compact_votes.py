@@ -0,0 +1,50 @@
+"""Command that maintains the monthly votes partitions: creates the coming
+months' partitions, then rolls every month older than --keep full months up
+into per-story, per-day counts and drops its raw votes. Run it daily.
+Usage: python compact_votes.py [--keep 1] [--ahead 2]
+"""
+# pylint: disable=import-error
+
+import argparse
+from datetime import datetime
+from os import environ
+
+from dotenv import load_dotenv
+from psycopg2 import connect
+
+from sql_methods import add_months, compact_votes, ensure_vote_partitions
+
+
+def main(keep: int, ahead: int) -> list[dict]:
+    """Creates missing partitions and compacts the old ones; returns the
+    partitions compacted."""
+    load_dotenv()
+    conn = connect(user=environ["DATABASE_USERNAME"],
+                   password=environ["DATABASE_PASSWORD"],
+                   host=environ["DATABASE_IP"],
+                   port=environ["DATABASE_PORT"],
+                   database=environ["DATABASE_NAME"])
+    now = datetime.now()
+    try:
+        created = ensure_vote_partitions(conn, now, ahead)
+        compacted = compact_votes(conn, add_months(datetime(now.year, now.month, 1), -keep))
+    finally:
+        conn.close()
+
+    for name in created:
+        print(f"Created {name}.")
+    for row in compacted:
+        print(f"Compacted {row['partition']}: {row['votes']} vote(s) "
+              f"into {row['rollups']} rollup(s).")
+    print(f"{len(compacted)} partition(s) compacted.")
+    return compacted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keep", type=int, default=1,
+                        help="full months of raw votes to keep before the current one")
+    parser.add_argument("--ahead", type=int, default=2, help="months of partitions to create")
+    args = parser.parse_args()
+    main(args.keep, args.ahead)
@@ -0,0 +1,220 @@
+"""Thread-safe pool of psycopg2 connections shared by the API request handlers.
+Connections are checked out per request, validated before reuse and replaced
+when they turn out to be broken. A lazy pool opens nothing until the first
+checkout, and failed connection attempts can be retried with backoff."""
+# pylint: disable=import-error
+
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+
+from psycopg2 import connect, DatabaseError, OperationalError
+from psycopg2.extensions import (connection,
+                                 TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_UNKNOWN)
+
+VALIDATE_AFTER = 30.0
+
+
+class PoolError(Exception):
+    """Base class for errors raised by the connection pool."""
+
+
+class PoolTimeoutError(PoolError):
+    """Raised when no connection became available before the checkout timeout."""
+
+
+class PoolClosedError(PoolError):
+    """Raised when a connection is requested from a pool that has been closed."""
+
+
+class PoolConfigError(PoolError):
+    """Raised when the connection arguments cannot be resolved, such as when a
+    setting is missing from the environment."""
+
+
+def resolve(connect_kwargs: dict | Callable[[], dict]) -> dict:
+    """Returns the connection arguments, calling connect_kwargs if it is callable."""
+    return connect_kwargs() if callable(connect_kwargs) else connect_kwargs
+
+
+class ConnectionPool:
+    """Keeps between min_size and max_size open connections and hands each one
+    to a single caller at a time. With lazy=True the min_size connections are
+    not opened up front. A connection attempt that fails is retried up to
+    retries times, waiting retry_delay seconds and doubling it each time.
+    connect_kwargs may be a callable returning the arguments, which is then
+    called for every new connection, so settings are read on first use."""
+
+    def __init__(self, connect_kwargs: dict | Callable[[], dict], min_size: int = 1, max_size: int = 10,
+                 timeout: float = 5.0, connector=connect, lazy: bool = False,
+                 retries: int = 0, retry_delay: float = 0.5):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1.")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._connect_kwargs = connect_kwargs
+        self._connector = connector
+        self._cond = threading.Condition()
+        self._idle = []
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._checkouts = 0
+        self._checkout_timeouts = 0
+        self._reconnects = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._connect_failures = 0
+
+        for _ in range(0 if lazy else min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def getconn(self, timeout: float | None = None) -> connection:
+        """Checks a connection out of the pool, waiting up to timeout seconds for one."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolClosedError("Connection pool is closed.")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    conn, last_used = None, None
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._checkout_timeouts += 1
+                    raise PoolTimeoutError(
+                        f"No connection available after {timeout} seconds.")
+                self._waiting += 1
+                self._cond.wait(remaining)
+                self._waiting -= 1
+
+        try:
+            conn = self._connect() if conn is None else self._validate(conn, last_used)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def putconn(self, conn: connection) -> None:
+        """Returns a connection to the pool, rolling back any open transaction
+        and dropping it if it is no longer usable."""
+        usable = not conn.closed
+        if usable:
+            status = conn.get_transaction_status()
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                usable = False
+            elif status != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except DatabaseError:
+                    usable = False
+
+        with self._cond:
+            self._in_use -= 1
+            if usable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it."""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the pool's size, usage and checkout timings."""
+        with self._cond:
+            return {"min_size": self.min_size,
+                    "max_size": self.max_size,
+                    "size": self._size,
+                    "in_use": self._in_use,
+                    "idle": len(self._idle),
+                    "waiting": self._waiting,
+                    "checkouts": self._checkouts,
+                    "checkout_timeouts": self._checkout_timeouts,
+                    "reconnects": self._reconnects,
+                    "connect_failures": self._connect_failures,
+                    "wait_time_total": round(self._wait_total, 6),
+                    "wait_time_max": round(self._wait_max, 6)}
+
+    def close(self) -> None:
+        """Closes every idle connection; connections still checked out are
+        closed as they are returned."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+    def _connect(self) -> connection:
+        """Opens a brand new connection, retrying attempts that fail."""
+        connect_kwargs = resolve(self._connect_kwargs)
+        attempt = 0
+        while True:
+            try:
+                return self._connector(**connect_kwargs)
+            except OperationalError:
+                with self._cond:
+                    self._connect_failures += 1
+                if attempt >= self.retries:
+                    raise
+            time.sleep(self.retry_delay * 2 ** attempt)
+            attempt += 1
+
+    def _validate(self, conn: connection, last_used: float) -> connection:
+        """Makes sure an idle connection still works, reconnecting if it does not.
+        Connections idle for less than VALIDATE_AFTER seconds skip the round trip."""
+        if not conn.closed and time.monotonic() - last_used < VALIDATE_AFTER:
+            return conn
+        if not conn.closed:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+                return conn
+            except DatabaseError:
+                self._close_quietly(conn)
+
+        new_conn = self._connect()
+        with self._cond:
+            self._reconnects += 1
+        return new_conn
+
+    @staticmethod
+    def _close_quietly(conn: connection) -> None:
+        """Closes a connection, ignoring errors from one that is already broken."""
+        try:
+            conn.close()
+        except DatabaseError:
+            pass
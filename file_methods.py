@@ -3,6 +3,13 @@
 
 from datetime import datetime
 import json
+import os
+
+from search_index import TitleIndex
+
+STORIES_FILE = "stories.json"
+
+_title_index = {"signature": None, "index": TitleIndex()}
 
 
 def get_stories_from_json(mode: str) -> list[dict]:
@@ -11,14 +18,29 @@ def get_stories_from_json(mode: str) -> list[dict]:
     if not ((len(mode) == 1 and mode.lower() in modes)
             or (len(mode) == 2 and mode[0].lower() in modes and mode[1] == "+")):
         raise ValueError("Mode must be valid file opening mode.")
-    with open("stories.json", mode.lower(), encoding="utf-8") as file:
+    with open(STORIES_FILE, mode.lower(), encoding="utf-8") as file:
         return json.load(file)
 
 
 def write_to_json(contents) -> None:
     """Overwrites json.file to contain data passed as argument."""
-    with open("stories.json", "w", encoding="utf-8") as file:
+    with open(STORIES_FILE, "w", encoding="utf-8") as file:
         file.write(json.dumps(contents, indent=4))
+    _title_index["signature"] = None
+
+
+def get_title_index(stories: list[dict]) -> TitleIndex:
+    """Returns the title index for the stories file, rebuilding it only when
+    the file has changed since it was last indexed."""
+    try:
+        stat = os.stat(STORIES_FILE)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        signature = None
+    if signature is None or signature != _title_index["signature"]:
+        _title_index["index"] = TitleIndex(stories)
+        _title_index["signature"] = signature
+    return _title_index["index"]
 
 
 def get_stories_data(search, sort, order) -> list[dict]:
@@ -27,8 +49,8 @@ def get_stories_data(search, sort, order) -> list[dict]:
     if len(return_data) == 0:
         return {"error": True, "message": "No stories were found"}
     if search:
-        return_data = [s for s in return_data if search.lower()
-                       in s["title"].lower()]
+        matches = set(get_title_index(return_data).search(search))
+        return_data = [s for s in return_data if s["id"] in matches]
 
     if sort == "title":
         return sorted(return_data, key=lambda x: x[sort].lower(), reverse=order)
@@ -43,12 +65,17 @@ def get_max_id() -> int:
     return get_stories_from_json("r")[-1]["id"]
 
 
+def timestamp() -> str:
+    """Formats the current time the way stories json stores it."""
+    return datetime.now().strftime("%a, %d %b %Y %H:%M:%S") + " GMT"
+
+
 def create_story_dict(id_num, title, url) -> dict:
     """Creates a dictionary using arguments, to be added to stories json."""
-    return {"created_at": datetime.now().strftime("%a, %d %b %Y %H:%M:%S") + " GMT",
+    return {"created_at": timestamp(),
             "id": id_num,
             "score": 0,
             "title": title,
-            "updated_at": datetime.now().strftime("%a, %d %b %Y %H:%M:%S") + " GMT",
+            "updated_at": timestamp(),
             "url": url
             }
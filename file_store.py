@@ -0,0 +1,248 @@
+"""Append-only log storage engine for the JSON file backend.
+Stories are held in memory; every change is appended to a JSONL write-ahead
+log next to the snapshot, and the log is periodically compacted into a new
+snapshot. On startup the snapshot is loaded and the log replayed on top of it."""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from file_methods import create_story_dict, STORIES_FILE, timestamp
+from search_index import TitleIndex
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER)
+LOG_SUFFIX = ".log"
+
+
+class StoreCorruptError(Exception):
+    """Raised when the log contains a damaged record before its last line."""
+
+
+class FileStore:
+    """In-memory story store persisted as a snapshot plus a write-ahead log.
+    Log records hold the full state of a story after each change, so replaying
+    a record more than once gives the same result."""
+
+    def __init__(self, path: str = STORIES_FILE, fsync: str = FSYNC_INTERVAL,
+                 fsync_interval: float = 1.0, compact_every: int = 10000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}.")
+        self.path = path
+        self.log_path = path + LOG_SUFFIX
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._stories = {}
+        self._max_id = 0
+        self._index = TitleIndex()
+        self._log_records = 0
+        self._last_sync = time.monotonic()
+        self._appends = 0
+        self._syncs = 0
+        self._compactions = 0
+        self._recover()
+        self._log = open(self.log_path, "a", encoding="utf-8")
+
+    def get_stories_data(self, search, sort, order) -> list[dict]:
+        """Gets the stories for a GET request, like file_methods.get_stories_data."""
+        with self._lock:
+            if not self._stories:
+                return {"error": True, "message": "No stories were found"}
+            return_data = self.stories(search)
+
+        if sort == "title":
+            return sorted(return_data, key=lambda x: x[sort].lower(), reverse=order)
+        if sort:
+            return sorted(return_data, key=lambda x: x[sort], reverse=order)
+        return sorted(return_data, key=lambda x: x["created_at"], reverse=order)
+
+    def stories(self, search: str = "") -> list[dict]:
+        """Returns the stories whose title contains search, in no particular order."""
+        with self._lock:
+            if search:
+                return [self._stories[id_num] for id_num in self._index.search(search)]
+            return list(self._stories.values())
+
+    def get_story(self, id_num: int) -> dict | None:
+        """Returns one story, or None if there is no story with that id."""
+        with self._lock:
+            return self._stories.get(id_num)
+
+    def get_max_id(self) -> int:
+        """Gets the highest story id stored, without touching the disk."""
+        return self._max_id
+
+    def add_story(self, title: str, url: str) -> dict:
+        """Stores a new story under the next id and returns it."""
+        with self._lock:
+            story = create_story_dict(self._max_id + 1, title, url)
+            self._put(story)
+            return story
+
+    def update_story(self, id_num: int, url: str = None, title: str = None) -> dict:
+        """Changes a story's url and/or title."""
+        with self._lock:
+            story = self._stories.get(id_num)
+            if story is None:
+                return {"error": True, "message": "Incorrect ID."}
+            story = {**story, "url": url or story["url"], "title": title or story["title"],
+                     "updated_at": timestamp()}
+            self._put(story)
+            return {"success": True, "message": "Update story successful."}
+
+    def vote(self, id_num: int, direction: str) -> dict:
+        """Adds one up or down vote to a story's score."""
+        with self._lock:
+            story = self._stories.get(id_num)
+            if story is None:
+                return {"error": True, "message": "Incorrect ID."}
+            self._put({**story, "score": story["score"] + (1 if direction == "up" else -1)})
+            return {"success": True, "message": "Update score successful."}
+
+    def delete_story(self, id_num: int) -> dict:
+        """Removes a story."""
+        with self._lock:
+            if id_num not in self._stories:
+                return {"error": True, "message": "Incorrect ID."}
+            self._append({"op": "delete", "id": id_num})
+            self._apply_delete(id_num)
+            self._maybe_compact()
+            return {"success": True, "message": "Delete story successful."}
+
+    def compact(self) -> None:
+        """Writes the current stories to a new snapshot and empties the log.
+        A crash between the two steps only leaves records that are replayed harmlessly."""
+        with self._lock:
+            self._write_snapshot()
+            self._log.close()
+            with open(self.log_path, "w", encoding="utf-8") as log:
+                os.fsync(log.fileno())
+            self._log = open(self.log_path, "a", encoding="utf-8")
+            self._log_records = 0
+            self._compactions += 1
+
+    def flush(self) -> None:
+        """Forces every appended record to disk."""
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        """Flushes the log and closes it."""
+        with self._lock:
+            if not self._log.closed:
+                self._sync()
+                self._log.close()
+
+    def stats(self) -> dict:
+        """Returns store size and log activity."""
+        with self._lock:
+            return {"stories": len(self._stories),
+                    "max_id": self._max_id,
+                    "log_records": self._log_records,
+                    "appends": self._appends,
+                    "syncs": self._syncs,
+                    "compactions": self._compactions,
+                    "fsync": self.fsync}
+
+    def _put(self, story: dict) -> None:
+        """Logs and applies the new state of a story. Must be called with the lock held."""
+        self._append({"op": "put", "story": story})
+        self._apply_put(story)
+        self._maybe_compact()
+
+    def _apply_put(self, story: dict) -> None:
+        """Updates the in-memory state and title index for one story."""
+        id_num = story["id"]
+        previous = self._stories.get(id_num)
+        self._stories[id_num] = story
+        if previous is None:
+            self._index.add(id_num, story["title"])
+        elif previous["title"] != story["title"]:
+            self._index.update(id_num, story["title"])
+        self._max_id = max(self._max_id, id_num)
+
+    def _apply_delete(self, id_num: int) -> None:
+        """Removes a story from the in-memory state and title index."""
+        if self._stories.pop(id_num, None) is not None:
+            self._index.remove(id_num)
+
+    def _append(self, record: dict) -> None:
+        """Writes one record to the log. With the interval policy the log is
+        fsynced on the first append after fsync_interval has passed; records in
+        between reach the OS straight away but may be lost on power failure."""
+        self._log.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._log_records += 1
+        self._appends += 1
+        if self.fsync == FSYNC_ALWAYS:
+            self._sync()
+        elif self.fsync == FSYNC_INTERVAL and (
+                time.monotonic() - self._last_sync >= self.fsync_interval):
+            self._sync()
+        else:
+            self._log.flush()
+
+    def _maybe_compact(self) -> None:
+        """Compacts once the log has grown past compact_every records."""
+        if self._log_records >= self.compact_every:
+            self.compact()
+
+    def _sync(self) -> None:
+        """Flushes the log to the OS and fsyncs it."""
+        self._log.flush()
+        if self.fsync != FSYNC_NEVER:
+            os.fsync(self._log.fileno())
+            self._syncs += 1
+        self._last_sync = time.monotonic()
+
+    def _write_snapshot(self) -> None:
+        """Atomically replaces the snapshot with the current stories."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(list(self._stories.values()), file, separators=(",", ":"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _recover(self) -> None:
+        """Loads the snapshot and replays the log on top of it. A torn final
+        record from a crash mid-append is cut off; damage anywhere else raises."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                stories = json.load(file)
+        except FileNotFoundError:
+            stories = []
+        for story in stories:
+            self._apply_put(story)
+
+        try:
+            with open(self.log_path, "rb") as log:
+                lines = log.read().split(b"\n")
+        except FileNotFoundError:
+            return
+
+        # Only newline-terminated records were fully written; anything after
+        # the last newline is a torn append and is dropped.
+        complete, torn = lines[:-1], lines[-1]
+        good_bytes = 0
+        for number, line in enumerate(complete):
+            try:
+                record = json.loads(line)
+                if record["op"] == "put":
+                    self._apply_put(record["story"])
+                else:
+                    self._apply_delete(record["id"])
+            except (ValueError, KeyError, TypeError) as err:
+                raise StoreCorruptError(
+                    f"Damaged record on line {number + 1} of {self.log_path}") from err
+            good_bytes += len(line) + 1
+            self._log_records += 1
+        if torn:
+            with open(self.log_path, "r+b") as log:
+                log.truncate(good_bytes)
@@ -0,0 +1,193 @@
+"""Counters and histograms exposed in the Prometheus text format on GET /metrics.
+Recording a value is one dict lookup, one bisect and a few additions under a
+per-metric lock, so the instrumentation can stay on in production. Label
+values are passed positionally, in the order the metric declares them."""
+
+import math
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value: str) -> str:
+    """Escapes a label value for the text format."""
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def format_value(value: float) -> str:
+    """Formats a sample value, using the text format's spelling of infinity."""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """A named metric with one child per distinct set of label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        """Returns the HELP, TYPE and sample lines for this metric."""
+        lines = [f"# HELP {self.name} "
+                 + self.documentation.replace("\\", r"\\").replace("\n", r"\n"),
+                 f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = [(key, self._snapshot(child)) for key, child in self._children.items()]
+        for key, snapshot in sorted(children, key=lambda item: tuple(map(str, item[0]))):
+            lines += self._samples(key, snapshot)
+        return lines
+
+    def clear(self) -> None:
+        """Forgets every recorded value."""
+        with self._lock:
+            self._children.clear()
+
+    def _check(self, label_values: tuple) -> tuple:
+        """Checks that one value was given per label."""
+        if len(label_values) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {label_values}")
+        return label_values
+
+    def _label_text(self, key: tuple, extra: str = "") -> str:
+        """Formats the {name="value",...} part of a sample line."""
+        pairs = [f'{label}="{escape_label(str(value))}"' for label, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @staticmethod
+    def _snapshot(child):
+        return child
+
+    def _samples(self, key: tuple, snapshot) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, *label_values) -> None:
+        """Adds amount to the child for label_values."""
+        if amount < 0:
+            raise ValueError("Counters can only be increased.")
+        with self._lock:
+            value = self._children.get(label_values)
+            if value is None:
+                self._check(label_values)
+                value = 0.0
+            self._children[label_values] = value + amount
+
+    def value(self, *label_values) -> float:
+        """Returns the current total for label_values."""
+        with self._lock:
+            return self._children.get(label_values, 0.0)
+
+    def _samples(self, key: tuple, snapshot) -> list[str]:
+        return [f"{self.name}{self._label_text(key)} {format_value(snapshot)}"]
+
+
+class Histogram(Metric):
+    """Counts observations into cumulative buckets and keeps their sum."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        if list(buckets) != sorted(buckets) or not buckets:
+            raise ValueError("Buckets must be a non-empty increasing sequence.")
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values) -> None:
+        """Records one observation for label_values."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(label_values)
+            if child is None:
+                self._check(label_values)
+                # One count per bucket plus +Inf, then the sum.
+                child = self._children[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            child[index] += 1
+            child[-1] += value
+
+    def count(self, *label_values) -> int:
+        """Returns how many values have been observed for label_values."""
+        with self._lock:
+            child = self._children.get(label_values)
+            return sum(child[:-1]) if child is not None else 0
+
+    @staticmethod
+    def _snapshot(child):
+        return list(child)
+
+    def _samples(self, key: tuple, snapshot) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), snapshot[:-1]):
+            cumulative += count
+            le = f'le="{format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {format_value(snapshot[-1])}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The set of metrics rendered together on GET /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds a metric and returns it, refusing a second one with the same name."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"A metric named {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time spent handling each HTTP request.",
+    ("method", "endpoint", "status")))
+REQUEST_EXCEPTIONS = REGISTRY.register(Counter(
+    "http_request_exceptions_total", "Requests that raised an unhandled exception.",
+    ("method", "endpoint")))
+QUERY_DURATION = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Time spent executing each query from queries/.",
+    ("backend", "query")))
+QUERY_ROWS = REGISTRY.register(Counter(
+    "db_query_rows_total", "Rows returned or changed by each query.",
+    ("backend", "query")))
+QUERY_ERRORS = REGISTRY.register(Counter(
+    "db_query_errors_total", "Queries that raised a database error.",
+    ("backend", "query")))
+SCRAPE_FETCH_DURATION = REGISTRY.register(Histogram(
+    "scrape_fetch_duration_seconds", "Time spent fetching scrape targets, by outcome.",
+    ("outcome",), buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)))
+SCRAPE_PARSE_DURATION = REGISTRY.register(Histogram(
+    "scrape_parse_duration_seconds", "Time spent parsing fetched pages into stories."))
+SCRAPE_STORIES = REGISTRY.register(Counter(
+    "scrape_stories_total", "Stories found, inserted and skipped by scrape jobs.",
+    ("result",)))
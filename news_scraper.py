@@ -3,17 +3,232 @@ Returns URL and title when called in API.
 """
 # pylint: disable=unused-variable, import-error
 
-from urllib.request import urlopen
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
 
 from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
 
+from page_fetcher import DEFAULT_CACHE_DIR, Page, PageFetcher
 
-def get_html(url):
-    """Gets raw HTML of page."""
-    with urlopen(url) as page:
-        html_bytes = page.read()
-        html = html_bytes.decode("utf_8")
-        return html
+DEFAULT_TIMEOUT = 10
+PARSE_MEMO_SIZE = 32
+
+# The tree builder's own tables, so text is grouped exactly as in parse_stories_bs.
+VOID_ELEMENTS = frozenset(HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS)
+STRING_CONTAINERS = frozenset(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+PRESERVE_WHITESPACE = frozenset(HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS)
+ASCII_SPACES = BeautifulSoup.ASCII_SPACES
+DECIMAL_REFERENCE = re.compile(r"^([0-9]+)(.*)")
+HEX_REFERENCE = re.compile(r"^([0-9a-f]+)(.*)")
+REPLACEMENT_CHARACTER = "\ufffd"
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+_parse_memo = OrderedDict()
+_parse_memo_lock = threading.Lock()
+
+
+def get_page(url, timeout=DEFAULT_TIMEOUT, page_fetcher=None) -> Page:
+    """Fetches a page, revalidating the copy cached on disk from the last fetch."""
+    return (page_fetcher or default_fetcher()).fetch(url, timeout)
+
+
+def default_fetcher() -> PageFetcher:
+    """The fetcher used when none is passed, created (with its cache
+    directory) the first time it is needed."""
+    global _fetcher  # pylint: disable=global-statement
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = PageFetcher(cache_dir=DEFAULT_CACHE_DIR)
+        return _fetcher
+
+
+def get_html(url, timeout=DEFAULT_TIMEOUT):
+    """Gets raw HTML of page, giving up if the server stalls for timeout seconds."""
+    return get_page(url, timeout).text
+
+
+def dereference_charref(name):
+    """Decodes the number of a numeric character reference as BeautifulSoup's
+    html.parser builder does, returning the character and any text after the
+    number that is not part of the reference. Following the HTML spec, C1
+    control references are read as Windows-1252 and numbers that are not
+    characters become U+FFFD."""
+    base, pattern = (16, HEX_REFERENCE) if name[:1] in "xX" else (10, DECIMAL_REFERENCE)
+    digits = name[1:] if base == 16 else name
+    extra = ""
+    try:
+        number = int(digits, base)
+    except ValueError:
+        match = pattern.search(digits)
+        if match is None:
+            return "", digits
+        number, extra = int(match.group(1), base), match.group(2)
+    if number == 0 or number > 0x10FFFF or 0xD800 <= number <= 0xDFFF:
+        return REPLACEMENT_CHARACTER, extra
+    if 0x80 <= number <= 0x9F:
+        try:
+            return bytes([number]).decode("windows-1252"), extra
+        except UnicodeDecodeError:
+            pass
+    return chr(number), extra
+
+
+def is_story_href(href):
+    """True if an anchor's href looks like a relative link to a news story."""
+    return bool(href) and "news/" in href and href[-8:].isnumeric() and href[:4] != "http"
+
+
+class AnchorParser(HTMLParser):
+    """Streaming parser that only keeps the href and text of <a> elements.
+    It mirrors how BeautifulSoup's html.parser builder nests tags and groups
+    text, without building a tree: unmatched end tags are ignored, void
+    elements close immediately and whitespace-only text runs collapse to one
+    space or newline. Script, style and template text is left out of the
+    anchor text, as is comment and doctype text."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.anchors = []
+        self._stack = []
+        self._open_counts = {}
+        self._open_anchors = []
+        self._containers = 0
+        self._preserve = 0
+        self._data = []
+        self._already_closed = []
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._end_data()
+        anchor = None
+        if tag == "a":
+            href = None
+            for key, value in attrs:
+                if key == "href":
+                    href = value if value is not None else ""
+            anchor = [href, []]
+            self.anchors.append(anchor)
+            self._open_anchors.append(anchor)
+
+        self._stack.append((tag, anchor))
+        self._open_counts[tag] = self._open_counts.get(tag, 0) + 1
+        if tag in STRING_CONTAINERS:
+            self._containers += 1
+        if tag in PRESERVE_WHITESPACE:
+            self._preserve += 1
+
+        if handle_empty_element and tag in VOID_ELEMENTS:
+            self.handle_endtag(tag, check_already_closed=False)
+            self._already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self._already_closed:
+            self._already_closed.remove(tag)
+            return
+        self._end_data()
+        if not self._open_counts.get(tag):
+            return
+        while True:
+            name, anchor = self._stack.pop()
+            self._open_counts[name] -= 1
+            if name in STRING_CONTAINERS:
+                self._containers -= 1
+            if name in PRESERVE_WHITESPACE:
+                self._preserve -= 1
+            if anchor is not None:
+                self._open_anchors.pop()
+            if name == tag:
+                return
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        text, extra = dereference_charref(name)
+        self._data.append(text)
+        self._data.append(extra)
+
+    def handle_entityref(self, name):
+        text = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self._data.append(text if text is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith("CDATA["):
+            self._data.append(data[6:])
+            self._end_data(cdata=True)
+        else:
+            self._data = []
+
+    def close(self):
+        super().close()
+        self._end_data()
+
+    def _end_data(self, cdata=False):
+        """Closes the current run of text and adds it to every open anchor."""
+        if not self._data:
+            return
+        text = "".join(self._data)
+        self._data = []
+        if not self._preserve and not text.strip(ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        if self._containers and not cdata:
+            return
+        for anchor in self._open_anchors:
+            anchor[1].append(text)
+
+
+def parse_stories(domain_url, html):
+    """Parse stories URL and title from HTML, looking only at anchors.
+    Returns the same list as parse_stories_bs in a single pass over the page."""
+    parser = AnchorParser()
+    parser.feed(html)
+    parser.close()
+
+    stories = []
+    seen = set()
+    for href, parts in parser.anchors:
+        if href is None or href in seen or not is_story_href(href):
+            continue
+        text = "".join(parts)
+        if text[:5] != "Video":
+            stories.append((f"{domain_url}{href}", text))
+            seen.add(href)
+    return stories
+
+
+def parse_page(domain_url, page: Page):
+    """Parses the stories of a fetched page, reusing the result for a page
+    whose content hash has been parsed before."""
+    key = (domain_url, page.digest)
+    with _parse_memo_lock:
+        if key in _parse_memo:
+            _parse_memo.move_to_end(key)
+            return list(_parse_memo[key])
+
+    stories = parse_stories(domain_url, page.text)
+    with _parse_memo_lock:
+        _parse_memo[key] = tuple(stories)
+        while len(_parse_memo) > PARSE_MEMO_SIZE:
+            _parse_memo.popitem(last=False)
+    return stories
 
 
 def parse_stories_bs(domain_url, html):
@@ -34,4 +249,4 @@ def parse_stories_bs(domain_url, html):
 
 if __name__ == "__main__":
     bbc_html_doc = get_html("http://bbc.co.uk/news")
-    print(parse_stories_bs("http://bbc.co.uk/news", bbc_html_doc))
+    print(parse_stories("http://bbc.co.uk/news", bbc_html_doc))
@@ -0,0 +1,242 @@
+"""HTTP fetching for the scraper with compression, keep-alive and revalidation.
+Each worker thread keeps one persistent connection per host, bodies are
+requested gzip-compressed, and pages are stored on disk with their ETag and
+Last-Modified validators so an unchanged page costs a 304 instead of a download."""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from email.message import Message
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "social_news_pages")
+USER_AGENT = "social-news-scraper/1.0"
+READ_CHUNK = 64 * 1024
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+
+@dataclass
+class Page:
+    """A fetched page, either freshly downloaded or revalidated from the cache."""
+    url: str
+    text: str
+    digest: str
+    not_modified: bool = False
+    bytes_received: int = 0
+
+
+class PageFetcher:
+    """Fetches pages over per-thread persistent connections.
+    cache_dir holds the last copy of every page fetched; pass None to disable it."""
+
+    def __init__(self, cache_dir: str | None = None, user_agent: str = USER_AGENT,
+                 max_redirects: int = MAX_REDIRECTS):
+        self.cache_dir = cache_dir
+        self.user_agent = user_agent
+        self.max_redirects = max_redirects
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._not_modified = 0
+        self._connections = 0
+        self._bytes_received = 0
+        self._bytes_decoded = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def fetch(self, url: str, timeout: float) -> Page:
+        """Fetches url, revalidating any cached copy. Raises HTTPError for error
+        statuses and URLError when the host cannot be reached, like urlopen."""
+        cached = self._load(url)
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        target = url
+        for _ in range(self.max_redirects + 1):
+            status, reason, response_headers, body, received = self._request(
+                target, headers, timeout)
+            if status in REDIRECT_CODES and response_headers.get("Location"):
+                target = urljoin(target, response_headers["Location"])
+                continue
+            break
+        else:
+            raise HTTPError(target, status, "Too many redirects", response_headers, None)
+
+        if status == 304 and cached is not None:
+            text = self._read_body(url)
+            if text is not None:
+                with self._lock:
+                    self._not_modified += 1
+                return Page(url, text, cached["digest"], True, received)
+            self._forget(url)
+            return self.fetch(url, timeout)
+        if status >= 400 or status == 304:
+            raise HTTPError(target, status, reason, response_headers, None)
+
+        text = body.decode(self._charset(response_headers), errors="replace")
+        digest = hashlib.sha256(body).hexdigest()
+        meta = {"url": url,
+                "etag": response_headers.get("ETag"),
+                "last_modified": response_headers.get("Last-Modified"),
+                "digest": digest,
+                "fetched_at": time.time()}
+        if ((meta["etag"] or meta["last_modified"])
+                and "no-store" not in response_headers.get("Cache-Control", "")):
+            self._store(url, text, meta)
+        elif cached is not None:
+            self._forget(url)
+        return Page(url, text, digest, False, received)
+
+    def close(self) -> None:
+        """Closes the calling thread's persistent connections."""
+        for conn in getattr(self._local, "connections", {}).values():
+            conn.close()
+        self._local.connections = {}
+
+    def stats(self) -> dict:
+        """Returns request, revalidation and transfer counts."""
+        with self._lock:
+            return {"requests": self._requests,
+                    "not_modified": self._not_modified,
+                    "connections_opened": self._connections,
+                    "bytes_received": self._bytes_received,
+                    "bytes_decoded": self._bytes_decoded,
+                    "cache_dir": self.cache_dir}
+
+    def _request(self, url: str, headers: dict, timeout: float) -> tuple:
+        """Sends one GET over the thread's connection to the host, retrying once
+        on a fresh connection if a reused one turns out to have been closed."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise URLError(f"unknown url type: {parts.scheme}")
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        headers = {"User-Agent": self.user_agent, "Accept-Encoding": "gzip", **headers}
+
+        for attempt in range(2):
+            conn, reused = self._connection(parts.scheme, parts.netloc, timeout)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body, received = self._read(response)
+            except (HTTPException, ConnectionError) as err:
+                self._drop(parts.scheme, parts.netloc)
+                if reused and attempt == 0:
+                    continue
+                raise URLError(err) from err
+            except OSError as err:
+                self._drop(parts.scheme, parts.netloc)
+                raise URLError(err) from err
+            if response.will_close:
+                self._drop(parts.scheme, parts.netloc)
+            with self._lock:
+                self._requests += 1
+                self._bytes_received += received
+                self._bytes_decoded += len(body)
+            return response.status, response.reason, response.headers, body, received
+        raise URLError("connection closed")
+
+    def _connection(self, scheme: str, netloc: str, timeout: float) -> tuple:
+        """Returns the thread's open connection to a host, or a new one."""
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get((scheme, netloc))
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+
+        conn_class = HTTPSConnection if scheme == "https" else HTTPConnection
+        conn = connections[scheme, netloc] = conn_class(netloc, timeout=timeout)
+        with self._lock:
+            self._connections += 1
+        return conn, False
+
+    def _drop(self, scheme: str, netloc: str) -> None:
+        """Closes and forgets the thread's connection to a host."""
+        conn = getattr(self._local, "connections", {}).pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    @staticmethod
+    def _read(response) -> tuple[bytes, int]:
+        """Reads a response body in chunks, decompressing gzip as it arrives.
+        Returns the decoded body and the number of bytes on the wire."""
+        gzipped = response.getheader("Content-Encoding", "").lower() == "gzip"
+        decompressor = zlib.decompressobj(wbits=31) if gzipped else None
+        chunks = []
+        received = 0
+        while chunk := response.read(READ_CHUNK):
+            received += len(chunk)
+            chunks.append(decompressor.decompress(chunk) if gzipped else chunk)
+        if gzipped:
+            chunks.append(decompressor.flush())
+        return b"".join(chunks), received
+
+    @staticmethod
+    def _charset(headers: Message) -> str:
+        """Returns the charset named in the Content-Type header, defaulting to UTF-8."""
+        match = CHARSET.search(headers.get("Content-Type", ""))
+        return match.group(1) if match else "utf_8"
+
+    def _paths(self, url: str) -> tuple[str, str]:
+        """Returns the metadata and body file paths for a cached URL."""
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return (os.path.join(self.cache_dir, f"{key}.json"),
+                os.path.join(self.cache_dir, f"{key}.html"))
+
+    def _load(self, url: str) -> dict | None:
+        """Returns the cached metadata for url, if any."""
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._paths(url)[0], encoding="utf-8") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("url") == url else None
+
+    def _read_body(self, url: str) -> str | None:
+        """Returns the cached body for url, or None if it has gone missing."""
+        try:
+            with open(self._paths(url)[1], encoding="utf-8") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def _store(self, url: str, text: str, meta: dict) -> None:
+        """Writes the body then the metadata, each atomically, so a reader
+        never sees validators for a body that is not on disk."""
+        if self.cache_dir is None:
+            return
+        meta_path, body_path = self._paths(url)
+        for path, content in ((body_path, text), (meta_path, json.dumps(meta))):
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+
+    def _forget(self, url: str) -> None:
+        """Removes a cache entry that can no longer be used."""
+        for path in self._paths(url):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,72 @@
+  WITH locked AS (
+       SELECT id
+
+         FROM stories
+
+        WHERE id = ANY($1::int[])
+
+     ORDER BY id
+
+          FOR NO KEY UPDATE
+       ),
+
+       batch AS (
+       SELECT b.position
+            , b.story_id
+            , b.vote
+            , l.id IS NOT NULL AS found
+
+         FROM unnest($1::int[], $2::text[]) WITH ORDINALITY AS b (story_id, vote, position)
+
+              LEFT OUTER JOIN locked AS l
+              ON l.id = b.story_id
+       ),
+
+       new_votes AS (
+       INSERT INTO votes (story_id, vote)
+
+       SELECT story_id
+            , vote
+
+         FROM batch
+
+        WHERE found
+
+     ORDER BY position
+
+    RETURNING story_id
+            , vote
+       ),
+
+       tallies AS (
+       SELECT story_id
+            , SUM(CASE
+                  WHEN vote = 'u' THEN 1
+                  WHEN vote = 'd' THEN -1
+                  ELSE 0
+                  END) AS delta
+
+         FROM new_votes
+
+     GROUP BY story_id
+       ),
+
+       scores AS (
+       UPDATE stories AS s
+
+          SET score = s.score + t.delta
+
+         FROM tallies AS t
+
+        WHERE s.id = t.story_id
+
+    RETURNING s.id
+       )
+
+  SELECT position
+       , story_id
+       , found
+
+    FROM batch
+
+ORDER BY position;
@@ -0,0 +1,50 @@
+-- Rolls one closed month up into vote_rollups and marks it compacted, in one
+-- transaction. Only the month's partition is locked, so votes for the
+-- current month are recorded throughout; detach_vote_partition drops the
+-- raw votes afterwards. The stories are locked before the partition, the
+-- same order in which a story delete cascades into it, so the two cannot
+-- deadlock.
+SELECT id
+
+  FROM stories
+
+ WHERE id IN (SELECT story_id FROM {partition})
+
+ ORDER BY id
+
+   FOR KEY SHARE;
+
+LOCK TABLE {partition} IN SHARE MODE;
+
+CREATE TEMPORARY TABLE compacted_votes ON COMMIT DROP AS
+SELECT story_id
+     , created_at::date AS day
+     , COUNT(*) FILTER (WHERE vote = 'u') AS ups
+     , COUNT(*) FILTER (WHERE vote = 'd') AS downs
+
+  FROM {partition}
+
+ GROUP BY story_id
+        , created_at::date;
+
+INSERT INTO vote_rollups AS r (story_id, day, ups, downs)
+
+SELECT story_id
+     , day
+     , ups
+     , downs
+
+  FROM compacted_votes
+
+    ON CONFLICT (story_id, day) DO UPDATE
+
+   SET ups = r.ups + EXCLUDED.ups
+     , downs = r.downs + EXCLUDED.downs;
+
+INSERT INTO compacted_vote_months (month, votes, rollups)
+
+SELECT $1
+     , COALESCE(SUM(ups + downs), 0)
+     , COUNT(*)
+
+  FROM compacted_votes;
@@ -0,0 +1,5 @@
+   SELECT month
+
+     FROM compacted_vote_months
+
+ ORDER BY month
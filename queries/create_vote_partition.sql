@@ -0,0 +1,33 @@
+-- Creates the partition for one month, first moving any of that month's
+-- votes out of votes_default, which would otherwise reject the new bounds.
+LOCK TABLE votes IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TEMPORARY TABLE moved_votes (LIKE votes) ON COMMIT DROP;
+
+  WITH moved AS (
+       DELETE FROM votes_default
+
+        WHERE created_at >= $1
+          AND created_at < $2
+
+    RETURNING *
+       )
+
+INSERT INTO moved_votes
+
+SELECT *
+
+  FROM moved;
+
+CREATE TABLE {partition}
+PARTITION OF votes
+FOR VALUES FROM ($1) TO ($2);
+
+INSERT INTO votes (id, story_id, vote, created_at, updated_at)
+OVERRIDING SYSTEM VALUE
+SELECT id
+     , story_id
+     , vote
+     , created_at
+     , updated_at
+  FROM moved_votes;
@@ -0,0 +1,5 @@
+   SELECT DISTINCT date_trunc('month', created_at) AS month
+
+     FROM votes_default
+
+ ORDER BY month
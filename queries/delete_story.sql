@@ -0,0 +1,9 @@
+-- Takes votes before the story row, the order in which compaction drops a
+-- partition, so a delete never waits on compaction while holding the story.
+LOCK TABLE votes IN ROW EXCLUSIVE MODE;
+
+DELETE FROM stories
+
+ WHERE id = $1
+
+ RETURNING *
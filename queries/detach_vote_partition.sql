@@ -0,0 +1,20 @@
+-- Drops the raw votes of a month that compact_vote_partition has rolled up.
+-- This is the only step that locks votes itself, and it holds nothing else
+-- while it waits, so it takes votes before the partition like a story
+-- delete does. DETACH PARTITION CONCURRENTLY cannot be used alongside
+-- votes_default, so new votes wait for the brief DETACH and DROP instead.
+ALTER TABLE votes
+DETACH PARTITION {partition};
+
+DROP TABLE {partition};
+
+-- Fresh statistics also replan the cascade from stories, which may have
+-- been planned while vote_rollups was still empty.
+ANALYZE vote_rollups;
+
+DELETE FROM compacted_vote_months
+
+ WHERE month = $1
+
+ RETURNING rollups
+         , votes;
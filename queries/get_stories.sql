@@ -1,25 +1,14 @@
-   SELECT s.id
-        , s.title
-        , s.url
-        , s.created_at
-        , s.updated_at
-        , SUM(CASE
-              WHEN vote = 'u' THEN 1
-              WHEN vote = 'd' THEN -1
-              ELSE 0
-              END) AS "score"
+   SELECT id
+        , title
+        , url
+        , created_at
+        , updated_at
+        , score
+        , hot_score
 
-     FROM stories AS s
+     FROM stories
 
-          LEFT OUTER JOIN votes AS v
-          ON s.id = v.story_id
+    WHERE title ILIKE $1
 
-    WHERE title ILIKE {}
-
- GROUP BY s.id
-        , s.title
-        , s.url
-        , s.created_at
-        , s.updated_at
-
- ORDER BY {} {}
\ No newline at end of file
+ ORDER BY {sort} {order}
+        , id {order}
@@ -0,0 +1,14 @@
+   SELECT id
+        , title
+        , url
+        , EXTRACT(EPOCH FROM created_at)::double precision AS created_at
+        , EXTRACT(EPOCH FROM updated_at)::double precision AS updated_at
+        , score
+        , hot_score
+
+     FROM stories
+
+    WHERE title ILIKE $1
+
+ ORDER BY {sort} {order}
+        , id {order}
@@ -0,0 +1,17 @@
+   SELECT id
+        , title
+        , url
+        , created_at
+        , updated_at
+        , score
+        , hot_score
+
+     FROM stories
+
+    WHERE title ILIKE $1
+      AND {keyset}
+
+ ORDER BY {sort} {order}
+        , id {order}
+
+    LIMIT $2
@@ -0,0 +1,6 @@
+INSERT INTO stories (URL, title)
+SELECT *
+  FROM unnest($1::text[], $2::text[])
+ON CONFLICT ((lower(rtrim(split_part(URL, '#', 1), '/'))))
+DO NOTHING
+RETURNING id;
@@ -1,3 +1,22 @@
-INSERT INTO stories (URL, title)
-VALUES ({}, {})
-RETURNING id;
\ No newline at end of file
+  WITH inserted AS (
+       INSERT INTO stories (URL, title)
+       VALUES ($1, $2)
+       ON CONFLICT ((lower(rtrim(split_part(URL, '#', 1), '/'))))
+       DO NOTHING
+       RETURNING id
+       )
+
+SELECT id
+     , TRUE AS created
+
+  FROM inserted
+
+ UNION ALL
+
+SELECT id
+     , FALSE AS created
+
+  FROM stories
+
+ WHERE lower(rtrim(split_part(URL, '#', 1), '/')) = lower(rtrim(split_part($1, '#', 1), '/'))
+   AND NOT EXISTS (SELECT 1 FROM inserted);
@@ -0,0 +1,58 @@
+  WITH locked AS (
+       SELECT id
+
+         FROM stories
+
+        WHERE id = ANY($1::int[])
+
+     ORDER BY id
+
+          FOR NO KEY UPDATE
+       ),
+
+       batch AS (
+       SELECT story_id
+            , vote
+
+         FROM unnest($1::int[], $2::text[]) AS b (story_id, vote)
+       ),
+
+       new_votes AS (
+       INSERT INTO votes (story_id, vote)
+
+       SELECT b.story_id
+            , b.vote
+
+         FROM batch AS b
+
+              INNER JOIN locked AS l
+              ON l.id = b.story_id
+
+    RETURNING story_id
+            , vote
+       ),
+
+       tallies AS (
+       SELECT story_id
+            , COUNT(*) AS votes
+            , SUM(CASE
+                  WHEN vote = 'u' THEN 1
+                  WHEN vote = 'd' THEN -1
+                  ELSE 0
+                  END) AS delta
+
+         FROM new_votes
+
+     GROUP BY story_id
+       )
+
+UPDATE stories AS s
+
+   SET score = s.score + t.delta
+
+  FROM tallies AS t
+
+ WHERE s.id = t.story_id
+
+ RETURNING s.id
+         , t.votes;
\ No newline at end of file
@@ -0,0 +1,29 @@
+BEGIN;
+
+-- The score column left by tables.sql is dropped by seed.sql and was never
+-- kept up to date, so rebuild it from the votes table.
+ALTER TABLE stories
+DROP COLUMN IF EXISTS score;
+
+ALTER TABLE stories
+ADD COLUMN score INT NOT NULL DEFAULT 0;
+
+UPDATE stories AS s
+
+   SET score = t.score
+
+  FROM (SELECT story_id
+             , SUM(CASE
+                   WHEN vote = 'u' THEN 1
+                   WHEN vote = 'd' THEN -1
+                   ELSE 0
+                   END) AS score
+          FROM votes
+      GROUP BY story_id) AS t
+
+ WHERE s.id = t.story_id;
+
+CREATE INDEX IF NOT EXISTS votes_story_id_idx
+    ON votes (story_id);
+
+COMMIT;
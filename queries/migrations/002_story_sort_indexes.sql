@@ -0,0 +1,17 @@
+BEGIN;
+
+-- One index per sort offered by GET /stories, with id as the tie-breaker,
+-- so keyset pagination can seek straight to the start of any page.
+CREATE INDEX IF NOT EXISTS stories_title_id_idx
+    ON stories (title, id);
+
+CREATE INDEX IF NOT EXISTS stories_created_at_id_idx
+    ON stories (created_at, id);
+
+CREATE INDEX IF NOT EXISTS stories_updated_at_id_idx
+    ON stories (updated_at, id);
+
+CREATE INDEX IF NOT EXISTS stories_score_id_idx
+    ON stories (score, id);
+
+COMMIT;
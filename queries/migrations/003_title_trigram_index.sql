@@ -0,0 +1,11 @@
+BEGIN;
+
+-- Lets the planner answer title ILIKE '%term%' from a trigram index instead
+-- of a sequential scan over every story.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS stories_title_trgm_idx
+    ON stories
+ USING gin (title gin_trgm_ops);
+
+COMMIT;
@@ -0,0 +1,44 @@
+BEGIN;
+
+-- Fold stories that share a normalized URL into the oldest one, moving their
+-- votes and scores across, so the unique index below can be built.
+CREATE TEMPORARY TABLE duplicate_stories ON COMMIT DROP AS
+SELECT id
+     , keep_id
+
+  FROM (SELECT id
+             , MIN(id) OVER (PARTITION BY lower(rtrim(split_part(URL, '#', 1), '/'))) AS keep_id
+          FROM stories) AS s
+
+ WHERE id <> keep_id;
+
+UPDATE votes AS v
+
+   SET story_id = d.keep_id
+
+  FROM duplicate_stories AS d
+
+ WHERE v.story_id = d.id;
+
+UPDATE stories AS s
+
+   SET score = s.score + t.score
+
+  FROM (SELECT d.keep_id
+             , SUM(dup.score) AS score
+          FROM duplicate_stories AS d
+               INNER JOIN stories AS dup
+               ON dup.id = d.id
+      GROUP BY d.keep_id) AS t
+
+ WHERE s.id = t.keep_id;
+
+DELETE FROM stories AS s
+      USING duplicate_stories AS d
+      WHERE s.id = d.id;
+
+-- URLs are compared case-insensitively, without a fragment or trailing slash.
+CREATE UNIQUE INDEX IF NOT EXISTS stories_normalized_url_idx
+    ON stories ((lower(rtrim(split_part(URL, '#', 1), '/'))));
+
+COMMIT;
@@ -0,0 +1,16 @@
+BEGIN;
+
+-- The ranking behind sort=hot, kept up to date by Postgres whenever a vote
+-- changes the score. Ten times the net score is worth as much as being
+-- posted 45000 seconds (12.5 hours) later, and every story decays at the
+-- same rate, so the stored order stays correct as time passes and nothing
+-- has to rewrite the column periodically. Mirrors sql_methods.hot_score.
+ALTER TABLE stories
+ADD COLUMN IF NOT EXISTS hot_score DOUBLE PRECISION
+    GENERATED ALWAYS AS (SIGN(score) * LOG(GREATEST(ABS(score), 1)::double precision)
+                         + EXTRACT(EPOCH FROM created_at)::double precision / 45000) STORED;
+
+CREATE INDEX IF NOT EXISTS stories_hot_score_id_idx
+    ON stories (hot_score, id);
+
+COMMIT;
@@ -0,0 +1,83 @@
+BEGIN;
+
+-- Votes are range-partitioned by month of created_at, so a month that has
+-- closed can be rolled up into vote_rollups and detached without touching
+-- any other month (see compact_votes.py). Partitions are named
+-- votes_YYYY_MM; votes_default catches anything outside them until
+-- sql_methods.ensure_vote_partitions moves it into its month.
+ALTER TABLE votes
+RENAME TO votes_unpartitioned;
+
+ALTER TABLE votes_unpartitioned
+RENAME CONSTRAINT votes_pkey TO votes_unpartitioned_pkey;
+
+ALTER TABLE votes_unpartitioned
+RENAME CONSTRAINT votes_vote_check TO votes_unpartitioned_vote_check;
+
+ALTER TABLE votes_unpartitioned
+RENAME CONSTRAINT votes_story_id_fkey TO votes_unpartitioned_story_id_fkey;
+
+CREATE TABLE votes (
+    PRIMARY KEY (id, created_at),
+    id         INT GENERATED ALWAYS AS IDENTITY,
+    story_id   INT NOT NULL,
+               FOREIGN KEY (story_id)
+               REFERENCES stories(id)
+               ON DELETE CASCADE,
+    vote       CHAR(1) NOT NULL CHECK (vote = 'u' OR vote = 'd'),
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()::timestamp,
+    updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()::timestamp
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE votes_default
+PARTITION OF votes DEFAULT;
+
+-- One partition for every month that has votes, through next month.
+DO $$
+DECLARE
+    month TIMESTAMP;
+BEGIN
+    FOR month IN
+        SELECT generate_series(date_trunc('month', LEAST(MIN(created_at), NOW()::timestamp)),
+                               date_trunc('month', NOW()::timestamp) + INTERVAL '1 month',
+                               INTERVAL '1 month')
+          FROM votes_unpartitioned
+    LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF votes FOR VALUES FROM (%L) TO (%L)',
+                       'votes_' || to_char(month, 'YYYY_MM'), month, month + INTERVAL '1 month');
+    END LOOP;
+END $$;
+
+INSERT INTO votes (id, story_id, vote, created_at, updated_at)
+OVERRIDING SYSTEM VALUE
+SELECT id
+     , story_id
+     , vote
+     , created_at
+     , updated_at
+  FROM votes_unpartitioned;
+
+SELECT setval(pg_get_serial_sequence('votes', 'id'), MAX(id))
+  FROM votes
+HAVING MAX(id) IS NOT NULL;
+
+DROP TABLE votes_unpartitioned;
+
+-- Deleting a story finds its votes through this index in each partition.
+CREATE INDEX IF NOT EXISTS votes_story_id_idx
+    ON votes (story_id);
+
+-- The net votes of compacted months, one row per story and day. A story's
+-- score is the sum over its raw votes plus ups - downs over its rollups.
+CREATE TABLE IF NOT EXISTS vote_rollups (
+    PRIMARY KEY (story_id, day),
+    story_id INT NOT NULL,
+             FOREIGN KEY (story_id)
+             REFERENCES stories(id)
+             ON DELETE CASCADE,
+    day      DATE NOT NULL,
+    ups      INT NOT NULL DEFAULT 0,
+    downs    INT NOT NULL DEFAULT 0
+);
+
+COMMIT;
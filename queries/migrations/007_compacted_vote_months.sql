@@ -0,0 +1,14 @@
+BEGIN;
+
+-- Months that compact_votes has rolled up into vote_rollups but whose
+-- partition has not been detached yet. Their raw votes are already counted
+-- by the rollups, so reconcile_scores skips them; the row is removed when
+-- the partition is dropped.
+CREATE TABLE IF NOT EXISTS compacted_vote_months (
+    PRIMARY KEY (month),
+    month   TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    votes   BIGINT NOT NULL,
+    rollups BIGINT NOT NULL
+);
+
+COMMIT;
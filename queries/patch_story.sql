@@ -1,9 +1,9 @@
 UPDATE stories 
 
-   SET URL = {},
-       title = {},
+   SET URL = COALESCE(NULLIF($1, ''), URL),
+       title = COALESCE(NULLIF($2, ''), title),
        updated_at = NOW()::timestamp
 
- WHERE id = {}
+ WHERE id = $3
 
- RETURNING id
\ No newline at end of file
+ RETURNING id
@@ -0,0 +1,57 @@
+LOCK TABLE votes, vote_rollups, compacted_vote_months IN SHARE MODE;
+
+-- Raw votes of a month that is already rolled up but not yet detached are
+-- counted through vote_rollups only.
+  WITH tallies AS (
+       SELECT v.story_id
+            , SUM(CASE
+                  WHEN v.vote = 'u' THEN 1
+                  WHEN v.vote = 'd' THEN -1
+                  ELSE 0
+                  END) AS score
+
+         FROM votes AS v
+
+        WHERE NOT EXISTS (SELECT 1
+                            FROM compacted_vote_months AS m
+                           WHERE v.created_at >= m.month
+                             AND v.created_at < m.month + INTERVAL '1 month')
+
+     GROUP BY v.story_id
+
+    UNION ALL
+
+       SELECT story_id
+            , SUM(ups - downs) AS score
+
+         FROM vote_rollups
+
+     GROUP BY story_id
+       ),
+
+       scores AS (
+       SELECT s.id
+            , s.score AS stored_score
+            , COALESCE(SUM(t.score), 0)::int AS actual_score
+
+         FROM stories AS s
+
+              LEFT OUTER JOIN tallies AS t
+              ON s.id = t.story_id
+
+     GROUP BY s.id
+            , s.score
+       )
+
+UPDATE stories AS s
+
+   SET score = t.actual_score
+
+  FROM scores AS t
+
+ WHERE s.id = t.id
+   AND t.stored_score <> t.actual_score
+
+ RETURNING s.id
+         , t.stored_score
+         , t.actual_score;
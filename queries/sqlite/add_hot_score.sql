@@ -0,0 +1,7 @@
+-- Upgrades a database created before hot_score existed. SQLite can only add
+-- virtual generated columns; stories_hot_score_id_idx still stores the values.
+ALTER TABLE stories
+ADD COLUMN hot_score REAL GENERATED ALWAYS AS (
+    (CASE WHEN score > 0 THEN 1 WHEN score < 0 THEN -1 ELSE 0 END)
+    * log10(max(abs(score), 1))
+    + (julianday(created_at) - 2440587.5) * 86400.0 / 45000) VIRTUAL
@@ -0,0 +1,9 @@
+UPDATE stories
+
+   SET score = score + CASE
+                       WHEN $2 = 'u' THEN 1
+                       WHEN $2 = 'd' THEN -1
+                       ELSE 0
+                       END
+
+ WHERE id = $1
@@ -0,0 +1,20 @@
+  WITH tallies AS (
+       SELECT json_extract(value, '$[0]') AS story_id
+            , SUM(CASE
+                  WHEN json_extract(value, '$[1]') = 'u' THEN 1
+                  WHEN json_extract(value, '$[1]') = 'd' THEN -1
+                  ELSE 0
+                  END) AS delta
+
+         FROM json_each($1)
+
+     GROUP BY 1
+       )
+
+UPDATE stories AS s
+
+   SET score = s.score + t.delta
+
+  FROM tallies AS t
+
+ WHERE s.id = t.story_id
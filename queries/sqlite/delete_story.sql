@@ -0,0 +1,5 @@
+DELETE FROM stories
+
+ WHERE id = $1
+
+ RETURNING id
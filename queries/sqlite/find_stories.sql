@@ -0,0 +1,9 @@
+   SELECT b.key AS position
+        , s.id IS NOT NULL AS found
+
+     FROM json_each($1) AS b
+
+          LEFT OUTER JOIN stories AS s
+          ON s.id = json_extract(b.value, '$[0]')
+
+ ORDER BY b.key
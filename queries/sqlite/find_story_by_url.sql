@@ -0,0 +1,5 @@
+SELECT id
+
+  FROM stories
+
+ WHERE normalized_url = $1
@@ -0,0 +1,14 @@
+   SELECT id
+        , title
+        , url
+        , created_at
+        , updated_at
+        , score
+        , hot_score
+
+     FROM stories
+
+    WHERE title LIKE $1
+
+ ORDER BY {sort} {order}
+        , id {order}
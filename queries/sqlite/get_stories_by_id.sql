@@ -0,0 +1,13 @@
+   SELECT id
+        , title
+        , url
+        , created_at
+        , updated_at
+        , score
+        , hot_score
+
+     FROM stories
+
+    WHERE id IN (SELECT value FROM json_each($1))
+
+ ORDER BY id
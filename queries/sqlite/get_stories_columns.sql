@@ -0,0 +1,16 @@
+   SELECT id
+        , title
+        , url
+        , CAST(strftime('%s', created_at) AS INTEGER)
+          + CAST(substr(created_at, 20) AS REAL) AS created_at
+        , CAST(strftime('%s', updated_at) AS INTEGER)
+          + CAST(substr(updated_at, 20) AS REAL) AS updated_at
+        , score
+        , hot_score
+
+     FROM stories
+
+    WHERE title LIKE $1
+
+ ORDER BY {sort} {order}
+        , id {order}
@@ -0,0 +1,11 @@
+INSERT INTO stories (url, title, normalized_url, created_at, updated_at)
+SELECT json_extract(value, '$[0]')
+     , json_extract(value, '$[1]')
+     , json_extract(value, '$[2]')
+     , $2
+     , $2
+  FROM json_each($1)
+ WHERE TRUE
+ON CONFLICT (normalized_url)
+DO NOTHING
+RETURNING id
@@ -0,0 +1,5 @@
+INSERT INTO stories (url, title, normalized_url, created_at, updated_at)
+VALUES ($1, $2, $3, $4, $4)
+ON CONFLICT (normalized_url)
+DO NOTHING
+RETURNING id
@@ -0,0 +1,7 @@
+INSERT INTO votes (story_id, vote, created_at)
+SELECT id
+     , $2
+     , $3
+  FROM stories
+ WHERE id = $1
+RETURNING id
@@ -0,0 +1,14 @@
+INSERT INTO votes (story_id, vote, created_at)
+
+SELECT s.id
+     , json_extract(b.value, '$[1]')
+     , $2
+
+  FROM json_each($1) AS b
+
+       INNER JOIN stories AS s
+       ON s.id = json_extract(b.value, '$[0]')
+
+ ORDER BY b.key
+
+ RETURNING id
@@ -0,0 +1,10 @@
+UPDATE stories
+
+   SET url = COALESCE(NULLIF($1, ''), url),
+       normalized_url = COALESCE(NULLIF($2, ''), normalized_url),
+       title = COALESCE(NULLIF($3, ''), title),
+       updated_at = $4
+
+ WHERE id = $5
+
+ RETURNING id
@@ -0,0 +1,44 @@
+-- Timestamps are ISO 8601 text, which sorts chronologically. normalized_url
+-- holds sql_methods.normalize_url(url), enforcing the same uniqueness as
+-- stories_normalized_url_idx does in Postgres. hot_score mirrors the Postgres
+-- column of the same name and sql_methods.hot_score.
+CREATE TABLE IF NOT EXISTS stories (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    title          TEXT NOT NULL,
+    url            TEXT NOT NULL,
+    normalized_url TEXT NOT NULL UNIQUE,
+    score          INTEGER NOT NULL DEFAULT 0,
+    created_at     TEXT NOT NULL,
+    updated_at     TEXT NOT NULL,
+    hot_score      REAL GENERATED ALWAYS AS (
+                       (CASE WHEN score > 0 THEN 1 WHEN score < 0 THEN -1 ELSE 0 END)
+                       * log10(max(abs(score), 1))
+                       + (julianday(created_at) - 2440587.5) * 86400.0 / 45000) STORED
+);
+
+CREATE TABLE IF NOT EXISTS votes (
+    id         INTEGER PRIMARY KEY,
+    story_id   INTEGER NOT NULL
+               REFERENCES stories(id)
+               ON DELETE CASCADE,
+    vote       TEXT NOT NULL CHECK (vote = 'u' OR vote = 'd'),
+    created_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS votes_story_id_idx
+    ON votes (story_id);
+
+CREATE INDEX IF NOT EXISTS stories_title_id_idx
+    ON stories (title COLLATE NOCASE, id);
+
+CREATE INDEX IF NOT EXISTS stories_created_at_id_idx
+    ON stories (created_at, id);
+
+CREATE INDEX IF NOT EXISTS stories_updated_at_id_idx
+    ON stories (updated_at, id);
+
+CREATE INDEX IF NOT EXISTS stories_score_id_idx
+    ON stories (score, id);
+
+CREATE INDEX IF NOT EXISTS stories_hot_score_id_idx
+    ON stories (hot_score, id);
@@ -1,5 +1,39 @@
-INSERT INTO votes (story_id, vote)
+  WITH story AS (
+       SELECT id
 
-     VALUES ({}, {})
+         FROM stories
 
- RETURNING id;
\ No newline at end of file
+        WHERE id = $1
+       ),
+
+       vote AS (
+       INSERT INTO votes (story_id, vote)
+
+       SELECT id
+            , $2
+
+         FROM story
+
+    RETURNING id
+            , story_id
+            , vote
+       ),
+
+       tally AS (
+       UPDATE stories AS s
+
+          SET score = s.score + CASE
+                                WHEN vote.vote = 'u' THEN 1
+                                WHEN vote.vote = 'd' THEN -1
+                                ELSE 0
+                                END
+
+         FROM vote
+
+        WHERE s.id = vote.story_id
+
+    RETURNING vote.id
+       )
+
+SELECT EXISTS (SELECT 1 FROM story) AS found
+     , (SELECT id FROM tally) AS vote_id;
@@ -0,0 +1,10 @@
+   SELECT c.relname AS name
+
+     FROM pg_inherits AS i
+
+          INNER JOIN pg_class AS c
+          ON c.oid = i.inhrelid
+
+    WHERE i.inhparent = 'votes'::regclass
+
+ ORDER BY c.relname
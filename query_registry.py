@@ -0,0 +1,152 @@
+"""Registry of the SQL files in queries/, executed as server-side prepared statements.
+The files are read once, the first time a query is needed. Values are passed
+as $1, $2, ... parameters, and the only text that varies per call fills named
+{slots} from a fixed whitelist, so every combination is a distinct statement
+that Postgres parses and plans once per connection and then reuses through
+EXECUTE."""
+
+import re
+import threading
+import time
+from pathlib import Path
+from weakref import WeakKeyDictionary
+
+from psycopg2.extensions import cursor
+
+from metrics import QUERY_DURATION, QUERY_ERRORS, QUERY_ROWS
+
+PARAM = re.compile(r"\$(\d+)")
+SLOT = re.compile(r"\{(\w+)\}")
+PREPARABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "VALUES")
+
+
+class Query:
+    """One SQL file, with the slots it uses and whether it can be prepared."""
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = text.strip().rstrip(";")
+        self.slots = set(SLOT.findall(self.text))
+        self.preparable = (";" not in self.text
+                           and self.text.split(None, 1)[0].upper() in PREPARABLE)
+
+    def render(self, fragments: dict) -> str:
+        """Fills the slots with SQL fragments; fragments may use other slots."""
+        text = self.text
+        while SLOT.search(text):
+            text = SLOT.sub(lambda match: fragments[match.group(1)], text)
+        return text
+
+
+class QueryRegistry:
+    """Loads every .sql file in a directory and executes them by name.
+    slots maps each slot name to its allowed choices and their SQL fragments."""
+
+    def __init__(self, directory: str | Path, slots: dict[str, dict[str, str]] | None = None):
+        self.directory = Path(directory)
+        self.slots = slots or {}
+        self._queries = None
+        self._prepared = WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.slow_log = None
+
+    @property
+    def queries(self) -> dict[str, Query]:
+        """The queries by file name, read from the directory on first use."""
+        if self._queries is None:
+            queries = {path.stem: Query(path.stem, path.read_text(encoding="utf-8"))
+                       for path in sorted(self.directory.glob("*.sql"))}
+            with self._lock:
+                if self._queries is None:
+                    self._queries = queries
+        return self._queries
+
+    def execute(self, cur: cursor, name: str, params: tuple = (), **choices) -> None:
+        """Runs a query on cur, preparing it first if this connection has not
+        seen the statement yet. choices picks a whitelisted value for each slot.
+        The time taken, rows affected and any error are recorded under name, and
+        statements slower than the slow query log's threshold are captured."""
+        query = self.queries[name]
+        statement, text = self.statement(query, choices)
+        start = time.perf_counter()
+        try:
+            self._run(cur, query, statement, text, params)
+        except Exception:
+            QUERY_ERRORS.inc(1, "postgres", name)
+            raise
+        self.record(query, statement, text, params, time.perf_counter() - start, cur.rowcount)
+
+    def record(self, query: Query, statement: str, text: str, params: tuple,
+               elapsed: float, rowcount: int) -> None:
+        """Records a finished statement's time and row count, and passes it to
+        the slow query log."""
+        QUERY_DURATION.observe(elapsed, "postgres", query.name)
+        QUERY_ROWS.inc(max(int(rowcount), 0), "postgres", query.name)
+        if self.slow_log is not None and query.preparable:
+            self.slow_log.record(query.name, statement, text, params, elapsed)
+
+    def prepare_command(self, conn, query: Query, statement: str, text: str) -> str | None:
+        """Returns the PREPARE that conn needs before statement can be executed,
+        or None if it has been prepared already or cannot be prepared.
+        Call mark_prepared once the PREPARE has succeeded."""
+        if not query.preparable or statement in self.prepared(conn):
+            return None
+        return f"PREPARE {statement} AS {text}"
+
+    def mark_prepared(self, conn, statement: str) -> None:
+        """Notes that statement has been prepared on conn."""
+        with self._lock:
+            self._prepared.setdefault(conn, set()).add(statement)
+
+    def execute_command(self, query: Query, statement: str, text: str,
+                        params: tuple) -> tuple[str, object]:
+        """Returns the SQL and arguments that run statement: an EXECUTE of the
+        prepared statement, or the query itself when it cannot be prepared."""
+        if not query.preparable:
+            return (self.inline(text), self.named(params)) if params else (text, None)
+        placeholders = ", ".join(["%s"] * len(params))
+        return (f"EXECUTE {statement} ({placeholders})" if params
+                else f"EXECUTE {statement}", params)
+
+    def _run(self, cur: cursor, query: Query, statement: str, text: str, params: tuple) -> None:
+        """Executes one statement, inline or through PREPARE/EXECUTE."""
+        prepare = self.prepare_command(cur.connection, query, statement, text)
+        if prepare is not None:
+            cur.execute(prepare)
+            self.mark_prepared(cur.connection, statement)
+        cur.execute(*self.execute_command(query, statement, text, params))
+
+    def sql(self, cur: cursor, name: str, params: tuple = (), **choices) -> bytes:
+        """Returns the query with its parameters inlined as literals, as it would
+        run without preparing it."""
+        text = self.statement(self.queries[name], choices)[1]
+        return cur.mogrify(self.inline(text), self.named(params))
+
+    def statement(self, query: Query, choices: dict) -> tuple[str, str]:
+        """Returns the prepared statement name and SQL text for one slot choice."""
+        if set(choices) != query.slots:
+            raise ValueError(f"{query.name} takes slots {sorted(query.slots)}, "
+                             f"got {sorted(choices)}")
+        fragments = {}
+        for slot, choice in choices.items():
+            allowed = self.slots.get(slot, {})
+            if choice not in allowed:
+                raise ValueError(f"Invalid {slot} {choice!r} for {query.name}")
+            fragments[slot] = allowed[choice]
+        suffix = "".join(f"__{choices[slot]}" for slot in sorted(choices))
+        return f"{query.name}{suffix}", query.render(fragments)
+
+    def prepared(self, conn) -> set[str]:
+        """Returns the statements prepared so far on a connection."""
+        with self._lock:
+            return set(self._prepared.get(conn, ()))
+
+    @staticmethod
+    def inline(text: str) -> str:
+        """Turns $n parameters into named psycopg2 placeholders."""
+        return PARAM.sub(lambda match: f"%(p{match.group(1)})s", text.replace("%", "%%"))
+
+    @staticmethod
+    def named(params: tuple) -> dict:
+        """Maps positional parameters to the names used by inline."""
+        return {f"p{i}": value for i, value in enumerate(params, 1)}
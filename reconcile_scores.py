@@ -0,0 +1,39 @@
+"""Command that rebuilds the stored story scores from the raw votes and vote
+rollups, and reports every story whose tally had drifted.
+Usage: python reconcile_scores.py [--dry-run]
+Exits with status 1 if any score had drifted and 0 otherwise.
+"""
+# pylint: disable=import-error
+
+import sys
+from os import environ
+
+from dotenv import load_dotenv
+from psycopg2 import connect
+
+from sql_methods import reconcile_scores
+
+
+def main(dry_run: bool) -> int:
+    """Reconciles the scores and prints the drift found; returns the number of drifted stories."""
+    load_dotenv()
+    conn = connect(user=environ["DATABASE_USERNAME"],
+                   password=environ["DATABASE_PASSWORD"],
+                   host=environ["DATABASE_IP"],
+                   port=environ["DATABASE_PORT"],
+                   database=environ["DATABASE_NAME"])
+    try:
+        drift = reconcile_scores(conn, fix=not dry_run)
+    finally:
+        conn.close()
+
+    for row in drift:
+        print(f"Story {row['id']}: stored {row['stored_score']}, "
+              f"actual {row['actual_score']}")
+    action = "would be fixed" if dry_run else "fixed"
+    print(f"{len(drift)} drifted score(s) {action}.")
+    return len(drift)
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main("--dry-run" in sys.argv[1:]) else 0)
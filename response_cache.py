@@ -0,0 +1,167 @@
+"""Bounded LRU/TTL cache of serialized API responses.
+Concurrent misses for the same key are coalesced so only one of them does the
+work, and any write to the stories invalidates every entry at once."""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+
+@dataclass
+class CachedResponse:
+    """A serialized response body with its status code and entity tag.
+    encoded holds the body compressed in each content coding served so far."""
+    body: bytes
+    status: int
+    etag: str
+    expires: float
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+
+@dataclass
+class _Flight:
+    """A computation in progress that other requests for the same key wait on."""
+    done: threading.Event = field(default_factory=threading.Event)
+    result: CachedResponse | None = None
+    error: BaseException | None = None
+    callbacks: list = field(default_factory=list)
+
+
+class ResponseCache:
+    """Thread-safe cache mapping normalized request keys to CachedResponses."""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_or_compute(self, key, compute) -> CachedResponse:
+        """Returns the cached response for key, calling compute() to build it on a miss.
+        compute must return a (body, status) tuple."""
+        entry, flight, leader, generation = self._lookup(key)
+        if entry is not None:
+            return entry
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._entry(*compute())
+        except BaseException as err:
+            flight.error = err
+            raise
+        finally:
+            self._land(key, flight, generation)
+        return flight.result
+
+    async def get_or_compute_async(self, key, compute) -> CachedResponse:
+        """Like get_or_compute for callers on an event loop: compute is a coroutine
+        function, and waiting for another request's computation does not block
+        the loop. Misses are coalesced with those of threaded callers."""
+        # pylint: disable=import-outside-toplevel
+        import asyncio
+        entry, flight, leader, generation = self._lookup(key)
+        if entry is not None:
+            return entry
+
+        if not leader:
+            loop = asyncio.get_running_loop()
+            landed = loop.create_future()
+            with self._lock:
+                if not flight.done.is_set():
+                    flight.callbacks.append(lambda: loop.call_soon_threadsafe(
+                        lambda: landed.done() or landed.set_result(None)))
+                else:
+                    landed.set_result(None)
+            await landed
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._entry(*await compute())
+        except BaseException as err:
+            flight.error = err
+            raise
+        finally:
+            self._land(key, flight, generation)
+        return flight.result
+
+    def invalidate(self) -> None:
+        """Drops every entry; computations already running are not stored."""
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+            self._generation += 1
+            self._invalidations += 1
+
+    def stats(self) -> dict:
+        """Returns hit, miss and eviction counts for the cache."""
+        with self._lock:
+            return {"entries": len(self._entries),
+                    "max_entries": self.max_entries,
+                    "ttl": self.ttl,
+                    "hits": self._hits,
+                    "misses": self._misses,
+                    "coalesced": self._coalesced,
+                    "evictions": self._evictions,
+                    "invalidations": self._invalidations}
+
+    def _lookup(self, key) -> tuple:
+        """Returns (fresh entry, flight, whether this caller leads the flight,
+        generation); the flight is None on a hit."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry, None, False, None
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._misses += 1
+            else:
+                self._coalesced += 1
+            return None, flight, leader, self._generation
+
+    def _entry(self, body: bytes, status: int) -> CachedResponse:
+        """Wraps a freshly computed body."""
+        return CachedResponse(body, status, hashlib.blake2b(body, digest_size=16).hexdigest(),
+                              time.monotonic() + self.ttl)
+
+    def _land(self, key, flight: _Flight, generation: int) -> None:
+        """Ends a flight, storing its result unless the cache was invalidated
+        meanwhile, and wakes everyone waiting on it."""
+        with self._lock:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+            if flight.result is not None and generation == self._generation:
+                self._store(key, flight.result)
+            flight.done.set()
+            callbacks = flight.callbacks
+        for callback in callbacks:
+            callback()
+
+    def _store(self, key, entry: CachedResponse) -> None:
+        """Adds an entry, evicting the least recently used ones over the limit.
+        Must be called with the lock held."""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
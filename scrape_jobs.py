@@ -0,0 +1,139 @@
+"""Background worker pool for scrape jobs.
+POST /scrape only enqueues a job; fetching, parsing and storing the stories
+happen on these workers so request threads never wait on outbound HTTP."""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+
+
+class ScrapeError(Exception):
+    """Raised by a scrape job that cannot complete."""
+
+
+class ScrapeTimeoutError(ScrapeError):
+    """Raised when a scrape job runs past its deadline."""
+
+
+class ScrapeQueueFullError(Exception):
+    """Raised when too many scrape jobs are already waiting to run."""
+
+
+def remaining_time(deadline: float) -> float:
+    """Returns the seconds left before deadline, raising once it has passed."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise ScrapeTimeoutError("Scrape job timed out.")
+    return remaining
+
+
+@dataclass
+class ScrapeJob:
+    """State and timings of a single scrape request."""
+    url: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    state: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    stories_found: int | None = None
+    stories_inserted: int | None = None
+    stories_skipped: int | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        """Returns the job as a JSON-serializable dict."""
+        def timestamp(seconds):
+            return (datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+                    if seconds is not None else None)
+
+        end = self.finished_at or time.time()
+        return {"job_id": self.id,
+                "url": self.url,
+                "state": self.state,
+                "created_at": timestamp(self.created_at),
+                "started_at": timestamp(self.started_at),
+                "finished_at": timestamp(self.finished_at),
+                "queued_seconds": round((self.started_at or end) - self.created_at, 3),
+                "run_seconds": (round(end - self.started_at, 3)
+                                if self.started_at is not None else None),
+                "stories_found": self.stories_found,
+                "stories_inserted": self.stories_inserted,
+                "stories_skipped": self.stories_skipped,
+                "error": self.error}
+
+
+class ScrapeJobQueue:
+    """Runs scrape jobs on a fixed number of worker threads.
+    run_job(url, deadline) does the work and returns a dict with the
+    found, inserted and skipped story counts."""
+
+    def __init__(self, run_job, workers: int = 2, timeout: float = 30.0,
+                 max_pending: int = 100, max_jobs: int = 1000):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self._run_job = run_job
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="scrape")
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, url: str) -> ScrapeJob:
+        """Enqueues a scrape of url and returns its job straight away."""
+        job = ScrapeJob(url)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ScrapeQueueFullError("Too many scrape jobs queued.")
+            self._pending += 1
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> dict | None:
+        """Returns a snapshot of a job, or None if it is unknown or has been forgotten."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops the workers, optionally waiting for queued jobs to finish."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _run(self, job: ScrapeJob) -> None:
+        """Runs one job on a worker thread and records its outcome."""
+        with self._lock:
+            self._pending -= 1
+            job.state = RUNNING
+            job.started_at = time.time()
+        deadline = time.monotonic() + self.timeout
+
+        try:
+            result = self._run_job(job.url, deadline)
+            state, error = SUCCEEDED, None
+        except (ScrapeTimeoutError, TimeoutError) as err:
+            result, state, error = {}, TIMED_OUT, str(err) or "Scrape job timed out."
+        except Exception as err:  # pylint: disable=broad-except
+            result, state, error = {}, FAILED, str(err)
+
+        with self._lock:
+            job.stories_found = result.get("found")
+            job.stories_inserted = result.get("inserted")
+            job.stories_skipped = result.get("skipped")
+            job.state = state
+            job.error = error
+            job.finished_at = time.time()
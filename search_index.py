@@ -0,0 +1,101 @@
+"""In-memory trigram index over story titles.
+Answers case-insensitive substring searches by scanning the shortest posting
+list of the search term's trigrams instead of every title."""
+# pylint: disable=unused-variable
+
+from array import array
+
+NGRAM_SIZE = 3
+
+
+def title_ngrams(title: str) -> set[str]:
+    """Returns the distinct trigrams of an already lowercased title."""
+    return {title[i:i + NGRAM_SIZE] for i in range(len(title) - NGRAM_SIZE + 1)}
+
+
+class TitleIndex:
+    """Maps trigrams to the ids of the stories whose title contains them.
+    Postings are append-only; entries left behind by patched or deleted titles
+    are filtered out when candidates are verified, and the index is rebuilt
+    once they outnumber the live entries."""
+
+    def __init__(self, stories: list[dict] = ()):
+        self._titles = {}
+        self._postings = {}
+        self._entries = 0
+        self._stale = 0
+        for story in stories:
+            self.add(story["id"], story["title"])
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def add(self, id_num: int, title: str) -> None:
+        """Indexes a new story title."""
+        if id_num in self._titles:
+            self.update(id_num, title)
+            return
+        title = title.lower()
+        self._titles[id_num] = title
+        self._append(id_num, title_ngrams(title))
+
+    def update(self, id_num: int, title: str) -> None:
+        """Re-indexes a story whose title has changed."""
+        old_title = self._titles.get(id_num)
+        if old_title is None:
+            self.add(id_num, title)
+            return
+        title = title.lower()
+        old_grams, new_grams = title_ngrams(old_title), title_ngrams(title)
+        self._titles[id_num] = title
+        self._append(id_num, new_grams - old_grams)
+        self._stale += len(old_grams - new_grams)
+        self._maybe_rebuild()
+
+    def remove(self, id_num: int) -> None:
+        """Drops a deleted story from the index."""
+        old_title = self._titles.pop(id_num, None)
+        if old_title is not None:
+            self._stale += len(title_ngrams(old_title))
+            self._maybe_rebuild()
+
+    def search(self, term: str) -> list[int]:
+        """Returns the ids of every story whose title contains term, ignoring case."""
+        term = term.lower()
+        titles = self._titles
+        if len(term) < NGRAM_SIZE:
+            return [id_num for id_num, title in titles.items() if term in title]
+
+        postings = []
+        for gram in title_ngrams(term):
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+
+        matches = {}
+        for id_num in min(postings, key=len):
+            title = titles.get(id_num)
+            if title is not None and term in title:
+                matches[id_num] = None
+        return list(matches)
+
+    def _append(self, id_num: int, grams: set[str]) -> None:
+        """Adds id_num to the posting list of each trigram."""
+        postings = self._postings
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array("i")
+            posting.append(id_num)
+        self._entries += len(grams)
+
+    def _maybe_rebuild(self) -> None:
+        """Rebuilds the postings once more than half of their entries are stale."""
+        if self._stale * 2 <= self._entries:
+            return
+        titles = self._titles
+        self._titles, self._postings = {}, {}
+        self._entries = self._stale = 0
+        for id_num, title in titles.items():
+            self.add(id_num, title)
@@ -0,0 +1,197 @@
+"""Capture of queries that run slower than a configurable threshold.
+Each slow statement is logged with its name, parameters and duration and kept
+in a ring buffer of recent captures. Its plan is then taken out of band: a
+background thread re-runs a read-only statement under EXPLAIN (ANALYZE,
+BUFFERS) on its own connection inside a transaction that is rolled back, at
+most once per statement per explain_interval so a burst of slow queries cannot
+double the load on a database that is already struggling. Anything that writes
+or locks rows only gets a plain EXPLAIN, which plans it without running it."""
+
+import itertools
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from query_registry import QueryRegistry
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+CAPTURED = "captured"
+RATE_LIMITED = "rate_limited"
+QUEUE_FULL = "queue_full"
+DISABLED = "disabled"
+FAILED = "failed"
+
+WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE)\b|\bFOR\s+(KEY\s+)?SHARE\b",
+                    re.IGNORECASE)
+
+_ids = itertools.count(1)
+
+
+def read_only(text: str) -> bool:
+    """Whether a statement only reads: a SELECT, WITH or VALUES that neither
+    modifies data, in a CTE or otherwise, nor locks rows."""
+    return (text.split(None, 1)[0].upper() in ("SELECT", "WITH", "VALUES")
+            and WRITES.search(text) is None)
+
+
+@dataclass
+class SlowQuery:
+    """One statement that crossed the threshold, with its plan once captured."""
+    query: str
+    statement: str
+    text: str
+    params: tuple
+    duration: float
+    id: int = field(default_factory=lambda: next(_ids))
+    recorded_at: float = field(default_factory=time.time)
+    explain: str = PENDING
+    plan: str | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        """Returns the capture as a JSON-serializable dict."""
+        return {"id": self.id,
+                "query": self.query,
+                "statement": self.statement,
+                "params": json.loads(json.dumps(self.params, default=str)),
+                "duration_ms": round(self.duration * 1000, 3),
+                "recorded_at": datetime.fromtimestamp(self.recorded_at, timezone.utc).isoformat(),
+                "explain": self.explain,
+                "plan": self.plan,
+                "error": self.error}
+
+
+class SlowQueryLog:
+    """Keeps the last capacity slow queries and explains them in the background.
+    connection() must return a context manager yielding a psycopg2 connection,
+    such as ConnectionPool.connection; pass None to record without plans."""
+
+    def __init__(self, threshold: float = 0.25, capacity: int = 100, connection=None,
+                 explain_interval: float = 60.0, explain_timeout: float = 10.0,
+                 max_pending: int = 8):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.explain_interval = explain_interval
+        self.explain_timeout = explain_timeout
+        self._connection = connection
+        self._entries = deque(maxlen=capacity)
+        self._last_explained = {}
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._recorded = 0
+        self._explained = 0
+        self._rate_limited = 0
+        self._explain_failures = 0
+
+    def record(self, query: str, statement: str, text: str, params: tuple,
+               duration: float) -> SlowQuery | None:
+        """Captures a statement if it took at least threshold seconds.
+        text is the SQL with $n parameters, as sent to PREPARE."""
+        if duration < self.threshold:
+            return None
+        entry = SlowQuery(query, statement, text, tuple(params), duration)
+        logger.warning("Slow query %s took %.1fms with params %s",
+                       statement, duration * 1000, entry.to_dict()["params"])
+
+        with self._lock:
+            self._entries.append(entry)
+            self._recorded += 1
+            if self._connection is None:
+                entry.explain = DISABLED
+                return entry
+            now = time.monotonic()
+            last = self._last_explained.get(statement)
+            if last is not None and now - last < self.explain_interval:
+                entry.explain = RATE_LIMITED
+                self._rate_limited += 1
+                return entry
+            self._last_explained[statement] = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-query-explain",
+                                                daemon=True)
+                self._thread.start()
+
+        try:
+            self._pending.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                entry.explain = QUEUE_FULL
+                self._rate_limited += 1
+        return entry
+
+    def recent(self, limit: int | None = None) -> list[dict]:
+        """Returns the most recent captures first."""
+        with self._lock:
+            entries = list(reversed(self._entries))
+            return [entry.to_dict() for entry in entries[:limit]]
+
+    def get(self, entry_id: int) -> dict | None:
+        """Returns one capture, or None once it has left the ring buffer."""
+        with self._lock:
+            for entry in self._entries:
+                if entry.id == entry_id:
+                    return entry.to_dict()
+        return None
+
+    def wait_idle(self, timeout: float = 5.0) -> bool:
+        """Waits for queued plans to be captured; used by tests and benchmarks."""
+        deadline = time.monotonic() + timeout
+        while self._pending.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> dict:
+        """Returns capture and explain counts."""
+        with self._lock:
+            return {"threshold_ms": round(self.threshold * 1000, 3),
+                    "capacity": self.capacity,
+                    "entries": len(self._entries),
+                    "recorded": self._recorded,
+                    "explained": self._explained,
+                    "rate_limited": self._rate_limited,
+                    "explain_failures": self._explain_failures,
+                    "explain_interval": self.explain_interval}
+
+    def _run(self) -> None:
+        """Explains queued captures one at a time."""
+        while True:
+            entry = self._pending.get()
+            try:
+                plan, error = self._explain(entry), None
+            except Exception as err:  # pylint: disable=broad-except
+                plan, error = None, str(err).strip() or type(err).__name__
+            with self._lock:
+                entry.plan = plan
+                entry.error = error
+                entry.explain = CAPTURED if error is None else FAILED
+                if error is None:
+                    self._explained += 1
+                else:
+                    self._explain_failures += 1
+            self._pending.task_done()
+
+    def _explain(self, entry: SlowQuery) -> str:
+        """Re-runs a read-only statement under EXPLAIN (ANALYZE, BUFFERS) and
+        plans any other with plain EXPLAIN; either way the transaction is rolled back."""
+        explain = "EXPLAIN (ANALYZE, BUFFERS) " if read_only(entry.text) else "EXPLAIN "
+        with self._connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SET LOCAL statement_timeout = %s",
+                                (int(self.explain_timeout * 1000),))
+                    cur.execute(explain + QueryRegistry.inline(entry.text),
+                                QueryRegistry.named(entry.params))
+                    return "\n".join(row[0] for row in cur.fetchall())
+            finally:
+                conn.rollback()
@@ -2,93 +2,458 @@
 that do not relate to the endpoints."""
 # pylint: disable=bare-except, unused-variable, unsupported-binary-operation
 
-from psycopg2 import sql
+import binascii
+import json
+import math
+import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from pathlib import Path
+
+from psycopg2.errors import (DeadlockDetected, ForeignKeyViolation, SerializationFailure,
+                             UniqueViolation)
 from psycopg2.extensions import connection
 from psycopg2.extras import RealDictCursor, RealDictRow
 
-QUERY_DIRECTORY = "./queries/"
+from query_registry import QueryRegistry
 
+QUERY_DIRECTORY = Path(__file__).resolve().parent / "queries"
 
-def read_in_query(file):
-    """Reads a query file into memory to be stored in a variable."""
-    with open(f"{QUERY_DIRECTORY}{file}", "r", encoding="utf-8") as f:
-        return f.read()
+SORT_COLUMNS = ("title", "created_at", "updated_at", "score", "hot_score")
+TIMESTAMP_COLUMNS = ("created_at", "updated_at")
+MAX_PAGE_SIZE = 500
+HOT_SCORE_DECAY = 45000
+UNIX_EPOCH = datetime(1970, 1, 1)
+VOTE_PARTITION = re.compile(r"votes_(\d{4})_(\d{2})")
 
-
-GET_STORIES_QUERY = read_in_query("get_stories.sql")
-INSERT_STORY_QUERY = read_in_query("insert_story.sql")
-UPDATE_SCORE_QUERY = read_in_query("update_score.sql")
-PATCH_STORY_QUERY = read_in_query("patch_story.sql")
-BASIC_SELECT_QUERY = "SELECT id FROM stories WHERE id = {}"
-DELETE_VOTES_QUERY = "DELETE FROM votes WHERE story_id = {}"
-DELETE_STORY_QUERY = "DELETE FROM stories WHERE id = {} RETURNING *"
+QUERIES = QueryRegistry(QUERY_DIRECTORY, slots={
+    "sort": {column: column for column in SORT_COLUMNS},
+    "order": {"asc": "ASC", "desc": "DESC"},
+    "keyset": {"first": "TRUE",
+               "after": "({sort}, id) > ($3, $4)",
+               "before": "({sort}, id) < ($3, $4)"},
+})
 
 
 def get_stories_data(conn: connection,
                      search: str, sort: str, order: bool) -> list[RealDictRow] | dict[bool, str]:
     """Gets all stories from DB."""
+    query = stories_query(search, sort, order)
+    if "error" in query:
+        return query
+
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    QUERIES.execute(cur, "get_stories", query["params"], **query["choices"])
+
+    rows = cur.fetchall()
+    conn.commit()
+    cur.close()
+
+    if not rows:
+        return {"error": True, "message": "No stories were found"}
+
+    return rows
+
+
+def stories_query(search: str, sort: str, order: bool) -> dict:
+    """Checks the arguments for listing every story and returns the query's
+    {"params", "choices"}, or an error."""
     if not isinstance(search, str) or not isinstance(sort, str) or not isinstance(order, bool):
         return {"error": True, "message": "Invalid argument type(s)"}
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    sort = sort or "created_at"
+    if sort not in SORT_COLUMNS:
+        return {"error": True, "message": "Invalid sort"}
+    return {"params": (f"%{search}%",),
+            "choices": {"sort": sort, "order": "desc" if order else "asc"}}
 
-    search = sql.Literal(
-        f"%%{search}%%") if search else sql.Identifier("title")
-    sort = sql.SQL(sort) if sort else sql.SQL("created_at")
-    order = sql.SQL("DESC") if order else sql.SQL("ASC")
-    cur.execute(sql.SQL(GET_STORIES_QUERY).format(search, sort, order))
+
+def get_stories_columns(conn: connection,
+                        search: str, sort: str, order: bool) -> dict:
+    """Gets all stories like get_stories_data, but as {"columns", "rows"} with
+    the rows as plain tuples and the timestamps as seconds since the epoch."""
+    query = stories_query(search, sort, order)
+    if "error" in query:
+        return query
+
+    cur = conn.cursor()
+    QUERIES.execute(cur, "get_stories_columns", query["params"], **query["choices"])
 
     rows = cur.fetchall()
+    columns = [column[0] for column in cur.description]
     conn.commit()
     cur.close()
 
     if not rows:
         return {"error": True, "message": "No stories were found"}
 
+    return {"columns": columns, "rows": rows}
+
+
+def get_stories_by_id(conn: connection, ids: list[int]) -> list[RealDictRow] | dict:
+    """Gets the stories with the given ids, in id order. Missing ids are left out."""
+    if not isinstance(ids, list) or not all(isinstance(id_num, int) for id_num in ids):
+        return {"error": True, "message": "Invalid argument type(s)"}
+    if not ids:
+        return []
+
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    QUERIES.execute(cur, "get_stories_by_id", (ids,))
+
+    rows = cur.fetchall()
+    conn.commit()
+    cur.close()
+
     return rows
 
 
+def encode_cursor(sort: str, order: bool, row: RealDictRow) -> str:
+    """Builds the opaque cursor pointing just past row in the given ordering."""
+    value = row[sort]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, order, value, row["id"]], separators=(",", ":"))
+    return urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: bool) -> tuple | None:
+    """Unpacks a cursor made by encode_cursor into its (sort value, id) position.
+    Returns None if the cursor is malformed or was issued for another ordering."""
+    try:
+        payload = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_order, value, id_num = json.loads(payload)
+        if cursor_sort != sort or cursor_order is not order or not isinstance(id_num, int):
+            return None
+        if sort in TIMESTAMP_COLUMNS:
+            value = datetime.fromisoformat(value)
+        elif sort == "hot_score":
+            if not isinstance(value, (int, float)):
+                return None
+            value = float(value)
+        elif not isinstance(value, str if sort == "title" else int):
+            return None
+    except (binascii.Error, TypeError, ValueError):
+        return None
+    return value, id_num
+
+
+def get_stories_page(conn: connection, search: str, sort: str, order: bool,
+                     limit: int, cursor: str | None = None) -> dict:
+    """Gets one page of stories using keyset pagination.
+    The cursor is the next_cursor returned with the previous page."""
+    query = page_query(search, sort, order, limit, cursor)
+    if "error" in query:
+        return query
+
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    QUERIES.execute(cur, "get_stories_page", query["params"], **query["choices"])
+
+    rows = cur.fetchall()
+    conn.commit()
+    cur.close()
+
+    return page_result(rows, sort, order, limit, cursor)
+
+
+def page_query(search: str, sort: str, order: bool, limit: int, cursor: str | None) -> dict:
+    """Checks the arguments for one page of stories and returns the query's
+    {"params", "choices"}, or an error."""
+    if (not isinstance(search, str) or not isinstance(sort, str) or not isinstance(order, bool)
+            or not isinstance(limit, int) or not isinstance(cursor, (str, type(None)))):
+        return {"error": True, "message": "Invalid argument type(s)"}
+    sort = sort or "created_at"
+    if sort not in SORT_COLUMNS:
+        return {"error": True, "message": "Invalid sort"}
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return {"error": True, "message": f"Limit must be between 1 and {MAX_PAGE_SIZE}"}
+
+    params = (f"%{search}%", limit + 1)
+    keyset = "first"
+    if cursor:
+        position = decode_cursor(cursor, sort, order)
+        if position is None:
+            return {"error": True, "message": "Invalid cursor"}
+        params += position
+        keyset = "before" if order else "after"
+    return {"params": params,
+            "choices": {"sort": sort, "order": "desc" if order else "asc", "keyset": keyset}}
+
+
+def page_result(rows: list[RealDictRow], sort: str, order: bool,
+                limit: int, cursor: str | None) -> dict:
+    """Builds the {"stories", "next_cursor"} result from up to limit + 1 fetched rows."""
+    if not rows and not cursor:
+        return {"error": True, "message": "No stories were found"}
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort or "created_at", order, rows[-1])
+    return {"stories": rows, "next_cursor": next_cursor}
+
+
 def insert_story(conn: connection, url: str, title: str) -> dict[bool, str]:
-    """Inserts a story into the story table."""
+    """Inserts a story into the story table. If a story with the same normalized
+    URL exists, nothing is inserted and the result is an error with duplicate
+    set and that story's id."""
     if not isinstance(url, str) or not isinstance(title, str):
         return {"error": True, "message": "Invalid argument type(s)"}
 
     cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(sql.SQL(INSERT_STORY_QUERY).format(
-        sql.Literal(title), sql.Literal(url)))
+    QUERIES.execute(cur, "insert_story", (url, title))
 
     rows = cur.fetchall()
     conn.commit()
     cur.close()
 
+    if rows and rows[0]["created"]:
+        return {"success": True, "message": "Insert story successful.", "id": rows[0]["id"]}
     if rows:
-        return {"success": True, "message": "Insert story successful."}
+        return {"error": True, "message": "A story with that URL already exists.",
+                "duplicate": True, "id": rows[0]["id"]}
     return {"error": True, "message": "Update score failed."}
 
 
+def normalize_url(url: str) -> str:
+    """Normalizes a URL the same way as the unique index on stories.URL:
+    case-insensitive, without a fragment or trailing slashes."""
+    return url.split("#", 1)[0].rstrip("/").lower()
+
+
+def hot_score(score: int, created_at: datetime) -> float:
+    """Ranks a story for sort=hot the same way as the stories.hot_score column:
+    ten times the net score is worth being posted HOT_SCORE_DECAY seconds later.
+    Every story decays at the same rate, so the order never changes with time."""
+    sign = (score > 0) - (score < 0)
+    return (sign * math.log10(max(abs(score), 1))
+            + (created_at - UNIX_EPOCH).total_seconds() / HOT_SCORE_DECAY)
+
+
+def insert_stories(conn: connection, stories: list[tuple[str, str]]) -> dict:
+    """Inserts a batch of (url, title) stories in one statement and one transaction.
+    Stories whose normalized URL is already stored, or repeated in the batch, are skipped."""
+    if not isinstance(stories, list) or not all(
+            isinstance(story, tuple) and len(story) == 2 and isinstance(story[0], str)
+            and isinstance(story[1], str) for story in stories):
+        return {"error": True, "message": "Invalid argument type(s)"}
+
+    unique = {}
+    for url, title in stories:
+        unique.setdefault(normalize_url(url), (url, title))
+    if not unique:
+        return {"success": True, "inserted": 0, "skipped": 0, "ids": []}
+
+    urls, titles = zip(*unique.values())
+
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    QUERIES.execute(cur, "insert_stories", (list(urls), list(titles)))
+
+    rows = cur.fetchall()
+    conn.commit()
+    cur.close()
+
+    return {"success": True, "inserted": len(rows), "skipped": len(stories) - len(rows),
+            "ids": [row["id"] for row in rows]}
+
+
 def update_score(conn: connection, id_num: int, to_add: int) -> dict[bool, str]:
-    """Updates the a stories id by inserting a new vote record into the votes table."""
+    """Updates a story's score by inserting a new vote record into the votes table
+    and adjusting the stored tally, checking the story exists in the same statement."""
     if not isinstance(id_num, int) or not isinstance(to_add, str):
         return {"error": True, "message": "Invalid argument type(s)"}
 
     cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(sql.SQL(BASIC_SELECT_QUERY).format(sql.Literal(id_num)))
+    QUERIES.execute(cur, "update_score", (id_num, to_add))
 
     rows = cur.fetchall()
     conn.commit()
+    cur.close()
 
-    if not rows:
+    return vote_result(rows)
+
+
+def vote_result(rows: list[RealDictRow]) -> dict[bool, str]:
+    """Interprets the row returned by the update_score query."""
+    if not rows or not rows[0]["found"]:
         return {"error": True, "message": "Incorrect ID."}
+    if rows[0]["vote_id"] is not None:
+        return {"success": True, "message": "Update score successful."}
+    return {"error": True, "message": "Update score failed."}
 
-    cur.execute(sql.SQL(UPDATE_SCORE_QUERY).format(
-        sql.Literal(id_num), sql.Literal(to_add)))
 
+def apply_votes(conn: connection, votes: list[tuple[int, str]]) -> dict:
+    """Applies a batch of (story id, vote) pairs in one statement and one transaction.
+    found lists, in batch order, whether each vote's story existed and was voted on.
+    The stories are locked in id order, so concurrent batches queue rather than
+    deadlock; a batch that still loses a deadlock is rolled back with a retryable
+    error."""
+    if not isinstance(votes, list) or not all(
+            isinstance(vote, tuple) and len(vote) == 2 and isinstance(vote[0], int)
+            and isinstance(vote[1], str) for vote in votes):
+        return {"error": True, "message": "Invalid argument type(s)"}
+    if not votes:
+        return {"success": True, "found": []}
+
+    story_ids, directions = zip(*votes)
+
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        QUERIES.execute(cur, "apply_votes", (list(story_ids), list(directions)))
+    except ForeignKeyViolation:
+        conn.rollback()
+        cur.close()
+        return {"error": True, "message": "A story was deleted while voting, try again."}
+    except (DeadlockDetected, SerializationFailure):
+        conn.rollback()
+        cur.close()
+        return {"error": True, "message": "Votes conflicted with another batch, try again."}
     rows = cur.fetchall()
     conn.commit()
     cur.close()
 
-    if rows:
-        return {"success": True, "message": "Update score successful."}
-    return {"error": True, "message": "Update score failed."}
+    return {"success": True, "found": [row["found"] for row in rows]}
+
+
+def insert_votes(conn: connection, votes: list[tuple[int, str]]) -> dict:
+    """Inserts a batch of (story id, vote) pairs and updates the affected scores,
+    all in one statement. Votes for stories that no longer exist are skipped. Like
+    apply_votes, a deadlock rolls the batch back and returns a retryable error."""
+    if not isinstance(votes, list) or not all(
+            isinstance(vote, tuple) and len(vote) == 2 and isinstance(vote[0], int)
+            and isinstance(vote[1], str) for vote in votes):
+        return {"error": True, "message": "Invalid argument type(s)"}
+    if not votes:
+        return {"success": True, "inserted": 0, "skipped": 0}
+
+    story_ids, directions = zip(*votes)
+
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        QUERIES.execute(cur, "insert_votes", (list(story_ids), list(directions)))
+    except (DeadlockDetected, SerializationFailure):
+        conn.rollback()
+        cur.close()
+        return {"error": True, "message": "Votes conflicted with another batch, try again."}
+
+    rows = cur.fetchall()
+    conn.commit()
+    cur.close()
+
+    inserted = sum(row["votes"] for row in rows)
+    return {"success": True, "inserted": inserted, "skipped": len(votes) - inserted}
+
+
+def reconcile_scores(conn: connection, fix: bool = True) -> list[RealDictRow]:
+    """Rebuilds every story's stored score from its raw votes and vote rollups.
+    Returns the stories whose score had drifted; with fix=False nothing is changed."""
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    QUERIES.execute(cur, "reconcile_scores")
+
+    rows = cur.fetchall()
+    if fix:
+        conn.commit()
+    else:
+        conn.rollback()
+    cur.close()
+
+    return rows
+
+
+def vote_partition_name(month: datetime) -> str:
+    """Names the votes partition that holds the given month."""
+    return f"votes_{month:%Y_%m}"
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    """Returns the first instant of the month a number of months after month."""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def vote_partitions(conn: connection) -> dict[str, datetime]:
+    """Returns the monthly votes partitions by name, with the month each starts."""
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    QUERIES.execute(cur, "vote_partitions")
+    rows = cur.fetchall()
+    cur.close()
+
+    months = {}
+    for row in rows:
+        match = VOTE_PARTITION.fullmatch(row["name"])
+        if match:
+            months[row["name"]] = datetime(int(match.group(1)), int(match.group(2)), 1)
+    return months
+
+
+def run_partition_script(cur, name: str, month: datetime) -> None:
+    """Runs a partition maintenance script for one month's partition. The
+    partition is a table name rather than a value, so it goes into the text
+    instead of being passed as a parameter; it is built only from the month's
+    digits. The bounds of the month are $1 and $2, and the script runs unprepared."""
+    text = QUERIES.queries[name].render({"partition": vote_partition_name(month)})
+    cur.execute(QUERIES.inline(text), QUERIES.named((month, add_months(month, 1))))
+
+
+def ensure_vote_partitions(conn: connection, now: datetime, ahead: int = 2) -> list[str]:
+    """Creates the monthly votes partitions that are missing from the current
+    month through ahead months after it, along with any month that has votes
+    waiting in votes_default. Each is created in its own transaction.
+    Returns the names of the partitions created."""
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    QUERIES.execute(cur, "default_vote_months")
+    months = {row["month"] for row in cur.fetchall()}
+    current = datetime(now.year, now.month, 1)
+    months.update(add_months(current, offset) for offset in range(ahead + 1))
+    existing = vote_partitions(conn)
+    conn.commit()
+
+    created = []
+    for month in sorted(months):
+        if vote_partition_name(month) in existing:
+            continue
+        try:
+            run_partition_script(cur, "create_vote_partition", month)
+        except:
+            conn.rollback()
+            cur.close()
+            raise
+        conn.commit()
+        created.append(vote_partition_name(month))
+    cur.close()
+
+    return created
+
+
+def compact_votes(conn: connection, before: datetime) -> list[dict]:
+    """Rolls every votes partition whose month ends on or before before up into
+    per-story, per-day counts in vote_rollups, then drops its raw votes.
+    Each partition is rolled up in one transaction and dropped in a second,
+    so votes are only held up while the partition is detached; a month rolled
+    up by an earlier run that failed to drop it is only dropped. Returns the
+    name, number of votes and number of rollup rows of each partition compacted."""
+    compacted = []
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    partitions = vote_partitions(conn)
+    QUERIES.execute(cur, "compacted_vote_months")
+    rolled_up = {row["month"] for row in cur.fetchall()}
+    conn.commit()
+    for name, month in sorted(partitions.items(), key=lambda item: item[1]):
+        if add_months(month, 1) > before:
+            continue
+        try:
+            if month not in rolled_up:
+                run_partition_script(cur, "compact_vote_partition", month)
+                conn.commit()
+            run_partition_script(cur, "detach_vote_partition", month)
+            row = cur.fetchone()
+        except:
+            conn.rollback()
+            cur.close()
+            raise
+        conn.commit()
+        compacted.append({"partition": name, "votes": row["votes"], "rollups": row["rollups"]})
+    cur.close()
+
+    return compacted
 
 
 def patch_story(conn: connection, id_num: int, url: str, title: str) -> dict[bool, str]:
@@ -98,8 +463,12 @@ def patch_story(conn: connection, id_num: int, url: str, title: str) -> dict[boo
 
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    cur.execute(sql.SQL(PATCH_STORY_QUERY).format(
-        sql.Literal(url), sql.Literal(title), sql.Literal(id_num)))
+    try:
+        QUERIES.execute(cur, "patch_story", (url, title, id_num))
+    except UniqueViolation:
+        conn.rollback()
+        cur.close()
+        return {"error": True, "message": "A story with that URL already exists."}
     rows = cur.fetchall()
     conn.commit()
     cur.close()
@@ -110,14 +479,14 @@ def patch_story(conn: connection, id_num: int, url: str, title: str) -> dict[boo
 
 
 def delete_story(conn: connection, id_num: int) -> dict[bool, str]:
-    """Deletes the story with the id passed in as argument."""
+    """Deletes the story with the id passed in as argument. Its votes and vote
+    rollups go with it through ON DELETE CASCADE."""
     if not isinstance(id_num, int):
         return {"error": True, "message": "Invalid argument type(s)"}
 
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    cur.execute(sql.SQL(DELETE_VOTES_QUERY).format(sql.Literal(id_num)))
-    cur.execute(sql.SQL(DELETE_STORY_QUERY).format(sql.Literal(id_num)))
+    QUERIES.execute(cur, "delete_story", (id_num,))
     rows = cur.fetchall()
     conn.commit()
     cur.close()
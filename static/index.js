@@ -60,21 +60,34 @@ async function handleEdit(id, url, title) {
     alert(data.message)
   }
 
-  getStories()
+  pullChanges()
 }
 
-async function getStories() {
+const PAGE_SIZE = 50
+let nextCursor = null
+let changeToken = null
+let changeStream = null
+
+async function getStories(cursor = null) {
   const searchTerm = document.getElementById('search_input').value
   const sort = document.getElementById('sort').value
   const order = document.getElementById('order').value
-  let url = `${getUrl()}/stories?sort=${sort}&order=${order}`
+  let url = `${getUrl()}/stories?sort=${sort}&order=${order}&limit=${PAGE_SIZE}`
 
   if (searchTerm) {
     url += `&search=${searchTerm}`
   }
+  if (cursor) {
+    url += `&cursor=${cursor}`
+  }
 
   console.log(`Stories Requested From: ${url}`)
 
+  if (!cursor) {
+    // Take the token first, so no change made while the list loads is missed.
+    changeToken = await getChangeToken()
+  }
+
   const res = await fetch(url, {
     method: 'GET',
     credentials: 'include'
@@ -93,8 +106,73 @@ async function getStories() {
     alert(data.message)
   }
 
-  resetStories()
-  displayStories(data)
+  if (!cursor) {
+    resetStories()
+  }
+  displayStories(data.stories || [])
+  setNextCursor(data.next_cursor || null)
+  if (!cursor) {
+    subscribeToChanges()
+  }
+}
+
+async function getChangeToken() {
+  const res = await fetch(`${getUrl()}/stories/changes`, { credentials: 'include' })
+  const data = await res.json()
+  return data.token
+}
+
+async function pullChanges() {
+  if (!changeToken) {
+    return getStories()
+  }
+  const res = await fetch(`${getUrl()}/stories/changes?since=${changeToken}`, {
+    credentials: 'include'
+  })
+  if (res.status === 410) {
+    return getStories()
+  }
+  applyChanges(await res.json())
+}
+
+function subscribeToChanges() {
+  if (changeStream) {
+    changeStream.close()
+  }
+  changeStream = new EventSource(`${getUrl()}/stories/events?since=${changeToken}`)
+  changeStream.addEventListener('changes', (event) => {
+    applyChanges(JSON.parse(event.data))
+  })
+  changeStream.addEventListener('reset', () => {
+    changeStream.close()
+    changeStream = null
+    getStories()
+  })
+}
+
+function applyChanges(data) {
+  if (!data.changes) {
+    return
+  }
+  const searchTerm = document.getElementById('search_input').value.toLowerCase()
+  data.changes.forEach(({ change, id, story }) => {
+    const existing = document.querySelector(`.storyWrapper[data-id="${id}"]`)
+    if (change === 'deleted') {
+      if (existing) {
+        existing.remove()
+      }
+    } else if (existing) {
+      existing.replaceWith(buildStory(story))
+    } else if (change === 'created' && story.title.toLowerCase().includes(searchTerm)) {
+      document.getElementById('stories').prepend(buildStory(story))
+    }
+  })
+  changeToken = data.token
+}
+
+function setNextCursor(cursor) {
+  nextCursor = cursor
+  document.getElementById('load_more').hidden = !cursor
 }
 
 function onError(response) {
@@ -115,7 +193,7 @@ async function handleVote(e) {
     credentials: 'include'
   })
 
-  if (rawRes.status !== 200) {
+  if (!rawRes.ok) {
     onError(rawRes)
   }
 
@@ -125,7 +203,7 @@ async function handleVote(e) {
     alert(data.message)
   }
 
-  getStories()
+  pullChanges()
 }
 
 async function handleDelete(e) {
@@ -153,7 +231,7 @@ async function handleDelete(e) {
     alert(data.message)
   }
 
-  getStories()
+  pullChanges()
 }
 
 function getContentComponent(story) {
@@ -191,16 +269,21 @@ function getVotesComponent(story) {
   return voteWrapper
 }
 
-function createStory(story) {
-  const stories = document.getElementById('stories')
+function buildStory(story) {
   const storyWrapper = document.createElement('div')
   storyWrapper.classList = 'storyWrapper'
+  storyWrapper.dataset.id = story.id
 
   const contentWrapper = getContentComponent(story)
   const voteWrapper = getVotesComponent(story)
 
   storyWrapper.append(voteWrapper, contentWrapper)
-  stories.append(storyWrapper)
+  return storyWrapper
+}
+
+function createStory(story) {
+  const stories = document.getElementById('stories')
+  stories.append(buildStory(story))
 }
 
 function displayStories(stories) {
@@ -219,6 +302,14 @@ function setupSelects() {
   }
 }
 
+function setupLoadMore() {
+  const loadMore = document.getElementById('load_more')
+
+  loadMore.onclick = () => {
+    getStories(nextCursor)
+  }
+}
+
 function setupSearch() {
   const search = document.getElementById('search')
 
@@ -231,4 +322,5 @@ window.onload = async function load() {
   getStories()
   setupSelects()
   setupSearch()
+  setupLoadMore()
 }
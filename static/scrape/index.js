@@ -4,6 +4,27 @@ function onError(response) {
   )
 }
 
+const POLL_INTERVAL_MS = 1000
+
+function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms))
+}
+
+async function waitForJob(statusUrl) {
+  while (true) {
+    const response = await fetch(statusUrl)
+    const job = await response.json()
+
+    if (response.status !== 200 || job.error) {
+      return job
+    }
+    if (job.state !== 'queued' && job.state !== 'running') {
+      return job
+    }
+    await sleep(POLL_INTERVAL_MS)
+  }
+}
+
 window.onload = async function load() {
   const submitComponent = document.getElementById('submit_scrape')
 
@@ -20,7 +41,7 @@ window.onload = async function load() {
       }
     })
 
-    if (response.status !== 200) {
+    if (response.status !== 202) {
       onError(response)
     }
 
@@ -28,8 +49,16 @@ window.onload = async function load() {
 
     if (data.error) {
       alert(data.message)
-    } else {
+      return
+    }
+
+    const job = await waitForJob(data.status_url)
+
+    if (job.state === 'succeeded') {
+      alert(`Found ${job.stories_found} stories, added ${job.stories_inserted}.`)
       window.location.href = '/'
+    } else {
+      alert(job.error || job.message)
     }
   }
 }
@@ -0,0 +1,149 @@
+"""Fingerprinted, precompressed copies of the files under static/.
+Everything is read once at startup. Each stylesheet, script and image is
+given a URL containing a hash of its contents, so it can be cached forever,
+and the pages are rewritten to link to those URLs. Text files are
+compressed ahead of time with gzip, and with brotli when that package is
+installed, so serving a request is only a dict lookup."""
+# pylint: disable=import-error
+
+import gzip
+import hashlib
+import mimetypes
+import re
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGE_SUFFIX = ".html"
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json",
+                      "image/svg+xml")
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = "public, max-age=31536000, immutable"
+IDENTITY = "identity"
+LINK_PATTERN = re.compile(r"""(?<=["'])(?:\.\./|/)static/([^"'?#]+)""")
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    """Compresses data with gzip or brotli; level is 1-9 for gzip and 0-11 for brotli."""
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    """Compresses a body as it is produced, for responses that are streamed."""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=level)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def encodings() -> tuple[str, ...]:
+    """Returns the content codings this process can produce, best first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept, available) -> str:
+    """Picks the best coding in available that the client accepts.
+    accept is the request's Accept-Encoding header as parsed by werkzeug."""
+    best, best_quality = IDENTITY, 0
+    for encoding in encodings():
+        quality = accept.quality(encoding)
+        if encoding in available and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressible(mimetype: str | None) -> bool:
+    """Tells whether a body of this type is worth compressing."""
+    return mimetype is not None and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+@dataclass
+class Asset:
+    """One file, with its body in every coding worth storing."""
+    path: str
+    url_path: str
+    mimetype: str
+    etag: str
+    bodies: dict[str, bytes]
+
+
+class StaticAssets:
+    """Every file under directory, keyed by its fingerprinted URL path. Pages
+    (.html files) keep their own names and are served by the page routes."""
+
+    def __init__(self, directory: str, url_prefix: str = "/assets/", level: int = 9):
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix
+        self.level = level
+        self._assets = {}
+        self._urls = {}
+        self._pages = {}
+
+        paths = sorted(path for path in self.directory.rglob("*") if path.is_file())
+        for path in paths:
+            if path.suffix != PAGE_SUFFIX:
+                asset = self._load(path, path.read_bytes(), fingerprint=True)
+                self._assets[asset.url_path] = asset
+                self._urls[asset.path] = url_prefix + asset.url_path
+        for path in paths:
+            if path.suffix == PAGE_SUFFIX:
+                text = LINK_PATTERN.sub(self._link, path.read_text(encoding="utf-8"))
+                asset = self._load(path, text.encode("utf-8"), fingerprint=False)
+                self._pages[asset.path] = asset
+
+    def asset(self, url_path: str) -> Asset | None:
+        """Returns the asset served at url_prefix + url_path, if any."""
+        return self._assets.get(url_path)
+
+    def page(self, path: str) -> Asset:
+        """Returns a page by its path under the static directory."""
+        return self._pages[path]
+
+    def url_for(self, path: str) -> str:
+        """Returns the fingerprinted URL of a file under the static directory."""
+        return self._urls[path]
+
+    def stats(self) -> dict:
+        """Returns how many files are held and their total size in each coding."""
+        totals = {}
+        for asset in (*self._assets.values(), *self._pages.values()):
+            for encoding, body in asset.bodies.items():
+                totals[encoding] = totals.get(encoding, 0) + len(body)
+        return {"assets": len(self._assets), "pages": len(self._pages), "bytes": totals}
+
+    def _load(self, path: Path, data: bytes, fingerprint: bool) -> Asset:
+        """Hashes a file and compresses it in every available coding that saves space."""
+        relative = path.relative_to(self.directory).as_posix()
+        digest = hashlib.sha256(data).hexdigest()
+        url_path = relative
+        if fingerprint:
+            stem, dot, suffix = relative.rpartition(".")
+            url_path = f"{stem}.{digest[:12]}.{suffix}" if dot else f"{relative}.{digest[:12]}"
+        mimetype = mimetypes.guess_type(relative)[0] or "application/octet-stream"
+
+        bodies = {IDENTITY: data}
+        if compressible(mimetype) and len(data) >= MIN_COMPRESS_SIZE:
+            for encoding in encodings():
+                body = compress(data, encoding, 11 if encoding == "br" else self.level)
+                if len(body) < len(data):
+                    bodies[encoding] = body
+        return Asset(relative, url_path, mimetype, digest[:32], bodies)
+
+    def _link(self, match: re.Match) -> str:
+        """Replaces a link to static/<path> with the fingerprinted URL, if known."""
+        return self._urls.get(match.group(1), match.group(0))
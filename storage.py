@@ -0,0 +1,640 @@
+"""Storage backends behind one interface, chosen through configuration.
+Every backend takes and returns the same values as sql_methods, so the API
+can run against Postgres, the JSON file store or an embedded SQLite database
+without knowing which one it is talking to."""
+# pylint: disable=import-error
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Protocol
+
+from psycopg2 import DatabaseError
+
+import columnar
+from connection_pool import ConnectionPool, PoolError
+from file_methods import STORIES_FILE
+from file_store import FileStore
+from metrics import QUERY_DURATION, QUERY_ERRORS, QUERY_ROWS
+from query_registry import QueryRegistry
+from sql_methods import (apply_votes,
+                         decode_cursor,
+                         delete_story,
+                         encode_cursor,
+                         get_stories_by_id,
+                         get_stories_columns,
+                         get_stories_data,
+                         get_stories_page,
+                         hot_score,
+                         insert_stories,
+                         insert_story,
+                         insert_votes,
+                         MAX_PAGE_SIZE,
+                         normalize_url,
+                         patch_story,
+                         SORT_COLUMNS,
+                         TIMESTAMP_COLUMNS,
+                         update_score)
+
+BACKENDS = ("postgres", "file", "sqlite")
+SQLITE_FILE = "stories.db"
+SQLITE_QUERY_DIRECTORY = Path(__file__).parent / "queries" / "sqlite"
+FILE_TIMESTAMP_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+
+INVALID_ARGUMENTS = {"error": True, "message": "Invalid argument type(s)"}
+NO_STORIES = {"error": True, "message": "No stories were found"}
+DUPLICATE_URL = {"error": True, "message": "A story with that URL already exists."}
+
+
+class StorageBackend(Protocol):
+    """The operations the API needs from a store of stories and votes.
+    Errors are returned as {"error": True, "message": ...} dicts, never raised."""
+
+    def list_stories(self, search: str, sort: str, order: bool) -> list[dict] | dict:
+        """Returns every story whose title contains search, sorted by sort then id."""
+
+    def list_stories_page(self, search: str, sort: str, order: bool,
+                          limit: int, cursor: str | None = None) -> dict:
+        """Returns {"stories", "next_cursor"} for one page of list_stories."""
+
+    def list_story_columns(self, search: str, sort: str, order: bool) -> dict:
+        """Returns list_stories as {"columns", "rows"}: column names and one tuple
+        per story, with timestamps as seconds since the epoch."""
+
+    def get_stories(self, ids: list[int]) -> list[dict] | dict:
+        """Returns the stories with the given ids, in id order; missing ids are left out."""
+
+    def insert_story(self, url: str, title: str) -> dict:
+        """Adds a story unless one with the same normalized URL is stored;
+        the new story's id is returned as id. A duplicate URL is an error
+        with duplicate set and the existing story's id."""
+
+    def insert_stories(self, stories: list[tuple[str, str]]) -> dict:
+        """Adds a batch of (url, title) stories, returning inserted/skipped counts
+        and the new stories' ids."""
+
+    def vote(self, id_num: int, direction_char: str) -> dict:
+        """Records one 'u' or 'd' vote on a story."""
+
+    def apply_votes(self, votes: list[tuple[int, str]]) -> dict:
+        """Records a batch of votes at once; found says which stories existed."""
+
+    def insert_votes(self, votes: list[tuple[int, str]]) -> dict:
+        """Records a batch of votes, returning inserted/skipped counts."""
+
+    def patch_story(self, id_num: int, url: str, title: str) -> dict:
+        """Changes a story's url and/or title; an empty value is left unchanged."""
+
+    def delete_story(self, id_num: int) -> dict:
+        """Removes a story and its votes."""
+
+    def ping(self) -> dict:
+        """Checks that the backend can serve requests right now."""
+
+    def stats(self) -> dict:
+        """Returns backend-specific usage statistics."""
+
+    def close(self) -> None:
+        """Releases the backend's connections and files."""
+
+
+def valid_listing(search, sort, order) -> bool:
+    """Checks the arguments shared by list_stories and list_stories_page."""
+    return isinstance(search, str) and isinstance(sort, str) and isinstance(order, bool)
+
+
+def valid_stories(stories) -> bool:
+    """Checks a batch of (url, title) stories."""
+    return isinstance(stories, list) and all(
+        isinstance(story, tuple) and len(story) == 2 and isinstance(story[0], str)
+        and isinstance(story[1], str) for story in stories)
+
+
+def valid_votes(votes) -> bool:
+    """Checks a batch of (story id, vote) pairs."""
+    return isinstance(votes, list) and all(
+        isinstance(vote, tuple) and len(vote) == 2 and isinstance(vote[0], int)
+        and isinstance(vote[1], str) for vote in votes)
+
+
+def page_limit_error(limit: int) -> dict | None:
+    """Returns the error for a page size out of range, if it is."""
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return {"error": True, "message": f"Limit must be between 1 and {MAX_PAGE_SIZE}"}
+    return None
+
+
+class PostgresStorage:
+    """Runs the sql_methods queries on connections checked out of the pool,
+    one connection per operation."""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    def list_stories(self, search: str, sort: str, order: bool) -> list[dict] | dict:
+        with self.pool.connection() as conn:
+            return get_stories_data(conn, search, sort, order)
+
+    def list_stories_page(self, search: str, sort: str, order: bool,
+                          limit: int, cursor: str | None = None) -> dict:
+        with self.pool.connection() as conn:
+            return get_stories_page(conn, search, sort, order, limit, cursor)
+
+    def list_story_columns(self, search: str, sort: str, order: bool) -> dict:
+        with self.pool.connection() as conn:
+            return get_stories_columns(conn, search, sort, order)
+
+    def get_stories(self, ids: list[int]) -> list[dict] | dict:
+        with self.pool.connection() as conn:
+            return get_stories_by_id(conn, ids)
+
+    def insert_story(self, url: str, title: str) -> dict:
+        with self.pool.connection() as conn:
+            return insert_story(conn, url, title)
+
+    def insert_stories(self, stories: list[tuple[str, str]]) -> dict:
+        with self.pool.connection() as conn:
+            return insert_stories(conn, stories)
+
+    def vote(self, id_num: int, direction_char: str) -> dict:
+        with self.pool.connection() as conn:
+            return update_score(conn, id_num, direction_char)
+
+    def apply_votes(self, votes: list[tuple[int, str]]) -> dict:
+        with self.pool.connection() as conn:
+            return apply_votes(conn, votes)
+
+    def insert_votes(self, votes: list[tuple[int, str]]) -> dict:
+        with self.pool.connection() as conn:
+            return insert_votes(conn, votes)
+
+    def patch_story(self, id_num: int, url: str, title: str) -> dict:
+        with self.pool.connection() as conn:
+            return patch_story(conn, id_num, url, title)
+
+    def delete_story(self, id_num: int) -> dict:
+        with self.pool.connection() as conn:
+            return delete_story(conn, id_num)
+
+    def ping(self) -> dict:
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+        except (PoolError, DatabaseError) as err:
+            return {"error": True, "message": str(err).strip() or type(err).__name__}
+        return {"success": True}
+
+    def stats(self) -> dict:
+        return {"backend": "postgres", **self.pool.stats()}
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class FileStorage:
+    """Serves the interface from a FileStore. Stories are sorted and paged in
+    memory, and a normalized URL map stands in for the Postgres unique index."""
+
+    def __init__(self, store: FileStore):
+        self.store = store
+        self._lock = threading.RLock()
+        self._urls = {normalize_url(story["url"]): story["id"] for story in store.stories()}
+        self._rows = {}
+
+    def list_stories(self, search: str, sort: str, order: bool) -> list[dict] | dict:
+        if not valid_listing(search, sort, order):
+            return INVALID_ARGUMENTS
+        sort = sort or "created_at"
+        if sort not in SORT_COLUMNS:
+            return {"error": True, "message": "Invalid sort"}
+        rows = self._sorted(search, sort, order)
+        return rows or NO_STORIES
+
+    def list_stories_page(self, search: str, sort: str, order: bool,
+                          limit: int, cursor: str | None = None) -> dict:
+        if (not valid_listing(search, sort, order) or not isinstance(limit, int)
+                or not isinstance(cursor, (str, type(None)))):
+            return INVALID_ARGUMENTS
+        sort = sort or "created_at"
+        if sort not in SORT_COLUMNS:
+            return {"error": True, "message": "Invalid sort"}
+        if error := page_limit_error(limit):
+            return error
+
+        rows = self._sorted(search, sort, order)
+        if cursor:
+            position = decode_cursor(cursor, sort, order)
+            if position is None:
+                return {"error": True, "message": "Invalid cursor"}
+            key = self._sort_key(sort)
+            start = (key({sort: position[0]}), position[1])
+            rows = [row for row in rows
+                    if ((key(row), row["id"]) < start if order else (key(row), row["id"]) > start)]
+        elif not rows:
+            return NO_STORIES
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(sort, order, rows[-1])
+        return {"stories": rows, "next_cursor": next_cursor}
+
+    def list_story_columns(self, search: str, sort: str, order: bool) -> dict:
+        rows = self.list_stories(search, sort, order)
+        if isinstance(rows, dict):
+            return rows
+        columns, values = columnar.from_dicts(rows)
+        return {"columns": columns, "rows": values}
+
+    def get_stories(self, ids: list[int]) -> list[dict] | dict:
+        if not isinstance(ids, list) or not all(isinstance(id_num, int) for id_num in ids):
+            return INVALID_ARGUMENTS
+        stories = (self.store.get_story(id_num) for id_num in sorted(set(ids)))
+        return [self._row(story) for story in stories if story is not None]
+
+    def insert_story(self, url: str, title: str) -> dict:
+        if not isinstance(url, str) or not isinstance(title, str):
+            return INVALID_ARGUMENTS
+        with self._lock:
+            id_num = self._add(url, title)
+            if id_num is None:
+                return {**DUPLICATE_URL, "duplicate": True,
+                        "id": self._urls[normalize_url(url)]}
+        return {"success": True, "message": "Insert story successful.", "id": id_num}
+
+    def insert_stories(self, stories: list[tuple[str, str]]) -> dict:
+        if not valid_stories(stories):
+            return INVALID_ARGUMENTS
+        with self._lock:
+            ids = [id_num for id_num in (self._add(url, title) for url, title in stories)
+                   if id_num is not None]
+        return {"success": True, "inserted": len(ids), "skipped": len(stories) - len(ids),
+                "ids": ids}
+
+    def vote(self, id_num: int, direction_char: str) -> dict:
+        if not isinstance(id_num, int) or not isinstance(direction_char, str):
+            return INVALID_ARGUMENTS
+        return self.store.vote(id_num, "up" if direction_char == "u" else "down")
+
+    def apply_votes(self, votes: list[tuple[int, str]]) -> dict:
+        if not valid_votes(votes):
+            return INVALID_ARGUMENTS
+        with self._lock:
+            found = [self.vote(id_num, direction_char).get("success", False)
+                     for id_num, direction_char in votes]
+        return {"success": True, "found": found}
+
+    def insert_votes(self, votes: list[tuple[int, str]]) -> dict:
+        res = self.apply_votes(votes)
+        if "error" in res:
+            return res
+        inserted = sum(res["found"])
+        return {"success": True, "inserted": inserted, "skipped": len(votes) - inserted}
+
+    def patch_story(self, id_num: int, url: str, title: str) -> dict:
+        if not isinstance(id_num, int) or not isinstance(url, str) or not isinstance(title, str):
+            return INVALID_ARGUMENTS
+        with self._lock:
+            story = self.store.get_story(id_num)
+            if story is None:
+                return {"error": True, "message": "Update story failed."}
+            if url and self._urls.get(normalize_url(url), id_num) != id_num:
+                return DUPLICATE_URL
+            self.store.update_story(id_num, url, title)
+            if url:
+                del self._urls[normalize_url(story["url"])]
+                self._urls[normalize_url(url)] = id_num
+        return {"success": True, "message": "Update story successful."}
+
+    def delete_story(self, id_num: int) -> dict:
+        if not isinstance(id_num, int):
+            return INVALID_ARGUMENTS
+        with self._lock:
+            story = self.store.get_story(id_num)
+            if story is None:
+                return {"error": True, "message": "Update story failed."}
+            self.store.delete_story(id_num)
+            del self._urls[normalize_url(story["url"])]
+            self._rows.pop(id_num, None)
+        return {"success": True, "message": "Delete story successful."}
+
+    def ping(self) -> dict:
+        return {"success": True}
+
+    def stats(self) -> dict:
+        return {"backend": "file", **self.store.stats()}
+
+    def close(self) -> None:
+        self.store.close()
+
+    def _add(self, url: str, title: str) -> int | None:
+        """Stores a story unless its normalized URL is taken, returning its id.
+        Must be called with the lock held."""
+        normalized = normalize_url(url)
+        if normalized in self._urls:
+            return None
+        id_num = self._urls[normalized] = self.store.add_story(title, url)["id"]
+        return id_num
+
+    def _sorted(self, search: str, sort: str, order: bool) -> list[dict]:
+        """Returns the matching stories as rows, ordered like the SQL backends."""
+        key = self._sort_key(sort)
+        rows = [self._row(story) for story in self.store.stories(search)]
+        return sorted(rows, key=lambda row: (key(row), row["id"]), reverse=order)
+
+    @staticmethod
+    def _sort_key(sort: str):
+        """Returns the function giving a row's sort value."""
+        if sort == "title":
+            return lambda row: row["title"].lower()
+        return lambda row: row[sort]
+
+    def _row(self, story: dict) -> dict:
+        """Converts a stored story to a row with datetime timestamps and its hot
+        score, reusing the last conversion while the story is unchanged."""
+        cached = self._rows.get(story["id"])
+        if cached is None or cached[0] is not story:
+            row = {**story, **{column: datetime.strptime(story[column], FILE_TIMESTAMP_FORMAT)
+                               for column in TIMESTAMP_COLUMNS}}
+            row["hot_score"] = hot_score(row["score"], row["created_at"])
+            cached = self._rows[story["id"]] = (story, row)
+        return cached[1]
+
+
+class SQLiteStorage:
+    """Keeps stories and votes in an embedded SQLite database in WAL mode, so
+    readers never wait for the single writer. Each thread gets its own
+    connection; writes take the database lock up front with BEGIN IMMEDIATE."""
+
+    QUERIES = QueryRegistry(SQLITE_QUERY_DIRECTORY, slots={
+        "sort": {"title": "title COLLATE NOCASE", "created_at": "created_at",
+                 "updated_at": "updated_at", "score": "score", "hot_score": "hot_score"},
+        "order": {"asc": "ASC", "desc": "DESC"},
+        "keyset": {"first": "TRUE",
+                   "after": "({sort}, id) > ($3, $4)",
+                   "before": "({sort}, id) < ($3, $4)"},
+    })
+
+    def __init__(self, path: str = SQLITE_FILE, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._statements = {}
+        conn = self._connection()
+        columns = {row[1] for row in conn.execute("PRAGMA table_xinfo(stories)")}
+        if columns and "hot_score" not in columns:
+            conn.execute(self.QUERIES.queries["add_hot_score"].text)
+        conn.executescript(self.QUERIES.queries["schema"].text)
+
+    def list_stories(self, search: str, sort: str, order: bool) -> list[dict] | dict:
+        if not valid_listing(search, sort, order):
+            return INVALID_ARGUMENTS
+        sort = sort or "created_at"
+        if sort not in SORT_COLUMNS:
+            return {"error": True, "message": "Invalid sort"}
+        rows = self._fetch("get_stories", (f"%{search}%",),
+                           sort=sort, order="desc" if order else "asc")
+        return rows or NO_STORIES
+
+    def list_stories_page(self, search: str, sort: str, order: bool,
+                          limit: int, cursor: str | None = None) -> dict:
+        if (not valid_listing(search, sort, order) or not isinstance(limit, int)
+                or not isinstance(cursor, (str, type(None)))):
+            return INVALID_ARGUMENTS
+        sort = sort or "created_at"
+        if sort not in SORT_COLUMNS:
+            return {"error": True, "message": "Invalid sort"}
+        if error := page_limit_error(limit):
+            return error
+
+        params = (f"%{search}%", limit + 1)
+        keyset = "first"
+        if cursor:
+            position = decode_cursor(cursor, sort, order)
+            if position is None:
+                return {"error": True, "message": "Invalid cursor"}
+            params += (self._timestamp(position[0]) if sort in TIMESTAMP_COLUMNS
+                       else position[0], position[1])
+            keyset = "before" if order else "after"
+
+        rows = self._fetch("get_stories_page", params,
+                           sort=sort, order="desc" if order else "asc", keyset=keyset)
+        if not rows and not cursor:
+            return NO_STORIES
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(sort, order, rows[-1])
+        return {"stories": rows, "next_cursor": next_cursor}
+
+    def list_story_columns(self, search: str, sort: str, order: bool) -> dict:
+        if not valid_listing(search, sort, order):
+            return INVALID_ARGUMENTS
+        sort = sort or "created_at"
+        if sort not in SORT_COLUMNS:
+            return {"error": True, "message": "Invalid sort"}
+        rows = self._execute(self._connection(), "get_stories_columns", (f"%{search}%",),
+                             sort=sort, order="desc" if order else "asc")
+        if not rows:
+            return NO_STORIES
+        return {"columns": list(rows[0].keys()), "rows": [tuple(row) for row in rows]}
+
+    def get_stories(self, ids: list[int]) -> list[dict] | dict:
+        if not isinstance(ids, list) or not all(isinstance(id_num, int) for id_num in ids):
+            return INVALID_ARGUMENTS
+        if not ids:
+            return []
+        return self._fetch("get_stories_by_id", (json.dumps(ids),))
+
+    def insert_story(self, url: str, title: str) -> dict:
+        if not isinstance(url, str) or not isinstance(title, str):
+            return INVALID_ARGUMENTS
+        with self._transaction() as conn:
+            rows = self._execute(conn, "insert_story",
+                                 (url, title, normalize_url(url), self._timestamp()))
+            if not rows:
+                existing = self._execute(conn, "find_story_by_url", (normalize_url(url),))
+                return {**DUPLICATE_URL, "duplicate": True, "id": existing[0]["id"]}
+        return {"success": True, "message": "Insert story successful.", "id": rows[0]["id"]}
+
+    def insert_stories(self, stories: list[tuple[str, str]]) -> dict:
+        if not valid_stories(stories):
+            return INVALID_ARGUMENTS
+        unique = {}
+        for url, title in stories:
+            unique.setdefault(normalize_url(url), (url, title, normalize_url(url)))
+        if not unique:
+            return {"success": True, "inserted": 0, "skipped": 0, "ids": []}
+
+        with self._transaction() as conn:
+            rows = self._execute(conn, "insert_stories",
+                                 (json.dumps(list(unique.values())), self._timestamp()))
+        return {"success": True, "inserted": len(rows), "skipped": len(stories) - len(rows),
+                "ids": [row["id"] for row in rows]}
+
+    def vote(self, id_num: int, direction_char: str) -> dict:
+        if not isinstance(id_num, int) or not isinstance(direction_char, str):
+            return INVALID_ARGUMENTS
+        with self._transaction() as conn:
+            rows = self._execute(conn, "insert_vote",
+                                 (id_num, direction_char, self._timestamp()))
+            if rows:
+                self._execute(conn, "add_score", (id_num, direction_char))
+        if not rows:
+            return {"error": True, "message": "Incorrect ID."}
+        return {"success": True, "message": "Update score successful."}
+
+    def apply_votes(self, votes: list[tuple[int, str]]) -> dict:
+        if not valid_votes(votes):
+            return INVALID_ARGUMENTS
+        if not votes:
+            return {"success": True, "found": []}
+        batch = json.dumps(votes)
+        with self._transaction() as conn:
+            found = [bool(row["found"])
+                     for row in self._execute(conn, "find_stories", (batch,))]
+            self._execute(conn, "insert_votes", (batch, self._timestamp()))
+            self._execute(conn, "add_scores", (batch,))
+        return {"success": True, "found": found}
+
+    def insert_votes(self, votes: list[tuple[int, str]]) -> dict:
+        if not valid_votes(votes):
+            return INVALID_ARGUMENTS
+        if not votes:
+            return {"success": True, "inserted": 0, "skipped": 0}
+        batch = json.dumps(votes)
+        with self._transaction() as conn:
+            inserted = len(self._execute(conn, "insert_votes", (batch, self._timestamp())))
+            self._execute(conn, "add_scores", (batch,))
+        return {"success": True, "inserted": inserted, "skipped": len(votes) - inserted}
+
+    def patch_story(self, id_num: int, url: str, title: str) -> dict:
+        if not isinstance(id_num, int) or not isinstance(url, str) or not isinstance(title, str):
+            return INVALID_ARGUMENTS
+        try:
+            with self._transaction() as conn:
+                rows = self._execute(conn, "patch_story",
+                                     (url, normalize_url(url) if url else "", title,
+                                      self._timestamp(), id_num))
+        except sqlite3.IntegrityError:
+            return DUPLICATE_URL
+        if rows:
+            return {"success": True, "message": "Update story successful."}
+        return {"error": True, "message": "Update story failed."}
+
+    def delete_story(self, id_num: int) -> dict:
+        if not isinstance(id_num, int):
+            return INVALID_ARGUMENTS
+        with self._transaction() as conn:
+            rows = self._execute(conn, "delete_story", (id_num,))
+        if rows:
+            return {"success": True, "message": "Delete story successful."}
+        return {"error": True, "message": "Update story failed."}
+
+    def ping(self) -> dict:
+        try:
+            self._connection().execute("SELECT 1")
+        except sqlite3.Error as err:
+            return {"error": True, "message": str(err)}
+        return {"success": True}
+
+    def stats(self) -> dict:
+        conn = self._connection()
+        with self._lock:
+            connections = len(self._connections)
+        return {"backend": "sqlite",
+                "path": self.path,
+                "connections": connections,
+                "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+                "stories": conn.execute("SELECT COUNT(*) FROM stories").fetchone()[0]}
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Runs the block in one write transaction on the thread's connection."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _execute(self, conn: sqlite3.Connection, name: str, params: tuple = (),
+                 **choices) -> list[sqlite3.Row]:
+        """Runs a query with its $n parameters and returns its rows. The rendered
+        text is reused, so sqlite3's statement cache compiles each slot choice
+        only once per connection. Timings, row counts and errors are recorded."""
+        key = (name, *sorted(choices.items()))
+        text = self._statements.get(key)
+        if text is None:
+            text = self._statements[key] = self.QUERIES.statement(
+                self.QUERIES.queries[name], choices)[1]
+        start = time.perf_counter()
+        try:
+            cur = conn.execute(text, {str(i): value for i, value in enumerate(params, 1)})
+            rows = cur.fetchall()
+        except sqlite3.Error:
+            QUERY_ERRORS.inc(1, "sqlite", name)
+            raise
+        QUERY_DURATION.observe(time.perf_counter() - start, "sqlite", name)
+        QUERY_ROWS.inc(max(len(rows), cur.rowcount), "sqlite", name)
+        return rows
+
+    def _fetch(self, name: str, params: tuple, **choices) -> list[dict]:
+        """Runs a read query and converts its rows to dicts with datetime timestamps."""
+        rows = self._execute(self._connection(), name, params, **choices)
+        return [{**row, **{column: datetime.fromisoformat(row[column])
+                           for column in TIMESTAMP_COLUMNS}}
+                for row in map(dict, rows)]
+
+    @staticmethod
+    def _timestamp(value: datetime | None = None) -> str:
+        """Formats a timestamp the way the stories table stores it."""
+        return (value or datetime.now()).isoformat(timespec="microseconds")
+
+
+def create_storage(backend: str, pool: ConnectionPool | None = None,
+                   path: str | None = None) -> StorageBackend:
+    """Builds the configured backend. postgres needs pool; file and sqlite
+    store their data at path, or in the current directory by default."""
+    if backend == "postgres":
+        if pool is None:
+            raise ValueError("The postgres backend needs a connection pool.")
+        return PostgresStorage(pool)
+    if backend == "file":
+        return FileStorage(FileStore(path or STORIES_FILE))
+    if backend == "sqlite":
+        return SQLiteStorage(path or SQLITE_FILE)
+    raise ValueError(f"Storage backend must be one of {', '.join(BACKENDS)}.")
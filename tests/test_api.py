@@ -1,14 +1,27 @@
 """Tests for API."""
 
 # pylint: skip-file
+import datetime
+import gzip
 import json
 import os
+import subprocess
 import sys
-from unittest.mock import patch
+import time
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError, URLError
 
 import pytest
+from psycopg2 import OperationalError
 
-from api import app
+from api import app, change_feed, flush_votes, run_scrape, static_assets, story_cache
+from circuit_breaker import CircuitBreaker
+from connection_pool import PoolTimeoutError
+from metrics import REQUEST_DURATION, SCRAPE_PARSE_DURATION, SCRAPE_STORIES
+from scrape_jobs import ScrapeError, ScrapeQueueFullError, ScrapeTimeoutError
+from slow_queries import SlowQueryLog
+from storage import SQLiteStorage
+from vote_buffer import VoteBufferFullError
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
@@ -19,13 +32,23 @@ def test_client():
         yield testing_client
 
 
+@pytest.fixture(autouse=True)
+def mock_pool():
+    with patch("api.pool") as pool, patch("api.storage.pool", pool):
+        yield pool
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    story_cache.invalidate()
+
+
 class TestStoriesRoute:
     def test_index(self, test_client):
         response = test_client.get('/')
         assert response.status_code == 200
 
-    @patch("api.conn", 1)
-    @patch("api.get_stories_data")
+    @patch("api.storage.list_stories")
     def test_get_stories(self, mock, test_client):
         mock.return_value = [{"created_at": 1,
                              "id": 1,
@@ -40,7 +63,33 @@ class TestStoriesRoute:
             assert i in response.json[0]
         assert mock.called
 
-    @patch("api.get_stories_data")
+    @patch("api.storage.list_stories_page")
+    def test_get_stories_page(self, mock, test_client):
+        mock.return_value = {"stories": [], "next_cursor": "abc"}
+        response = test_client.get(
+            "/stories?sort=score&order=descending&limit=10&cursor=xyz")
+        assert response.status_code == 200
+        assert response.json["next_cursor"] == "abc"
+        assert mock.call_args.args == ("", "score", True, 10, "xyz")
+
+    @patch("api.storage.list_stories_page")
+    def test_get_stories_hot(self, mock, test_client):
+        mock.return_value = {"stories": [], "next_cursor": None}
+        response = test_client.get("/stories?sort=hot&order=descending&limit=10")
+        assert response.status_code == 200
+        assert mock.call_args.args == ("", "hot_score", True, 10, None)
+
+    @patch("api.storage.list_stories_page")
+    def test_get_stories_page_bad_cursor(self, mock, test_client):
+        mock.return_value = {"error": True, "message": "Invalid cursor"}
+        response = test_client.get("/stories?sort=score&order=descending&cursor=xyz")
+        assert response.status_code == 400
+
+    def test_get_stories_page_bad_limit(self, test_client):
+        response = test_client.get("/stories?sort=score&order=descending&limit=ten")
+        assert response.status_code == 400
+
+    @patch("api.storage.list_stories")
     def test_get_stories_error(self, mock, test_client):
         mock.return_value = {"error": True,
                              "message": "No stories were found"}
@@ -48,7 +97,7 @@ class TestStoriesRoute:
             "/stories?sort=title&order=ascending&search=aukus")
         assert "error" in response.json
 
-    @patch("api.insert_story")
+    @patch("api.storage.insert_story")
     def test_post_stories(self, mock, test_client):
         data = {"url": "foo", "title": "bar"}
         mock.return_value = {"message": "Insert story successful."}
@@ -58,6 +107,17 @@ class TestStoriesRoute:
         assert mock.called
         assert response.status_code == 200
 
+    def test_post_duplicate_url(self, test_client, tmp_path):
+        with patch("api.storage", SQLiteStorage(str(tmp_path / "stories.db"))):
+            first = test_client.post("/stories", json={"url": "https://a.example/x",
+                                                       "title": "First"})
+            second = test_client.post("/stories", json={"url": "https://A.example/x/",
+                                                        "title": "Again"})
+        assert first.status_code == 200
+        assert second.status_code == 409
+        assert second.json["message"] == "A story with that URL already exists."
+        assert second.json["id"] == 1
+
     def test_post_error(self, test_client):
         data = {"title": "bar"}
         response = test_client.post("/stories", data=json.dumps(data),
@@ -65,9 +125,215 @@ class TestStoriesRoute:
         assert "error" in response.json
 
 
+class TestChangeFeed:
+    def test_token(self, test_client):
+        response = test_client.get("/stories/changes")
+        assert response.json == {"token": change_feed.token(), "changes": []}
+
+    @patch("api.storage.get_stories")
+    @patch("api.storage.vote")
+    def test_vote_is_published(self, mock_vote, mock_get, test_client):
+        mock_vote.return_value = {"success": True}
+        mock_get.return_value = [{"id": 3, "score": 5}]
+        token = test_client.get("/stories/changes").json["token"]
+        test_client.post("/stories/3/votes", json={"direction": "up"})
+        mock_get.assert_called_once_with([3])
+
+        response = test_client.get(f"/stories/changes?since={token}")
+        assert response.status_code == 200
+        assert response.json["changes"] == [{"change": "updated", "id": 3,
+                                             "story": {"id": 3, "score": 5}}]
+        assert response.json["token"] != token
+
+    @patch("api.storage.get_stories")
+    @patch("api.storage.insert_story")
+    def test_insert_is_published(self, mock_insert, mock_get, test_client):
+        mock_insert.return_value = {"success": True, "id": 8}
+        mock_get.return_value = [{"id": 8, "title": "New"}]
+        token = change_feed.token()
+        test_client.post("/stories", json={"url": "https://example.com", "title": "New"})
+        assert change_feed.since(token)["changes"][0]["change"] == "created"
+
+    @patch("api.storage.delete_story")
+    def test_delete_is_published(self, mock_delete, test_client):
+        mock_delete.return_value = {"success": True}
+        token = change_feed.token()
+        test_client.delete("/stories/4")
+        assert change_feed.since(token)["changes"] == [{"change": "deleted", "id": 4,
+                                                        "story": None}]
+
+    @patch("api.storage.vote")
+    def test_failed_write_not_published(self, mock_vote, test_client):
+        mock_vote.return_value = {"error": True, "message": "Incorrect ID."}
+        token = change_feed.token()
+        test_client.post("/stories/3/votes", json={"direction": "up"})
+        assert change_feed.token() == token
+
+    def test_expired_token(self, test_client):
+        assert test_client.get("/stories/changes?since=old-1").status_code == 410
+
+    def test_event_stream(self, test_client):
+        token = change_feed.token()
+        change_feed.publish([("deleted", 11, None)])
+        response = test_client.get(f"/stories/events?since={token}", buffered=False)
+        assert response.mimetype == "text/event-stream"
+        events = response.response
+        assert next(events).startswith(b"retry:")
+        event = next(events).decode()
+        assert f"id: {change_feed.token()}\nevent: changes\n" in event
+        assert '"id":11' in event.replace(" ", "")
+        response.close()
+
+    def test_event_stream_reset(self, test_client):
+        response = test_client.get("/stories/events", headers={"Last-Event-ID": "old-1"},
+                                   buffered=False)
+        events = list(response.response)
+        assert events[-1] == b"event: reset\ndata: {}\n\n"
+
+    @patch("api.CHANGE_STREAM_KEEPALIVE", 0.01)
+    def test_event_stream_keepalive(self, test_client):
+        response = test_client.get("/stories/events", buffered=False)
+        events = response.response
+        next(events)
+        assert next(events) == b": keepalive\n\n"
+        response.close()
+
+
+class TestColumnar:
+    @patch("api.storage.list_story_columns")
+    def test_full_listing(self, mock, test_client):
+        mock.return_value = {"columns": ["id", "title"], "rows": [(1, "One"), (2, "Two")]}
+        response = test_client.get("/stories?format=columnar&sort=hot&order=descending")
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.json == {"columns": ["id", "title"], "count": 2,
+                                 "values": [[1, 2], ["One", "Two"]]}
+        assert mock.call_args.args == ("", "hot_score", True)
+
+    @patch("api.storage.list_story_columns")
+    def test_gzip_stream(self, mock, test_client):
+        mock.return_value = {"columns": ["id"], "rows": [(i,) for i in range(5000)]}
+        response = test_client.get("/stories?format=columnar",
+                                   headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(response.data))["count"] == 5000
+
+    @patch("api.storage.list_stories_page")
+    def test_page(self, mock, test_client):
+        created = datetime.datetime(2024, 1, 1)
+        mock.return_value = {"stories": [{"id": 1, "title": "One", "created_at": created}],
+                             "next_cursor": "abc"}
+        response = test_client.get("/stories?format=columnar&limit=1")
+        assert response.json == {"columns": ["id", "title", "created_at"], "count": 1,
+                                 "values": [[1], ["One"], [1704067200.0]],
+                                 "next_cursor": "abc"}
+
+    @patch("api.storage.list_story_columns")
+    def test_errors(self, mock, test_client):
+        mock.return_value = {"error": True, "message": "No stories were found"}
+        assert test_client.get("/stories?format=columnar").status_code == 404
+        mock.return_value = {"error": True, "message": "Invalid sort"}
+        assert test_client.get("/stories?format=columnar&sort=url").status_code == 400
+
+    def test_unknown_format(self, test_client):
+        assert test_client.get("/stories?format=xml").status_code == 400
+
+
+class TestStaticAssets:
+    def test_page_links_to_immutable_assets(self, test_client):
+        response = test_client.get("/")
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "no-cache"
+        url = static_assets.url_for("index.css")
+        assert url in response.get_data(as_text=True)
+
+        asset = test_client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert asset.status_code == 200
+        assert asset.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+        assert asset.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in asset.headers["Vary"]
+        again = test_client.get(url, headers={"Accept-Encoding": "gzip",
+                                              "If-None-Match": asset.headers["ETag"]})
+        assert again.status_code == 304
+
+    def test_unknown_asset(self, test_client):
+        assert test_client.get("/assets/index.css").status_code == 404
+
+    def test_not_found_page(self, test_client):
+        with patch("builtins.open") as mock_open:
+            response = test_client.get("/<script>")
+        assert response.status_code == 404
+        assert b"does not exist" in response.data
+        assert not mock_open.called
+
+
+class TestCompression:
+    @patch("api.storage.list_stories")
+    def test_json_is_gzipped(self, mock, test_client):
+        mock.return_value = [{"id": i, "title": "Story title"} for i in range(50)]
+        response = test_client.get("/stories", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(response.data)) == mock.return_value
+        assert response.headers["ETag"].startswith('W/"')
+
+        again = test_client.get("/stories", headers={"Accept-Encoding": "gzip",
+                                                     "If-None-Match": response.headers["ETag"]})
+        assert again.status_code == 304
+
+    @patch("api.storage.list_stories")
+    def test_identity_without_accept_encoding(self, mock, test_client):
+        mock.return_value = [{"id": i, "title": "Story title"} for i in range(50)]
+        response = test_client.get("/stories")
+        assert "Content-Encoding" not in response.headers
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.json == mock.return_value
+
+    @patch("api.storage.list_stories")
+    def test_small_json_not_compressed(self, mock, test_client):
+        mock.return_value = [{"id": 1}]
+        response = test_client.get("/stories", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+
+
+class TestStoriesCache:
+    @patch("api.storage.list_stories")
+    def test_repeated_get_is_cached(self, mock, test_client):
+        mock.return_value = [{"id": 1}]
+        first = test_client.get("/stories?sort=title&order=ascending&search=Bird")
+        second = test_client.get("/stories?sort=TITLE&order=ascending&search=bird")
+        assert mock.call_count == 1
+        assert first.data == second.data
+        assert first.headers["ETag"] == second.headers["ETag"]
+
+    @patch("api.storage.list_stories")
+    def test_etag_not_modified(self, mock, test_client):
+        mock.return_value = [{"id": 1}]
+        etag = test_client.get("/stories?sort=title&order=ascending").headers["ETag"]
+        res = test_client.get("/stories?sort=title&order=ascending",
+                              headers={"If-None-Match": etag})
+        assert res.status_code == 304
+        assert res.data == b""
+
+    @patch("api.storage.insert_story")
+    @patch("api.storage.list_stories")
+    def test_write_invalidates(self, mock_get, mock_insert, test_client):
+        mock_get.return_value = [{"id": 1}]
+        mock_insert.return_value = {"success": True}
+        test_client.get("/stories?sort=title&order=ascending")
+        test_client.post("/stories", data=json.dumps({"url": "foo", "title": "bar"}),
+                         headers={"Content-Type": "application/json"})
+        test_client.get("/stories?sort=title&order=ascending")
+        assert mock_get.call_count == 2
+
+    def test_cache_stats(self, test_client):
+        res = test_client.get("/cache/stats")
+        assert res.status_code == 200
+        assert "hits" in res.json
+
+
 class TestVotingRoute:
 
-    @patch("api.update_score")
+    @patch("api.storage.vote")
     def test_update_votes_up(self, mock, test_client):
         mock.return_value = {"message": "Update score successful."}
         data = {"direction": "up"}
@@ -77,7 +343,7 @@ class TestVotingRoute:
         assert mock.called
         assert response.status_code == 200
 
-    @patch("api.update_score")
+    @patch("api.storage.vote")
     def test_update_votes_down(self, mock, test_client):
         mock.return_value = {"message": "Update score successful."}
         data = {"direction": "down"}
@@ -87,7 +353,7 @@ class TestVotingRoute:
         assert mock.called
         assert response.status_code == 200
 
-    @patch("api.update_score")
+    @patch("api.storage.vote")
     def test_update_votes_down_at_0(self, mock, test_client):
         mock.return_value = {"error": True,
                              "message": "Cannot downvote a story on 0 score."}
@@ -99,6 +365,33 @@ class TestVotingRoute:
         assert mock.called
         assert res.json["message"] == "Cannot downvote a story on 0 score."
 
+    @patch("api.storage.vote")
+    def test_buffered_vote(self, mock, test_client):
+        buffer = MagicMock()
+        data = {"direction": "up"}
+        with patch("api.vote_buffer", buffer):
+            res = test_client.post(f"/stories/1/votes", data=json.dumps(data),
+                                   headers={"Content-Type": "application/json"})
+        assert res.status_code == 202
+        assert buffer.submit.call_args.args == (1, "u")
+        assert not mock.called
+
+    def test_buffered_vote_full(self, test_client):
+        buffer = MagicMock()
+        buffer.submit.side_effect = VoteBufferFullError
+        data = {"direction": "down"}
+        with patch("api.vote_buffer", buffer):
+            res = test_client.post(f"/stories/1/votes", data=json.dumps(data),
+                                   headers={"Content-Type": "application/json"})
+        assert res.status_code == 503
+
+    @patch("api.storage.insert_votes")
+    def test_flush_votes_conflict_raises(self, mock):
+        mock.return_value = {"error": True,
+                             "message": "Votes conflicted with another batch, try again."}
+        with pytest.raises(RuntimeError):
+            flush_votes([(1, "u")])
+
     def test_update_votes_no_direction(self, test_client):
         data = {}
         res = test_client.post(f"/stories/1/votes", data=json.dumps(data),
@@ -106,7 +399,7 @@ class TestVotingRoute:
 
         assert b"error" in res.data
 
-    @patch("api.update_score")
+    @patch("api.storage.vote")
     def test_incorrect_id_fails(self, mock, test_client):
         mock.return_value = {"error": True, "message": "Incorrect ID."}
         data = {"direction": "down"}
@@ -118,9 +411,43 @@ class TestVotingRoute:
         assert mock.called
 
 
+class TestBatchVotesRoute:
+    def post(self, test_client, data):
+        return test_client.post("/votes", data=json.dumps(data),
+                                headers={"Content-Type": "application/json"})
+
+    @patch("api.storage.apply_votes")
+    def test_batch_votes(self, mock, test_client):
+        mock.return_value = {"success": True, "found": [True, False]}
+        res = self.post(test_client, {"votes": [{"story_id": 1, "direction": "up"},
+                                                {"story_id": 1, "direction": "sideways"},
+                                                {"story_id": 99, "direction": "down"}]})
+        assert res.status_code == 200
+        assert mock.call_args.args[0] == [(1, "u"), (99, "d")]
+        assert res.json["results"] == [
+            {"story_id": 1, "success": True},
+            {"story_id": 1, "error": True, "message": "Invalid vote"},
+            {"story_id": 99, "error": True, "message": "Incorrect ID."}]
+        assert (res.json["applied"], res.json["failed"]) == (1, 2)
+
+    @patch("api.storage.apply_votes")
+    def test_batch_votes_conflict(self, mock, test_client):
+        mock.return_value = {"error": True, "message": "A story was deleted while voting, try again."}
+        res = self.post(test_client, {"votes": [{"story_id": 1, "direction": "up"}]})
+        assert res.status_code == 409
+
+    @patch("api.storage.apply_votes")
+    def test_batch_votes_bad_request(self, mock, test_client):
+        assert self.post(test_client, {"votes": []}).status_code == 400
+        assert self.post(test_client, [{"story_id": 1, "direction": "up"}]).status_code == 400
+        too_many = [{"story_id": 1, "direction": "up"}] * 1001
+        assert self.post(test_client, {"votes": too_many}).status_code == 400
+        assert not mock.called
+
+
 class TestModifyStoriesRoute:
 
-    @patch("api.patch_story")
+    @patch("api.storage.patch_story")
     def test_stories_id_patch(self, mock, test_client):
         mock.return_value = "Success"
         data = {"url": "foo", "title": "bar"}
@@ -129,7 +456,7 @@ class TestModifyStoriesRoute:
         assert mock.called
         assert res.status_code == 200
 
-    @patch("api.patch_story")
+    @patch("api.storage.patch_story")
     def test_incorrect_id_fails(self, mock, test_client):
         mock.return_value = {"error": True, "message": "Update story failed."}
         res = test_client.patch(f"/stories/asd/", data=json.dumps([]),
@@ -141,7 +468,7 @@ class TestModifyStoriesRoute:
                                 headers={"Content-Type": "application/json"})
         assert res.status_code == 404
 
-    @patch("api.delete_story")
+    @patch("api.storage.delete_story")
     def test_stories_id_delete(self, mock, test_client):
         mock.return_value = "Success"
         res = test_client.delete(f"/stories/1")
@@ -150,13 +477,22 @@ class TestModifyStoriesRoute:
 
 
 class TestScrape:
-    @patch("api.parse_stories_bs")
-    def test_scrape_patch(self, mock, test_client):
-        mock.return_value = []
-        res = test_client.post(f"/scrape", data=json.dumps({"url": "https://www.bbc.co.uk/news"}),
-                               headers={"Content-Type": "application/json"})
-        assert mock.called
-        assert res.status_code == 200
+    def test_scrape_post_queues_job(self, test_client):
+        with patch("api.scrape_jobs") as mock:
+            mock.submit.return_value.id = "abc"
+            res = test_client.post(f"/scrape", data=json.dumps({"url": "https://www.bbc.co.uk/news"}),
+                                   headers={"Content-Type": "application/json"})
+        mock.submit.assert_called_once_with("https://www.bbc.co.uk/news")
+        assert res.status_code == 202
+        assert res.json["job_id"] == "abc"
+        assert res.json["status_url"] == "/scrape/abc"
+
+    def test_scrape_queue_full(self, test_client):
+        with patch("api.scrape_jobs") as mock:
+            mock.submit.side_effect = ScrapeQueueFullError
+            res = test_client.post(f"/scrape", data=json.dumps({"url": "https://www.bbc.co.uk/news"}),
+                                   headers={"Content-Type": "application/json"})
+        assert res.status_code == 503
 
     def test_scrape_bad_post(self, test_client):
         res = test_client.post(f"/scrape", data=json.dumps({}),
@@ -170,16 +506,224 @@ class TestScrape:
         assert "error" in res.json
         assert res.status_code == 400
 
-    @patch("api.check_internet_connection")
-    def test_scrape_no_internet(self, mock, test_client):
-        mock.return_value = False
-        res = test_client.post(f"/scrape", data=json.dumps({"url": "https://www.bbc.co.uk/news"}),
-                               headers={"Content-Type": "application/json"})
-        assert res.json["message"] == "API not connected to internet."
-        assert res.status_code == 400
+    def test_scrape_job_status(self, test_client):
+        with patch("api.scrape_jobs") as mock:
+            mock.get.return_value = {"job_id": "abc", "state": "running"}
+            res = test_client.get("/scrape/abc")
+        assert res.status_code == 200
+        assert res.json["state"] == "running"
+
+    def test_scrape_job_unknown(self, test_client):
+        with patch("api.scrape_jobs") as mock:
+            mock.get.return_value = None
+            res = test_client.get("/scrape/abc")
+        assert res.status_code == 404
+
+
+class TestRunScrape:
+    @pytest.fixture(autouse=True)
+    def breaker(self):
+        with patch("api.scrape_breaker", CircuitBreaker(failure_threshold=2)) as breaker:
+            yield breaker
+
+    @patch("api.storage.insert_stories")
+    @patch("api.parse_page")
+    @patch("api.get_page")
+    def test_run_scrape(self, mock_page, mock_parse, mock_insert, breaker):
+        mock_parse.return_value = [("url", "title"), ("url2", "title2")]
+        mock_insert.return_value = {"success": True, "inserted": 1, "skipped": 1}
+        res = run_scrape("https://www.bbc.co.uk/news", time.monotonic() + 10)
+        assert res == {"found": 2, "inserted": 1, "skipped": 1}
+        assert mock_page.call_args.kwargs["timeout"] <= 10
+        assert breaker.stats()["successes"] == 1
+
+    @patch("api.storage.insert_stories")
+    @patch("api.parse_page")
+    @patch("api.get_page")
+    def test_run_scrape_metrics(self, mock_page, mock_parse, mock_insert, breaker):
+        mock_parse.return_value = [("url", "title"), ("url2", "title2")]
+        mock_insert.return_value = {"success": True, "inserted": 1, "skipped": 1}
+        parses = SCRAPE_PARSE_DURATION.count()
+        found = SCRAPE_STORIES.value("found")
+        run_scrape("https://www.bbc.co.uk/news", time.monotonic() + 10)
+        assert SCRAPE_PARSE_DURATION.count() == parses + 1
+        assert SCRAPE_STORIES.value("found") == found + 2
+
+    @patch("api.get_page")
+    def test_scrape_fetch_timeout(self, mock_page, breaker):
+        mock_page.side_effect = URLError(TimeoutError())
+        with pytest.raises(ScrapeTimeoutError):
+            run_scrape("https://www.bbc.co.uk/news", time.monotonic() + 10)
+        assert breaker.stats()["consecutive_failures"] == 1
+
+    @patch("api.get_page")
+    def test_repeated_failures_open_circuit(self, mock_page, breaker):
+        mock_page.side_effect = URLError("Name or service not known")
+        for _ in range(2):
+            with pytest.raises(ScrapeError):
+                run_scrape("https://www.bbc.co.uk/news", time.monotonic() + 10)
+        with pytest.raises(ScrapeError, match="unreachable"):
+            run_scrape("https://www.bbc.co.uk/news", time.monotonic() + 10)
+        assert mock_page.call_count == 2
+        assert breaker.stats()["state"] == "open"
+
+    @patch("api.get_page")
+    def test_client_errors_do_not_trip_circuit(self, mock_page, breaker):
+        mock_page.side_effect = HTTPError("url", 404, "Not Found", {}, None)
+        for _ in range(3):
+            with pytest.raises(ScrapeError):
+                run_scrape("https://www.bbc.co.uk/news", time.monotonic() + 10)
+        assert breaker.stats()["state"] == "closed"
+
+    def test_open_circuit_rejects_post(self, breaker, test_client):
+        breaker.record_failure("down")
+        breaker.record_failure("down")
+        with patch("api.scrape_jobs") as mock:
+            res = test_client.post(f"/scrape", data=json.dumps({"url": "https://www.bbc.co.uk/news"}),
+                                   headers={"Content-Type": "application/json"})
+        assert res.status_code == 503
+        assert res.json["error"]
+        assert not mock.submit.called
+
+    def test_scrape_health(self, breaker, test_client):
+        res = test_client.get("/scrape/health")
+        assert res.status_code == 200
+        assert res.json["state"] == "closed"
+
+    def test_scrape_fetch_stats(self, test_client):
+        res = test_client.get("/scrape/stats")
+        assert res.status_code == 200
+        assert "not_modified" in res.json
 
 
 class TestAPI:
     def test_api_bad_endpoint(self, test_client):
         response = test_client.get('/alskdjhfalksdj')
         assert response.status_code == 404
+
+    def test_pool_stats(self, mock_pool, test_client):
+        mock_pool.stats.return_value = {"in_use": 0, "idle": 1}
+        response = test_client.get('/pool/stats')
+        assert response.status_code == 200
+        assert response.json["idle"] == 1
+
+    @patch("storage.get_stories_data")
+    def test_connection_returned_to_pool(self, mock, mock_pool, test_client):
+        mock.return_value = []
+        test_client.get("/stories?sort=title&order=ascending")
+        checkout = mock_pool.connection.return_value
+        mock.assert_called_once_with(checkout.__enter__.return_value, "", "title", False)
+        assert checkout.__exit__.called
+
+    @patch("storage.get_stories_data")
+    def test_pool_timeout(self, mock, mock_pool, test_client):
+        mock_pool.connection.side_effect = PoolTimeoutError("busy")
+        response = test_client.get("/stories?sort=title&order=ascending")
+        assert response.status_code == 503
+        assert not mock.called
+
+    @patch("api.storage.list_stories")
+    def test_metrics(self, mock, test_client):
+        mock.return_value = []
+        before = REQUEST_DURATION.count("GET", "/stories", "200")
+        test_client.get("/stories?sort=title&order=ascending")
+        assert REQUEST_DURATION.count("GET", "/stories", "200") == before + 1
+
+        response = test_client.get("/metrics")
+        assert response.status_code == 200
+        assert response.content_type.startswith("text/plain; version=0.0.4")
+        text = response.get_data(as_text=True)
+        assert "# TYPE http_request_duration_seconds histogram" in text
+        assert 'http_request_duration_seconds_count{method="GET",endpoint="/stories",status="200"}' in text
+
+    def test_metrics_label_unmatched_routes(self, test_client):
+        before = REQUEST_DURATION.count("GET", "unmatched", "404")
+        test_client.get("/no/such/page")
+        assert REQUEST_DURATION.count("GET", "unmatched", "404") == before + 1
+
+    def test_slow_queries(self, test_client):
+        log = SlowQueryLog(threshold=0.0)
+        entry = log.record("get_stories", "get_stories__created_at__desc", "SELECT $1", ("%a%",), 0.3)
+        with patch("api.slow_queries", log), patch.dict(os.environ, {"ADMIN_OPEN": "1"}):
+            response = test_client.get("/admin/slow-queries")
+            assert response.status_code == 200
+            assert response.json["queries"][0]["statement"] == "get_stories__created_at__desc"
+            assert test_client.get(f"/admin/slow-queries/{entry.id}").status_code == 200
+            assert test_client.get("/admin/slow-queries/0").status_code == 404
+            assert test_client.get("/admin/slow-queries?limit=x").status_code == 400
+
+    def test_slow_queries_closed_by_default(self, test_client):
+        with patch.dict(os.environ):
+            os.environ.pop("ADMIN_TOKEN", None)
+            os.environ.pop("ADMIN_OPEN", None)
+            assert test_client.get("/admin/slow-queries").status_code == 401
+            assert test_client.get("/admin/slow-queries/1").status_code == 401
+
+    def test_slow_queries_token(self, test_client):
+        with patch.dict(os.environ, {"ADMIN_TOKEN": "secret", "ADMIN_OPEN": "1"}):
+            assert test_client.get("/admin/slow-queries").status_code == 401
+            response = test_client.get("/admin/slow-queries",
+                                       headers={"Authorization": "Bearer secret"})
+            assert response.status_code == 200
+
+    def test_pool_stats_without_pool(self, test_client):
+        with patch("api.pool", None):
+            response = test_client.get('/pool/stats')
+        assert response.status_code == 404
+
+    def test_storage_stats(self, mock_pool, test_client):
+        mock_pool.stats.return_value = {"in_use": 0, "idle": 1}
+        response = test_client.get('/storage/stats')
+        assert response.status_code == 200
+        assert response.json["backend"] == "postgres"
+
+
+class TestStartup:
+    def test_import_is_lazy(self):
+        code = ("import sys, api; "
+                "assert 'news_scraper' not in sys.modules and 'bs4' not in sys.modules; "
+                "assert api.pool.stats()['size'] == 0")
+        env = {**os.environ, "DATABASE_IP": "127.0.0.1", "DATABASE_PORT": "1",
+               "STORAGE_BACKEND": "postgres"}
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+        assert result.returncode == 0, result.stderr
+
+    def test_import_without_database_settings(self):
+        code = ("import api; client = api.app.test_client(); "
+                "assert client.get('/healthz').status_code == 200; "
+                "response = client.get('/readyz'); "
+                "assert response.status_code == 503, response.json; "
+                "assert response.json['message'] == 'DATABASE_USERNAME is not set.'")
+        env = {name: value for name, value in os.environ.items()
+               if not name.startswith("DATABASE_")}
+        env["STORAGE_BACKEND"] = "postgres"
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+        assert result.returncode == 0, result.stderr
+
+    def test_healthz(self, mock_pool, test_client):
+        response = test_client.get("/healthz")
+        assert response.status_code == 200
+        assert response.json == {"status": "ok"}
+        assert not mock_pool.connection.called
+
+    def test_readyz(self, mock_pool, test_client):
+        response = test_client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json == {"status": "ready", "backend": "postgres"}
+        assert mock_pool.connection.called
+
+    def test_readyz_database_down(self, mock_pool, test_client):
+        mock_pool.connection.side_effect = OperationalError("connection refused")
+        response = test_client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json["status"] == "unavailable"
+        assert response.json["message"] == "connection refused"
+
+    @patch("storage.get_stories_data")
+    def test_database_down(self, mock, mock_pool, test_client):
+        mock_pool.connection.side_effect = OperationalError("connection refused")
+        response = test_client.get("/stories")
+        assert response.status_code == 503
+        assert response.json["message"] == "Database unavailable, try again later."
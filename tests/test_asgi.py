@@ -0,0 +1,234 @@
+"""Tests for asgi module"""
+
+# pylint: skip-file
+import asyncio
+import gzip
+import json
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from psycopg2 import OperationalError
+
+import asgi
+from api import change_feed, story_cache
+from change_feed import UPDATED
+from connection_pool import PoolTimeoutError
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = MagicMock()
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self.conn
+
+
+@pytest.fixture(autouse=True)
+def db_pool():
+    story_cache.invalidate()
+    pool = FakePool()
+    with patch("asgi.get_db_pool", return_value=pool), patch("api.pool"), \
+            patch("api.storage.pool"), patch("asgi.api.STORAGE_BACKEND", "postgres"):
+        yield pool
+
+
+def scope(method, path, query=b"", headers=()):
+    return {"type": "http", "method": method, "path": path, "query_string": query,
+            "root_path": "", "http_version": "1.1", "scheme": "http",
+            "server": ("testserver", 80), "client": ("127.0.0.1", 1234),
+            "headers": [(name.encode(), value.encode()) for name, value in headers]}
+
+
+async def call_async(request_scope, body=b"", disconnect=None):
+    messages = []
+
+    async def receive():
+        if not messages and not receive.started:
+            receive.started = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        if disconnect is not None:
+            await disconnect.wait()
+        return {"type": "http.disconnect"}
+    receive.started = False
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.app(request_scope, receive, send)
+    return messages
+
+
+def call(method, path, query=b"", body=b"", headers=()):
+    messages = asyncio.run(call_async(scope(method, path, query, headers), body))
+    start = messages[0]
+    assert start["type"] == "http.response.start"
+    assert not messages[-1].get("more_body")
+    return (start["status"],
+            {name.decode(): value.decode() for name, value in start["headers"]},
+            b"".join(message.get("body", b"") for message in messages[1:]))
+
+
+STORIES = [{"id": 1, "title": "Budget", "url": "https://a.example", "score": 3}]
+
+
+class TestGetStories:
+    def test_page_from_async_db(self, db_pool):
+        page = AsyncMock(return_value={"stories": STORIES, "next_cursor": None})
+        with patch("asgi.async_db.get_stories_page", page):
+            status, headers, body = call("GET", "/stories", b"limit=5&sort=hot&order=descending")
+        assert status == 200
+        assert json.loads(body) == {"stories": STORIES, "next_cursor": None}
+        page.assert_awaited_once_with(db_pool.conn, "", "hot_score", True, 5, None)
+        assert headers["etag"]
+        assert headers["cache-control"] == "no-cache"
+
+    def test_cached_and_conditional(self):
+        data = AsyncMock(return_value=STORIES)
+        with patch("asgi.async_db.get_stories_data", data):
+            status, headers, _ = call("GET", "/stories")
+            status, _, body = call("GET", "/stories",
+                                   headers=[("If-None-Match", headers["etag"])])
+        assert status == 304
+        assert body == b""
+        assert data.await_count == 1
+
+    def test_not_found(self):
+        data = AsyncMock(return_value={"error": True, "message": "No stories were found"})
+        with patch("asgi.async_db.get_stories_data", data):
+            status, headers, _ = call("GET", "/stories")
+        assert status == 404
+        assert "etag" not in headers
+
+    def test_compressed(self):
+        stories = STORIES * 50
+        with patch("asgi.async_db.get_stories_data", AsyncMock(return_value=stories)):
+            status, headers, body = call("GET", "/stories",
+                                         headers=[("Accept-Encoding", "gzip")])
+        assert headers["content-encoding"] == "gzip"
+        assert headers["etag"].startswith("W/")
+        assert json.loads(gzip.decompress(body)) == stories
+
+    def test_pool_timeout(self):
+        data = AsyncMock(side_effect=PoolTimeoutError("busy"))
+        with patch("asgi.async_db.get_stories_data", data):
+            status, _, body = call("GET", "/stories")
+        assert status == 503
+        assert json.loads(body)["message"] == "Database busy, try again later."
+
+    def test_database_unavailable(self):
+        data = AsyncMock(side_effect=OperationalError("connection refused"))
+        with patch("asgi.async_db.get_stories_data", data):
+            status, _, body = call("GET", "/stories")
+        assert status == 503
+        assert json.loads(body)["message"] == "Database unavailable, try again later."
+
+    def test_columnar_and_bad_limits_go_to_flask(self):
+        columns = {"columns": ["id"], "rows": [(1,)]}
+        with patch("api.storage.list_story_columns", return_value=columns):
+            status, _, body = call("GET", "/stories", b"format=columnar")
+        assert status == 200
+        assert json.loads(body)["values"] == [[1]]
+        status, _, body = call("GET", "/stories", b"limit=x")
+        assert status == 400
+        assert json.loads(body)["message"] == "Limit must be a number"
+
+    def test_other_backends_go_to_flask(self):
+        with patch("asgi.api.STORAGE_BACKEND", "sqlite"), \
+                patch("api.storage.list_stories", return_value=STORIES) as list_stories:
+            status, _, body = call("GET", "/stories")
+        assert status == 200
+        assert json.loads(body) == STORIES
+        list_stories.assert_called_once()
+
+
+class TestVotes:
+    def test_vote(self, db_pool):
+        score = AsyncMock(return_value={"success": True})
+        by_id = AsyncMock(return_value=[{"id": 2, "score": 4}])
+        token = change_feed.token()
+        with patch("asgi.async_db.update_score", score), \
+                patch("asgi.async_db.get_stories_by_id", by_id):
+            status, _, body = call("POST", "/stories/2/votes", body=b'{"direction": "up"}',
+                                   headers=[("Content-Type", "application/json")])
+        assert status == 200
+        assert json.loads(body) == {"message": "successful"}
+        score.assert_awaited_once_with(db_pool.conn, 2, "u")
+        assert change_feed.since(token)["changes"] == [
+            {"change": UPDATED, "id": 2, "story": {"id": 2, "score": 4}}]
+
+    def test_incorrect_id(self):
+        score = AsyncMock(return_value={"error": True, "message": "Incorrect ID."})
+        with patch("asgi.async_db.update_score", score):
+            status, _, body = call("POST", "/stories/2/votes", body=b'{"direction": "down"}',
+                                   headers=[("Content-Type", "application/json")])
+        assert status == 404
+        assert json.loads(body) == {"message": "Incorrect ID."}
+
+    def test_vote_buffer_goes_to_flask(self):
+        buffer = MagicMock()
+        with patch("api.vote_buffer", buffer), \
+                patch("asgi.async_db.update_score", AsyncMock()) as score:
+            status, _, _ = call("POST", "/stories/2/votes", body=b'{"direction": "up"}',
+                                headers=[("Content-Type", "application/json")])
+        assert status == 202
+        buffer.submit.assert_called_once()
+        score.assert_not_awaited()
+
+
+class TestFlaskRoutes:
+    def test_json_route(self):
+        status, headers, body = call("GET", "/stories/changes/stats")
+        assert status == 200
+        assert headers["content-type"] == "application/json"
+        assert "sequence" in json.loads(body)
+
+    def test_not_found(self):
+        status, _, _ = call("GET", "/nothing/here")
+        assert status == 404
+
+    def test_post_body(self):
+        status, _, body = call("POST", "/votes", body=b'{"votes": []}',
+                               headers=[("Content-Type", "application/json")])
+        assert status == 400
+        assert json.loads(body)["message"] == "Request must contain a list of votes"
+
+
+class TestStreamChanges:
+    def test_events_until_disconnect(self):
+        async def run():
+            disconnect = asyncio.Event()
+            stream = asyncio.ensure_future(call_async(
+                scope("GET", "/stories/events", b"since=" + change_feed.token().encode()),
+                disconnect=disconnect))
+            await asyncio.sleep(0.05)
+            assert change_feed.stats()["subscribers"] == 1
+            change_feed.publish([(UPDATED, 7, {"id": 7})])
+            await asyncio.sleep(0.05)
+            disconnect.set()
+            return await asyncio.wait_for(stream, 5)
+
+        messages = asyncio.run(run())
+        body = b"".join(message.get("body", b"") for message in messages[1:]).decode()
+        assert messages[0]["status"] == 200
+        assert body.startswith("retry: ")
+        assert "event: changes" in body and '"id": 7' in body
+        assert change_feed.stats()["subscribers"] == 0
+
+    def test_expired_token_resets(self):
+        messages = asyncio.run(call_async(scope("GET", "/stories/events", b"since=expired")))
+        body = b"".join(message.get("body", b"") for message in messages[1:]).decode()
+        assert body.endswith("event: reset\ndata: {}\n\n")
+        assert not messages[-1].get("more_body")
+
+
+class TestWsgiEnviron:
+    def test_headers_and_path(self):
+        environ = asgi.wsgi_environ(scope("GET", "/stories", b"a=1", [
+            ("Content-Type", "application/json"), ("X-Many", "a"), ("X-Many", "b")]), b"{}")
+        assert environ["PATH_INFO"] == "/stories"
+        assert environ["QUERY_STRING"] == "a=1"
+        assert environ["CONTENT_TYPE"] == "application/json"
+        assert environ["HTTP_X_MANY"] == "a,b"
+        assert environ["wsgi.input"].read() == b"{}"
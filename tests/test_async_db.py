@@ -0,0 +1,133 @@
+"""Tests for async_db module"""
+
+# pylint: skip-file
+import asyncio
+import socket
+from unittest.mock import MagicMock, patch
+
+import pytest
+from psycopg2.extensions import POLL_OK, POLL_READ
+
+import async_db
+from connection_pool import PoolTimeoutError
+
+
+def make_conn(rows=()):
+    conn = MagicMock()
+    conn.poll.return_value = POLL_OK
+    conn.closed = 0
+    conn.isexecuting.return_value = False
+    cur = conn.cursor.return_value
+    cur.connection = conn
+    cur.fetchall.return_value = list(rows)
+    cur.rowcount = len(rows)
+    return conn, cur
+
+
+def executed(cur):
+    return [call.args[0] for call in cur.execute.call_args_list]
+
+
+class TestWait:
+    def test_waits_for_socket(self):
+        reader, writer = socket.socketpair()
+        conn = MagicMock()
+        conn.fileno.return_value = reader.fileno()
+        conn.poll.side_effect = [POLL_READ, POLL_OK]
+
+        async def run():
+            asyncio.get_running_loop().call_later(0.02, writer.send, b"x")
+            await asyncio.wait_for(async_db.wait(conn), 2)
+
+        try:
+            asyncio.run(run())
+        finally:
+            reader.close()
+            writer.close()
+        assert conn.poll.call_count == 2
+
+
+class TestQueries:
+    def test_prepares_once_per_connection(self):
+        conn, cur = make_conn([{"found": True, "vote_id": 3}])
+        first = asyncio.run(async_db.update_score(conn, 1, "u"))
+        second = asyncio.run(async_db.update_score(conn, 2, "d"))
+        assert first == second == {"success": True, "message": "Update score successful."}
+        assert executed(cur)[0].startswith("PREPARE update_score AS")
+        assert executed(cur)[1:] == ["EXECUTE update_score (%s, %s)"] * 2
+        assert cur.execute.call_args.args[1] == (2, "d")
+        conn.commit.assert_not_called()
+
+    def test_update_score_incorrect_id(self):
+        conn, _ = make_conn([{"found": False, "vote_id": None}])
+        assert asyncio.run(async_db.update_score(conn, 1, "u")) == {
+            "error": True, "message": "Incorrect ID."}
+
+    def test_get_stories_page(self):
+        rows = [{"id": 3, "score": 5}, {"id": 2, "score": 4}, {"id": 1, "score": 1}]
+        conn, cur = make_conn(rows)
+        res = asyncio.run(async_db.get_stories_page(conn, "", "score", True, 2))
+        assert res["stories"] == rows[:2]
+        assert res["next_cursor"] is not None
+        assert cur.execute.call_args.args[1] == ("%%", 3)
+
+    def test_validation_is_shared(self):
+        conn, cur = make_conn()
+        assert asyncio.run(async_db.get_stories_data(conn, "", "bad", True)) == {
+            "error": True, "message": "Invalid sort"}
+        assert asyncio.run(async_db.get_stories_page(conn, "", "", True, 0))["error"]
+        assert asyncio.run(async_db.get_stories_by_id(conn, [])) == []
+        cur.execute.assert_not_called()
+
+    def test_no_stories(self):
+        conn, _ = make_conn()
+        assert asyncio.run(async_db.get_stories_data(conn, "", "", True)) == {
+            "error": True, "message": "No stories were found"}
+
+
+class TestAsyncConnectionPool:
+    def test_reuses_connections(self):
+        conn, _ = make_conn()
+        pool = async_db.AsyncConnectionPool({}, max_size=2)
+
+        async def run():
+            async with pool.connection() as first:
+                pass
+            async with pool.connection() as second:
+                pass
+            return first, second
+
+        with patch("async_db.connect", return_value=conn) as connect:
+            first, second = asyncio.run(run())
+        assert first is second is conn
+        connect.assert_called_once_with(async_=1)
+        assert pool.stats()["size"] == 1
+
+    def test_discards_busy_connections(self):
+        conn, _ = make_conn()
+        conn.isexecuting.return_value = True
+        pool = async_db.AsyncConnectionPool({}, max_size=2)
+
+        async def run():
+            async with pool.connection():
+                pass
+
+        with patch("async_db.connect", return_value=conn):
+            asyncio.run(run())
+        conn.close.assert_called_once()
+        assert pool.stats()["size"] == 0
+        assert pool.stats()["discarded"] == 1
+
+    def test_checkout_timeout(self):
+        pool = async_db.AsyncConnectionPool({}, max_size=1, timeout=0.01)
+
+        async def run():
+            async with pool.connection():
+                async with pool.connection():
+                    pass
+
+        with patch("async_db.connect", return_value=make_conn()[0]):
+            with pytest.raises(PoolTimeoutError):
+                asyncio.run(run())
+        assert pool.stats()["checkout_timeouts"] == 1
+        assert pool.stats()["in_use"] == 0
@@ -0,0 +1,74 @@
+"""Tests for change_feed module"""
+
+# pylint: skip-file
+import threading
+import time
+
+from change_feed import CREATED, DELETED, UPDATED, ChangeFeed
+
+
+class TestChangeFeed:
+    def test_since(self):
+        feed = ChangeFeed()
+        start = feed.token()
+        token = feed.publish([(CREATED, 1, {"id": 1, "score": 0})])
+        assert feed.since(start) == {"token": token, "changes": [
+            {"change": CREATED, "id": 1, "story": {"id": 1, "score": 0}}]}
+        assert feed.since(token) == {"token": token, "changes": []}
+
+    def test_latest_change_per_story(self):
+        feed = ChangeFeed()
+        start = feed.token()
+        feed.publish([(UPDATED, 1, {"id": 1, "score": 1}), (UPDATED, 2, {"id": 2, "score": 1})])
+        middle = feed.publish([(UPDATED, 1, {"id": 1, "score": 2})])
+        feed.publish([(DELETED, 2, None)])
+        assert feed.since(start)["changes"] == [
+            {"change": UPDATED, "id": 1, "story": {"id": 1, "score": 2}},
+            {"change": DELETED, "id": 2, "story": None}]
+        assert [change["id"] for change in feed.since(middle)["changes"]] == [2]
+
+    def test_created_then_updated_is_still_created(self):
+        feed = ChangeFeed()
+        start = feed.token()
+        feed.publish([(CREATED, 1, {"id": 1, "score": 0})])
+        feed.publish([(UPDATED, 1, {"id": 1, "score": 1})])
+        assert feed.since(start)["changes"] == [
+            {"change": CREATED, "id": 1, "story": {"id": 1, "score": 1}}]
+
+    def test_expired_tokens(self):
+        feed = ChangeFeed(capacity=2)
+        start = feed.token()
+        for id_num in range(3):
+            feed.publish([(UPDATED, id_num, {"id": id_num})])
+        assert feed.since(start) is None
+        assert feed.since(ChangeFeed().token()) is None
+        assert feed.since("nonsense") is None
+        assert feed.since(feed.token() + "0") is None
+        assert feed.stats()["changes"] == 2
+
+    def test_wait(self):
+        feed = ChangeFeed()
+        token = feed.token()
+        timer = threading.Timer(0.05, feed.publish, [[(CREATED, 1, {"id": 1})]])
+        timer.start()
+        start = time.monotonic()
+        changes = feed.wait(token, timeout=5)
+        assert time.monotonic() - start < 1
+        assert changes["changes"][0]["id"] == 1
+
+    def test_wait_times_out(self):
+        feed = ChangeFeed()
+        assert feed.wait(feed.token(), timeout=0.01)["changes"] == []
+
+    def test_subscribers_called_on_publish(self):
+        feed = ChangeFeed()
+        calls = []
+        callback = lambda: calls.append(feed.token())
+        feed.subscribe(callback)
+        token = feed.publish([(CREATED, 1, {"id": 1})])
+        feed.publish([])
+        assert calls == [token]
+        assert feed.stats()["subscribers"] == 1
+        feed.unsubscribe(callback)
+        feed.publish([(UPDATED, 1, {"id": 1})])
+        assert calls == [token]
@@ -0,0 +1,83 @@
+"""Tests for circuit_breaker module"""
+
+# pylint: skip-file
+import pytest
+
+from circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+
+class TestCircuitBreaker:
+    def test_starts_closed(self, breaker):
+        assert breaker.allow_request()
+        assert not breaker.is_open()
+        assert breaker.stats()["healthy"]
+
+    def test_opens_after_threshold(self, breaker):
+        breaker.record_failure("down")
+        assert not breaker.is_open()
+        breaker.record_failure("down")
+        assert breaker.is_open()
+        assert not breaker.allow_request()
+        stats = breaker.stats()
+        assert stats["state"] == "open"
+        assert stats["retry_after"] == 10
+        assert stats["rejected"] == 1
+        assert stats["last_error"] == "down"
+
+    def test_success_resets_failures(self, breaker):
+        breaker.record_failure("down")
+        breaker.record_success()
+        breaker.record_failure("down")
+        assert not breaker.is_open()
+
+    def test_half_open_allows_single_trial(self, breaker, clock):
+        breaker.record_failure("down")
+        breaker.record_failure("down")
+        clock.now = 10
+        assert not breaker.is_open()
+        assert breaker.stats()["state"] == "half_open"
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+
+    def test_half_open_success_closes(self, breaker, clock):
+        breaker.record_failure("down")
+        breaker.record_failure("down")
+        clock.now = 10
+        breaker.allow_request()
+        breaker.record_success()
+        assert breaker.stats()["state"] == "closed"
+        assert breaker.allow_request()
+
+    def test_half_open_failure_reopens(self, breaker, clock):
+        breaker.record_failure("down")
+        breaker.record_failure("down")
+        clock.now = 10
+        breaker.allow_request()
+        breaker.record_failure("still down")
+        assert breaker.is_open()
+        clock.now = 19
+        assert breaker.is_open()
+        clock.now = 20
+        assert breaker.allow_request()
+
+    def test_bad_threshold(self):
+        with pytest.raises(ValueError):
+            CircuitBreaker(failure_threshold=0)
@@ -0,0 +1,42 @@
+"""Tests for columnar module"""
+
+# pylint: skip-file
+import datetime
+import json
+
+from columnar import encode, epoch, from_dicts
+
+
+class TestEncode:
+    def test_round_trip(self):
+        rows = [(i, f"Story {i}", i * 1.5) for i in range(7)]
+        body = b"".join(encode(["id", "title", "time"], rows, chunk_rows=3, next_cursor="abc"))
+        assert json.loads(body) == {"columns": ["id", "title", "time"], "count": 7,
+                                    "values": [list(range(7)),
+                                               [f"Story {i}" for i in range(7)],
+                                               [i * 1.5 for i in range(7)]],
+                                    "next_cursor": "abc"}
+
+    def test_streams_in_chunks(self):
+        rows = [(i,) for i in range(10)]
+        chunks = list(encode(["id"], rows, chunk_rows=2))
+        assert len(chunks) > 5
+        assert max(len(chunk) for chunk in chunks) < 40
+
+    def test_empty(self):
+        body = b"".join(encode(["id", "title"], []))
+        assert json.loads(body) == {"columns": ["id", "title"], "count": 0, "values": [[], []]}
+
+    def test_escapes_strings(self):
+        body = b"".join(encode(["title"], [('Quote " and \\u00e9 é',)]))
+        assert json.loads(body)["values"] == [['Quote " and \\u00e9 é']]
+
+
+class TestFromDicts:
+    def test_columns_and_timestamps(self):
+        created = datetime.datetime(2024, 1, 1, 12, 0, 0, 500000)
+        rows = [{"score": 3, "created_at": created, "id": 1, "extra": True}]
+        columns, values = from_dicts(rows)
+        assert columns == ["id", "created_at", "score", "extra"]
+        assert values == [(1, 1704110400.5, 3, True)]
+        assert epoch(created) == created.replace(tzinfo=datetime.timezone.utc).timestamp()
@@ -0,0 +1,176 @@
+"""Tests for connection_pool module"""
+
+# pylint: skip-file
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from psycopg2 import OperationalError
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_INERROR,
+                                 TRANSACTION_STATUS_UNKNOWN)
+
+from connection_pool import (ConnectionPool,
+                             PoolClosedError,
+                             PoolConfigError,
+                             PoolTimeoutError)
+
+
+def make_conn():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.get_transaction_status.return_value = TRANSACTION_STATUS_IDLE
+    return conn
+
+
+@pytest.fixture
+def connector():
+    return MagicMock(side_effect=lambda **kwargs: make_conn())
+
+
+class TestCheckout:
+    def test_opens_min_size_on_start(self, connector):
+        pool = ConnectionPool({"database": "foo"}, min_size=2, max_size=4, connector=connector)
+        assert connector.call_count == 2
+        connector.assert_called_with(database="foo")
+        assert pool.stats()["idle"] == 2
+
+    def test_bad_sizes(self, connector):
+        with pytest.raises(ValueError):
+            ConnectionPool({}, min_size=3, max_size=2, connector=connector)
+
+    def test_reuses_returned_connection(self, connector):
+        pool = ConnectionPool({}, min_size=1, max_size=2, connector=connector)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        assert pool.getconn() is conn
+        assert connector.call_count == 1
+
+    def test_grows_up_to_max(self, connector):
+        pool = ConnectionPool({}, min_size=0, max_size=2, timeout=0.01, connector=connector)
+        first, second = pool.getconn(), pool.getconn()
+        assert first is not second
+        with pytest.raises(PoolTimeoutError):
+            pool.getconn()
+        stats = pool.stats()
+        assert stats["in_use"] == 2
+        assert stats["checkout_timeouts"] == 1
+
+    def test_waiter_gets_released_connection(self, connector):
+        pool = ConnectionPool({}, min_size=1, max_size=1, timeout=2, connector=connector)
+        conn = pool.getconn()
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(pool.getconn()))
+        waiter.start()
+        pool.putconn(conn)
+        waiter.join(2)
+        assert result == [conn]
+
+    def test_failed_connect_frees_slot(self, connector):
+        pool = ConnectionPool({}, min_size=0, max_size=1, connector=connector)
+        connector.side_effect = OperationalError("down")
+        with pytest.raises(OperationalError):
+            pool.getconn()
+        assert pool.stats()["size"] == 0
+
+    def test_lazy_pool_connects_on_checkout(self, connector):
+        pool = ConnectionPool({}, min_size=2, max_size=2, connector=connector, lazy=True)
+        assert connector.call_count == 0
+        pool.putconn(pool.getconn())
+        assert connector.call_count == 1
+        assert pool.stats()["idle"] == 1
+
+    def test_connect_kwargs_resolved_on_connect(self, connector):
+        config = MagicMock(return_value={"host": "db"})
+        pool = ConnectionPool(config, min_size=1, max_size=1, connector=connector, lazy=True)
+        assert not config.called
+        pool.getconn()
+        connector.assert_called_once_with(host="db")
+
+    def test_config_error_frees_the_slot(self, connector):
+        config = MagicMock(side_effect=PoolConfigError("DATABASE_IP is not set."))
+        pool = ConnectionPool(config, min_size=0, max_size=1, connector=connector)
+        with pytest.raises(PoolConfigError):
+            pool.getconn()
+        assert pool.stats()["size"] == 0
+        assert not connector.called
+
+    @patch("connection_pool.time.sleep")
+    def test_retries_failed_connect(self, sleep, connector):
+        conn = make_conn()
+        connector.side_effect = [OperationalError("starting up"), OperationalError("starting up"),
+                                 conn]
+        pool = ConnectionPool({}, min_size=0, max_size=1, connector=connector,
+                              retries=3, retry_delay=0.1)
+        assert pool.getconn() is conn
+        assert [call.args[0] for call in sleep.call_args_list] == [0.1, 0.2]
+        assert pool.stats()["connect_failures"] == 2
+
+    @patch("connection_pool.time.sleep")
+    def test_gives_up_after_retries(self, sleep, connector):
+        connector.side_effect = OperationalError("down")
+        pool = ConnectionPool({}, min_size=0, max_size=1, connector=connector, retries=2)
+        with pytest.raises(OperationalError):
+            pool.getconn()
+        assert connector.call_count == 3
+        assert pool.stats()["size"] == 0
+
+    def test_closed_pool(self, connector):
+        pool = ConnectionPool({}, min_size=1, max_size=1, connector=connector)
+        pool.close()
+        with pytest.raises(PoolClosedError):
+            pool.getconn()
+
+
+class TestReturn:
+    def test_rolls_back_open_transaction(self, connector):
+        pool = ConnectionPool({}, min_size=1, max_size=1, connector=connector)
+        conn = pool.getconn()
+        conn.get_transaction_status.return_value = TRANSACTION_STATUS_INERROR
+        pool.putconn(conn)
+        assert conn.rollback.called
+        assert pool.stats()["idle"] == 1
+
+    def test_drops_broken_connection(self, connector):
+        pool = ConnectionPool({}, min_size=1, max_size=1, connector=connector)
+        conn = pool.getconn()
+        conn.get_transaction_status.return_value = TRANSACTION_STATUS_UNKNOWN
+        pool.putconn(conn)
+        assert conn.close.called
+        assert pool.stats()["size"] == 0
+        assert pool.getconn() is not conn
+
+    def test_context_manager(self, connector):
+        pool = ConnectionPool({}, min_size=1, max_size=1, connector=connector)
+        with pytest.raises(RuntimeError):
+            with pool.connection():
+                raise RuntimeError
+        assert pool.stats()["in_use"] == 0
+
+
+class TestValidation:
+    def test_reconnects_closed_connection(self, connector):
+        pool = ConnectionPool({}, min_size=1, max_size=1, connector=connector)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.closed = 1
+        assert pool.getconn() is not conn
+        assert pool.stats()["reconnects"] == 1
+
+    @patch("connection_pool.VALIDATE_AFTER", 0)
+    def test_reconnects_after_failed_ping(self, connector):
+        pool = ConnectionPool({}, min_size=1, max_size=1, connector=connector)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.cursor.return_value.__enter__.return_value.execute.side_effect = \
+            OperationalError("server closed the connection")
+        assert pool.getconn() is not conn
+        assert conn.close.called
+
+    @patch("connection_pool.VALIDATE_AFTER", 0)
+    def test_keeps_healthy_connection(self, connector):
+        pool = ConnectionPool({}, min_size=1, max_size=1, connector=connector)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        assert pool.getconn() is conn
+        assert pool.stats()["reconnects"] == 0
@@ -0,0 +1,151 @@
+"""Tests for file_store module"""
+
+# pylint: skip-file
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from file_store import FileStore, StoreCorruptError
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "stories.json")
+
+
+def open_store(path, **kwargs):
+    return FileStore(path, **kwargs)
+
+
+class TestFileStore:
+    def test_add_and_get(self, path):
+        store = open_store(path)
+        story = store.add_story("eBird: A crowdsourced bird sighting database", "https://ebird.org")
+        assert story["id"] == 1 and store.get_max_id() == 1
+        assert store.get_stories_data("bird", "", False) == [story]
+        store.close()
+
+    def test_empty(self, path):
+        store = open_store(path)
+        assert store.get_stories_data("", "", False)["error"]
+        assert store.get_max_id() == 0
+        store.close()
+
+    def test_update_vote_delete(self, path):
+        store = open_store(path)
+        store.add_story("Old title", "https://a.com")
+        assert store.update_story(1, title="New title")["success"]
+        assert store.vote(1, "up")["success"]
+        assert store.get_story(1)["score"] == 1
+        assert store.get_stories_data("new", "", False)[0]["title"] == "New title"
+        assert store.get_stories_data("old", "", False) == []
+        assert store.delete_story(1)["success"]
+        assert store.delete_story(1)["message"] == "Incorrect ID."
+        assert store.vote(1, "up")["message"] == "Incorrect ID."
+        store.close()
+
+    def test_sort(self, path):
+        store = open_store(path)
+        for title in ["b", "C", "a"]:
+            store.add_story(title, f"https://{title}.com")
+        assert [s["title"] for s in store.get_stories_data("", "title", True)] == ["C", "b", "a"]
+        store.close()
+
+    def test_invalid_fsync_policy(self, path):
+        with pytest.raises(ValueError):
+            open_store(path, fsync="sometimes")
+
+
+class TestRecovery:
+    def test_replays_log(self, path):
+        store = open_store(path, fsync="always")
+        store.add_story("One", "https://one.com")
+        store.add_story("Two", "https://two.com")
+        store.vote(2, "down")
+        store.delete_story(1)
+        store.close()
+        assert not os.path.exists(path)
+
+        store = open_store(path)
+        assert store.get_story(1) is None
+        assert store.get_story(2)["score"] == -1
+        assert store.get_max_id() == 2
+        assert store.stats()["log_records"] == 4
+        store.close()
+
+    def test_compaction(self, path):
+        store = open_store(path, compact_every=3)
+        for i in range(4):
+            store.add_story(f"Story {i}", f"https://{i}.com")
+        assert store.stats()["compactions"] == 1
+        store.close()
+
+        with open(path, encoding="utf-8") as file:
+            assert len(json.load(file)) == 3
+        with open(path + ".log", encoding="utf-8") as file:
+            assert len(file.readlines()) == 1
+        store = open_store(path)
+        assert len(store.get_stories_data("", "", False)) == 4
+        store.close()
+
+    def test_crash_between_snapshot_and_log_truncation(self, path):
+        store = open_store(path)
+        store.add_story("One", "https://one.com")
+        store.vote(1, "up")
+        store.flush()
+        with open(path + ".log", encoding="utf-8") as file:
+            log = file.read()
+        store.compact()
+        store.close()
+        with open(path + ".log", "w", encoding="utf-8") as file:
+            file.write(log)
+
+        store = open_store(path)
+        assert store.get_story(1)["score"] == 1
+        assert len(store.get_stories_data("", "", False)) == 1
+        store.close()
+
+    def test_torn_final_record(self, path):
+        store = open_store(path)
+        store.add_story("One", "https://one.com")
+        store.close()
+        with open(path + ".log", "a", encoding="utf-8") as file:
+            file.write('{"op":"put","story":{"id":2,"tit')
+
+        store = open_store(path)
+        assert store.get_max_id() == 1
+        store.add_story("Two", "https://two.com")
+        store.close()
+        store = open_store(path)
+        assert [s["title"] for s in store.get_stories_data("", "title", False)] == ["One", "Two"]
+        store.close()
+
+    def test_damaged_record_raises(self, path):
+        with open(path + ".log", "w", encoding="utf-8") as file:
+            file.write('garbage\n{"op":"delete","id":1}\n')
+        with pytest.raises(StoreCorruptError):
+            open_store(path)
+
+    def test_process_killed_without_close(self, path):
+        script = textwrap.dedent(f"""
+            import os
+            from file_store import FileStore
+            store = FileStore({path!r}, fsync="always", compact_every=50)
+            for i in range(120):
+                store.add_story(f"Story {{i}}", f"https://{{i}}.com")
+            store.vote(7, "up")
+            os._exit(1)
+        """)
+        subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=False)
+
+        store = open_store(path)
+        assert store.get_max_id() == 120
+        assert len(store.get_stories_data("story", "", False)) == 120
+        assert store.get_story(7)["score"] == 1
+        store.close()
@@ -0,0 +1,94 @@
+"""Tests for metrics module"""
+
+# pylint: skip-file
+import threading
+
+import pytest
+
+from metrics import Counter, format_value, Histogram, MetricsRegistry
+
+
+class TestCounter:
+    def test_inc_per_label(self):
+        counter = Counter("rows_total", "Rows.", ("query",))
+        counter.inc(3, "get_stories")
+        counter.inc(1, "get_stories")
+        counter.inc(2, "insert_story")
+        assert counter.value("get_stories") == 4
+        assert counter.render() == ["# HELP rows_total Rows.",
+                                    "# TYPE rows_total counter",
+                                    'rows_total{query="get_stories"} 4',
+                                    'rows_total{query="insert_story"} 2']
+
+    def test_rejects_negative_and_wrong_labels(self):
+        counter = Counter("rows_total", "Rows.", ("query",))
+        with pytest.raises(ValueError):
+            counter.inc(-1, "get_stories")
+        with pytest.raises(ValueError):
+            counter.inc(1)
+
+    def test_concurrent_increments(self):
+        counter = Counter("hits_total", "Hits.")
+
+        def hit():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=hit) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert counter.value() == 8000
+
+
+class TestHistogram:
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, "/stories")
+        assert histogram.count("/stories") == 4
+        assert histogram.render()[2:] == [
+            'latency_seconds_bucket{route="/stories",le="0.1"} 2',
+            'latency_seconds_bucket{route="/stories",le="1"} 3',
+            'latency_seconds_bucket{route="/stories",le="+Inf"} 4',
+            'latency_seconds_sum{route="/stories"} 3.65',
+            'latency_seconds_count{route="/stories"} 4']
+
+    def test_unlabelled(self):
+        histogram = Histogram("parse_seconds", "Parse.", buckets=(1.0,))
+        histogram.observe(0.5)
+        assert 'parse_seconds_bucket{le="1"} 1' in histogram.render()
+        assert "parse_seconds_count 1" in histogram.render()
+
+    def test_rejects_unsorted_buckets(self):
+        with pytest.raises(ValueError):
+            Histogram("bad", "Bad.", buckets=(1.0, 0.5))
+
+
+class TestRegistry:
+    def test_render(self):
+        registry = MetricsRegistry()
+        counter = registry.register(Counter("a_total", "A."))
+        registry.register(Histogram("b_seconds", "B.", buckets=(1.0,)))
+        counter.inc()
+        text = registry.render()
+        assert text.endswith("\n")
+        assert "# TYPE a_total counter\na_total 1\n" in text
+        assert "# TYPE b_seconds histogram\n" in text
+
+    def test_duplicate_name(self):
+        registry = MetricsRegistry()
+        registry.register(Counter("a_total", "A."))
+        with pytest.raises(ValueError):
+            registry.register(Counter("a_total", "A again."))
+
+    def test_label_escaping(self):
+        counter = Counter("a_total", "A.", ("path",))
+        counter.inc(1, 'say "hi"\\\n')
+        assert counter.render()[-1] == r'a_total{path="say \"hi\"\\\n"} 1'
+
+    def test_format_value(self):
+        assert format_value(2.0) == "2"
+        assert format_value(0.25) == "0.25"
+        assert format_value(float("inf")) == "+Inf"
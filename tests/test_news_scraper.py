@@ -0,0 +1,57 @@
+"""Tests for news_scraper module"""
+
+# pylint: skip-file
+from pathlib import Path
+
+import pytest
+
+from news_scraper import dereference_charref, parse_stories, parse_stories_bs
+
+DOMAIN = "https://www.bbc.co.uk"
+FIXTURES = sorted(Path(__file__).parent.joinpath("fixtures").glob("*.html"))
+
+SNIPPETS = [
+    '<a href="/news/uk-12345678">Title</a><a href="/news/uk-12345678">Again</a>',
+    '<a href="/news/uk-12345678">Video Title</a><a href="/news/uk-12345678">Title</a>',
+    '<a href="/news/uk-12345678"><h3>Fish &amp; chips &#x27;up&#39; &nbsp;&foo; &#12x</h3></a>',
+    '<a href="/news/uk-12345678">  <span>Title</span>\n  <br></br></a>',
+    '<a href="/news/uk-12345678"><script>var a = "<b>";</script>Title<style>p{}</style></a>',
+    '<a href="/news/uk-12345678">Title<!-- comment --><![CDATA[ raw ]]><?pi?> end</a>',
+    '<a href="/news/uk-12345678"><pre>  </pre> <template>hidden</template></a>',
+    '<a href="/news/uk-12345678">One<a href="/news/uk-87654321">Two</a>Three',
+    '<div><a href="/news/uk-12345678"><span>Unclosed</div>Tail</a></span>',
+    '<a href="/news/uk-12345678" href="/news/uk-87654321">Duplicate attribute</a>',
+    '<a href="https://www.bbc.co.uk/news/uk-12345678">Absolute</a><a href="/news/live">Live</a>',
+    '<a href/><a href="/news/uk-12345678"/>Title</a>',
+    '<a href="/news/uk-12345678">&#0;&#128;&#129;&#x9F;&#X41;&#x110000;&#xD800;&#8364;&#65</a>',
+]
+
+
+class TestParseStories:
+    @pytest.mark.parametrize("html", SNIPPETS)
+    def test_matches_bs(self, html):
+        assert parse_stories(DOMAIN, html) == parse_stories_bs(DOMAIN, html)
+
+    @pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.name)
+    def test_fixture_matches_bs(self, path):
+        html = path.read_text(encoding="utf-8")
+        stories = parse_stories(DOMAIN, html)
+        assert stories
+        assert stories == parse_stories_bs(DOMAIN, html)
+
+    def test_dedupes_by_href(self):
+        html = ('<a href="/news/uk-12345678">Video One</a><a href="/news/uk-12345678">One</a>'
+                '<a href="/news/uk-12345678">Two</a><a href="/news/uk-87654321">One</a>')
+        assert parse_stories(DOMAIN, html) == [(f"{DOMAIN}/news/uk-12345678", "One"),
+                                               (f"{DOMAIN}/news/uk-87654321", "One")]
+
+    def test_skips_anchor_without_href(self):
+        html = '<a name="top">Top</a><a href="/news/uk-12345678">Title</a>'
+        assert parse_stories(DOMAIN, html) == [(f"{DOMAIN}/news/uk-12345678", "Title")]
+
+    @pytest.mark.parametrize("name, expected", [
+        ("65", ("A", "")), ("x41", ("A", "")), ("128", ("\u20ac", "")), ("129", ("\x81", "")),
+        ("0", ("\ufffd", "")), ("x110000", ("\ufffd", "")), ("12x", ("\x0c", "x")),
+        ("abc", ("", "abc"))])
+    def test_dereference_charref(self, name, expected):
+        assert dereference_charref(name) == expected
@@ -0,0 +1,189 @@
+"""Tests for page_fetcher module"""
+
+# pylint: skip-file
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.error import HTTPError, URLError
+
+import pytest
+
+import news_scraper
+from page_fetcher import Page, PageFetcher
+
+PAGE = ('<html><body>' + '<a href="/news/uk-12345678">Fish &amp; chips</a>' * 200
+        + '</body></html>').encode()
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.path == "/moved":
+            return self.reply(301, b"", {"Location": "/news"})
+        if self.path == "/missing":
+            return self.reply(404, b"Not Found")
+        if self.path == "/broken":
+            return self.reply(500, b"Oops")
+
+        if server.etag and self.headers.get("If-None-Match") == server.etag:
+            return self.reply(304, b"")
+        if (server.last_modified
+                and self.headers.get("If-Modified-Since") == server.last_modified):
+            return self.reply(304, b"")
+
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        if server.etag:
+            headers["ETag"] = server.etag
+        if server.last_modified:
+            headers["Last-Modified"] = server.last_modified
+        body = server.body
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        self.reply(200, body, headers)
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.bytes_sent += len(body)
+        if self.server.hang_up:
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    httpd.body = PAGE
+    httpd.etag = '"v1"'
+    httpd.last_modified = None
+    httpd.requests = []
+    httpd.connections = 0
+    httpd.bytes_sent = 0
+    httpd.hang_up = False
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    fetcher = PageFetcher(cache_dir=str(tmp_path))
+    yield fetcher
+    fetcher.close()
+
+
+class TestFetch:
+    def test_gzip(self, server, fetcher):
+        page = fetcher.fetch(f"{server.url}/news", timeout=5)
+        assert page.text == PAGE.decode()
+        assert server.requests[0]["Accept-Encoding"] == "gzip"
+        assert page.bytes_received == server.bytes_sent < len(PAGE)
+        assert fetcher.stats()["bytes_decoded"] == len(PAGE)
+
+    def test_keep_alive(self, server, fetcher):
+        server.etag = None
+        for _ in range(3):
+            fetcher.fetch(f"{server.url}/news", timeout=5)
+        assert len(server.requests) == 3
+        assert server.connections == 1
+        assert fetcher.stats()["connections_opened"] == 1
+
+    def test_reconnects_after_server_closes(self, server, fetcher):
+        server.etag, server.hang_up = None, True
+        fetcher.fetch(f"{server.url}/news", timeout=5)
+        page = fetcher.fetch(f"{server.url}/news", timeout=5)
+        assert page.text == PAGE.decode()
+        assert server.connections == 2
+
+    def test_etag_revalidation(self, server, fetcher):
+        first = fetcher.fetch(f"{server.url}/news", timeout=5)
+        sent = server.bytes_sent
+        second = fetcher.fetch(f"{server.url}/news", timeout=5)
+        assert server.requests[1]["If-None-Match"] == '"v1"'
+        assert second.not_modified
+        assert second.text == first.text and second.digest == first.digest
+        assert server.bytes_sent == sent
+        assert fetcher.stats()["not_modified"] == 1
+
+    def test_changed_page(self, server, fetcher):
+        first = fetcher.fetch(f"{server.url}/news", timeout=5)
+        server.body, server.etag = b"<html>new</html>", '"v2"'
+        second = fetcher.fetch(f"{server.url}/news", timeout=5)
+        assert not second.not_modified
+        assert second.text == "<html>new</html>"
+        assert second.digest != first.digest
+
+    def test_last_modified_revalidation(self, server, fetcher):
+        server.etag, server.last_modified = None, "Mon, 01 Jan 2024 00:00:00 GMT"
+        fetcher.fetch(f"{server.url}/news", timeout=5)
+        page = fetcher.fetch(f"{server.url}/news", timeout=5)
+        assert server.requests[1]["If-Modified-Since"] == server.last_modified
+        assert page.not_modified
+
+    def test_cache_persists_on_disk(self, server, fetcher, tmp_path):
+        fetcher.fetch(f"{server.url}/news", timeout=5)
+        other = PageFetcher(cache_dir=str(tmp_path))
+        page = other.fetch(f"{server.url}/news", timeout=5)
+        other.close()
+        assert page.not_modified
+        assert page.text == PAGE.decode()
+
+    def test_missing_cached_body_refetches(self, server, fetcher, tmp_path):
+        fetcher.fetch(f"{server.url}/news", timeout=5)
+        for path in tmp_path.glob("*.html"):
+            path.unlink()
+        page = fetcher.fetch(f"{server.url}/news", timeout=5)
+        assert not page.not_modified
+        assert page.text == PAGE.decode()
+
+    def test_no_cache_dir(self, server):
+        fetcher = PageFetcher(cache_dir=None)
+        fetcher.fetch(f"{server.url}/news", timeout=5)
+        page = fetcher.fetch(f"{server.url}/news", timeout=5)
+        fetcher.close()
+        assert not page.not_modified
+        assert "If-None-Match" not in server.requests[1]
+
+    def test_redirect(self, server, fetcher):
+        page = fetcher.fetch(f"{server.url}/moved", timeout=5)
+        assert page.text == PAGE.decode()
+        assert server.connections == 1
+
+    @pytest.mark.parametrize("path,code", [("/missing", 404), ("/broken", 500)])
+    def test_http_errors(self, server, fetcher, path, code):
+        with pytest.raises(HTTPError) as err:
+            fetcher.fetch(f"{server.url}{path}", timeout=5)
+        assert err.value.code == code
+
+    def test_unreachable(self, fetcher):
+        with pytest.raises(URLError):
+            fetcher.fetch("http://127.0.0.1:1/news", timeout=5)
+
+
+class TestParsePage:
+    def test_memoized_by_digest(self):
+        page = Page("https://www.bbc.co.uk/news", PAGE.decode(), "digest")
+        with patch("news_scraper.parse_stories", return_value=[("url", "title")]) as mock:
+            assert news_scraper.parse_page("https://www.bbc.co.uk", page) == [("url", "title")]
+            assert news_scraper.parse_page("https://www.bbc.co.uk", page) == [("url", "title")]
+            page.digest = "changed"
+            news_scraper.parse_page("https://www.bbc.co.uk", page)
+        assert mock.call_count == 2
@@ -0,0 +1,91 @@
+"""Tests for query_registry module"""
+
+# pylint: skip-file
+from unittest.mock import MagicMock
+
+import pytest
+
+from metrics import QUERY_DURATION, QUERY_ERRORS, QUERY_ROWS
+from query_registry import QueryRegistry
+
+SLOTS = {"sort": {"title": "title", "score": "score"},
+         "order": {"asc": "ASC", "desc": "DESC"},
+         "keyset": {"first": "TRUE", "after": "({sort}, id) > ($2, $3)"}}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    (tmp_path / "get_story.sql").write_text("SELECT * FROM stories WHERE id = $1;\n")
+    (tmp_path / "list_stories.sql").write_text(
+        "SELECT * FROM stories WHERE title ILIKE '%' || $1 AND {keyset} ORDER BY {sort} {order}")
+    (tmp_path / "lock.sql").write_text("LOCK TABLE votes;\nSELECT 1;")
+    return QueryRegistry(tmp_path, SLOTS)
+
+
+def executed(cur):
+    return [call.args[0] for call in cur.execute.call_args_list]
+
+
+class TestExecute:
+    def test_prepares_once_per_connection(self, registry):
+        cur = MagicMock()
+        registry.execute(cur, "get_story", (1,))
+        registry.execute(cur, "get_story", (2,))
+        assert executed(cur) == ["PREPARE get_story AS SELECT * FROM stories WHERE id = $1",
+                                 "EXECUTE get_story (%s)", "EXECUTE get_story (%s)"]
+        assert cur.execute.call_args.args[1] == (2,)
+        assert registry.prepared(cur.connection) == {"get_story"}
+
+    def test_records_metrics(self, registry):
+        cur = MagicMock(rowcount=3)
+        calls = QUERY_DURATION.count("postgres", "get_story")
+        rows = QUERY_ROWS.value("postgres", "get_story")
+        registry.execute(cur, "get_story", (1,))
+        assert QUERY_DURATION.count("postgres", "get_story") == calls + 1
+        assert QUERY_ROWS.value("postgres", "get_story") == rows + 3
+
+    def test_records_errors(self, registry):
+        cur = MagicMock()
+        cur.execute.side_effect = RuntimeError("boom")
+        errors = QUERY_ERRORS.value("postgres", "get_story")
+        with pytest.raises(RuntimeError):
+            registry.execute(cur, "get_story", (1,))
+        assert QUERY_ERRORS.value("postgres", "get_story") == errors + 1
+
+    def test_new_connection_prepares_again(self, registry):
+        first, second = MagicMock(), MagicMock()
+        registry.execute(first, "get_story", (1,))
+        registry.execute(second, "get_story", (1,))
+        assert executed(second)[0].startswith("PREPARE get_story")
+
+    def test_slot_variants(self, registry):
+        cur = MagicMock()
+        registry.execute(cur, "list_stories", ("foo", "bar", 2),
+                         sort="title", order="desc", keyset="after")
+        registry.execute(cur, "list_stories", ("foo",), sort="score", order="asc", keyset="first")
+        prepare = executed(cur)[0]
+        assert prepare.startswith("PREPARE list_stories__after__desc__title AS")
+        assert "(title, id) > ($2, $3) ORDER BY title DESC" in prepare
+        assert "TRUE ORDER BY score ASC" in executed(cur)[2]
+        assert len(registry.prepared(cur.connection)) == 2
+
+    def test_rejects_unknown_choice(self, registry):
+        cur = MagicMock()
+        with pytest.raises(ValueError):
+            registry.execute(cur, "list_stories", ("foo",),
+                             sort="id; DROP TABLE stories", order="asc", keyset="first")
+        with pytest.raises(ValueError):
+            registry.execute(cur, "list_stories", ("foo",), sort="title")
+        assert not cur.execute.called
+
+    def test_multiple_statements_run_unprepared(self, registry):
+        cur = MagicMock()
+        registry.execute(cur, "lock")
+        assert executed(cur) == ["LOCK TABLE votes;\nSELECT 1"]
+
+    def test_inline_sql(self, registry):
+        cur = MagicMock()
+        registry.sql(cur, "list_stories", ("foo",), sort="title", order="asc", keyset="first")
+        text, params = cur.mogrify.call_args.args
+        assert "'%%' || %(p1)s" in text
+        assert params == {"p1": "foo"}
@@ -0,0 +1,183 @@
+"""Tests for response_cache module"""
+
+# pylint: skip-file
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+class TestGetOrCompute:
+    def test_hit_after_miss(self):
+        cache = ResponseCache()
+        compute = MagicMock(return_value=(b"[]", 200))
+        first = cache.get_or_compute("key", compute)
+        second = cache.get_or_compute("key", compute)
+        assert first is second
+        assert compute.call_count == 1
+        assert cache.stats()["hits"] == 1
+
+    def test_etag_follows_body(self):
+        cache = ResponseCache()
+        first = cache.get_or_compute("a", lambda: (b"[1]", 200))
+        second = cache.get_or_compute("b", lambda: (b"[1]", 200))
+        third = cache.get_or_compute("c", lambda: (b"[2]", 200))
+        assert first.etag == second.etag != third.etag
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(ttl=0)
+        compute = MagicMock(return_value=(b"[]", 200))
+        cache.get_or_compute("key", compute)
+        cache.get_or_compute("key", compute)
+        assert compute.call_count == 2
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        compute = MagicMock(return_value=(b"[]", 200))
+        cache.get_or_compute("a", compute)
+        cache.get_or_compute("b", compute)
+        cache.get_or_compute("a", compute)
+        cache.get_or_compute("c", compute)
+        cache.get_or_compute("a", compute)
+        assert compute.call_count == 3
+        cache.get_or_compute("b", compute)
+        assert compute.call_count == 4
+        assert cache.stats()["evictions"] == 2
+
+    def test_errors_not_cached(self):
+        cache = ResponseCache()
+        with pytest.raises(RuntimeError):
+            cache.get_or_compute("key", MagicMock(side_effect=RuntimeError))
+        assert cache.get_or_compute("key", lambda: (b"[]", 200)).body == b"[]"
+
+
+class TestInvalidate:
+    def test_invalidate(self):
+        cache = ResponseCache()
+        compute = MagicMock(return_value=(b"[]", 200))
+        cache.get_or_compute("key", compute)
+        cache.invalidate()
+        cache.get_or_compute("key", compute)
+        assert compute.call_count == 2
+
+    def test_result_computed_before_invalidation_not_stored(self):
+        cache = ResponseCache()
+
+        def compute():
+            cache.invalidate()
+            return b"old", 200
+
+        assert cache.get_or_compute("key", compute).body == b"old"
+        assert cache.get_or_compute("key", lambda: (b"new", 200)).body == b"new"
+
+
+class TestCoalescing:
+    def test_concurrent_misses_compute_once(self):
+        cache = ResponseCache()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(2)
+            return b"[]", 200
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("key", compute)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()["coalesced"] < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+        assert len(calls) == 1
+        assert len(results) == 5
+        assert all(result is results[0] for result in results)
+
+    def test_waiters_see_leader_error(self):
+        cache = ResponseCache()
+        release = threading.Event()
+
+        def compute():
+            release.wait(2)
+            raise RuntimeError("db down")
+
+        errors = []
+
+        def call():
+            try:
+                cache.get_or_compute("key", compute)
+            except RuntimeError as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()["coalesced"] < 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+        assert len(errors) == 3
+
+
+class TestGetOrComputeAsync:
+    def test_hit_after_miss(self):
+        cache = ResponseCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return b"[]", 200
+
+        async def run():
+            first = await cache.get_or_compute_async("key", compute)
+            second = await cache.get_or_compute_async("key", compute)
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first is second
+        assert len(calls) == 1
+
+    def test_concurrent_misses_coalesced(self):
+        cache = ResponseCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return b"[1]", 200
+
+        async def run():
+            return await asyncio.gather(*(cache.get_or_compute_async("key", compute)
+                                          for _ in range(5)))
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert cache.stats()["coalesced"] == 4
+
+    def test_waits_for_threaded_leader(self):
+        cache = ResponseCache()
+        release = threading.Event()
+        thread = threading.Thread(target=cache.get_or_compute,
+                                  args=("key", lambda: release.wait(2) and (b"[2]", 200)))
+        thread.start()
+        while cache.stats()["misses"] < 1:
+            time.sleep(0.01)
+
+        async def run():
+            waiter = asyncio.ensure_future(cache.get_or_compute_async("key", None))
+            await asyncio.sleep(0.02)
+            assert not waiter.done()
+            release.set()
+            return await asyncio.wait_for(waiter, 2)
+
+        assert asyncio.run(run()).body == b"[2]"
+        thread.join(2)
@@ -0,0 +1,95 @@
+"""Tests for scrape_jobs module"""
+
+# pylint: skip-file
+import threading
+import time
+
+import pytest
+
+from scrape_jobs import (remaining_time,
+                         ScrapeError,
+                         ScrapeJobQueue,
+                         ScrapeQueueFullError,
+                         ScrapeTimeoutError)
+
+
+def wait_for_state(queue, job_id, states=("succeeded", "failed", "timed_out")):
+    deadline = time.monotonic() + 2
+    while queue.get(job_id)["state"] not in states and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return queue.get(job_id)
+
+
+class TestRemainingTime:
+    def test_remaining_time(self):
+        assert 0 < remaining_time(time.monotonic() + 5) <= 5
+
+    def test_remaining_time_passed(self):
+        with pytest.raises(ScrapeTimeoutError):
+            remaining_time(time.monotonic() - 1)
+
+
+class TestScrapeJobQueue:
+    def test_successful_job(self):
+        queue = ScrapeJobQueue(lambda url, deadline: {"found": 3, "inserted": 2, "skipped": 1})
+        job = queue.submit("https://www.bbc.co.uk/news")
+        result = wait_for_state(queue, job.id)
+        assert result["state"] == "succeeded"
+        assert result["stories_found"] == 3
+        assert result["stories_inserted"] == 2
+        assert result["run_seconds"] is not None
+        assert result["error"] is None
+
+    def test_failed_job(self):
+        def run(url, deadline):
+            raise ScrapeError("API not connected to internet.")
+
+        queue = ScrapeJobQueue(run)
+        result = wait_for_state(queue, queue.submit("url").id)
+        assert result["state"] == "failed"
+        assert result["error"] == "API not connected to internet."
+
+    def test_timed_out_job(self):
+        def run(url, deadline):
+            time.sleep(0.02)
+            remaining_time(deadline)
+
+        queue = ScrapeJobQueue(run, timeout=0.01)
+        result = wait_for_state(queue, queue.submit("url").id)
+        assert result["state"] == "timed_out"
+
+    def test_concurrency_limit(self):
+        running = []
+        release = threading.Event()
+
+        def run(url, deadline):
+            running.append(url)
+            release.wait(2)
+            return {}
+
+        queue = ScrapeJobQueue(run, workers=2)
+        jobs = [queue.submit(str(i)) for i in range(3)]
+        wait_for_state(queue, jobs[1].id, ("running",))
+        time.sleep(0.02)
+        assert len(running) == 2
+        assert queue.get(jobs[2].id)["state"] == "queued"
+        release.set()
+        assert wait_for_state(queue, jobs[2].id)["state"] == "succeeded"
+
+    def test_queue_full(self):
+        release = threading.Event()
+        queue = ScrapeJobQueue(lambda url, deadline: release.wait(2) and {},
+                               workers=1, max_pending=1)
+        first = queue.submit("1")
+        wait_for_state(queue, first.id, ("running",))
+        queue.submit("2")
+        with pytest.raises(ScrapeQueueFullError):
+            queue.submit("3")
+        release.set()
+
+    def test_old_jobs_forgotten(self):
+        queue = ScrapeJobQueue(lambda url, deadline: {}, max_jobs=2)
+        jobs = [queue.submit(str(i)) for i in range(3)]
+        wait_for_state(queue, jobs[2].id)
+        assert queue.get(jobs[0].id) is None
+        assert queue.get("unknown") is None
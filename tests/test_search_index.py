@@ -0,0 +1,60 @@
+"""Tests for search_index module"""
+
+# pylint: skip-file
+from search_index import TitleIndex, title_ngrams
+
+STORIES = [{"id": 1, "title": "Aukus deal: Summit was projection of power"},
+           {"id": 2, "title": "eBird: A crowdsourced bird sighting database"},
+           {"id": 3, "title": "Budget: Pensions to get boost as tax-free limit to rise"}]
+
+
+def scan(stories, term):
+    return sorted(s["id"] for s in stories if term.lower() in s["title"].lower())
+
+
+class TestTitleNgrams:
+    def test_title_ngrams(self):
+        assert title_ngrams("abcd") == {"abc", "bcd"}
+
+    def test_title_ngrams_short(self):
+        assert title_ngrams("ab") == set()
+
+
+class TestSearch:
+    def test_matches_scan(self):
+        index = TitleIndex(STORIES)
+        for term in ["bird", "BUDGET", "deal: s", "to", "a", "", "zzz", "rise"]:
+            assert sorted(index.search(term)) == scan(STORIES, term)
+
+    def test_add(self):
+        index = TitleIndex(STORIES)
+        index.add(4, "Bird flu spreads")
+        assert sorted(index.search("bird")) == [2, 4]
+        assert len(index) == 4
+
+    def test_update(self):
+        index = TitleIndex(STORIES)
+        index.update(2, "Karen Gillan thriller")
+        assert index.search("bird") == []
+        assert index.search("gillan") == [2]
+
+    def test_update_back_to_old_title(self):
+        index = TitleIndex(STORIES)
+        index.update(2, "Something else")
+        index.update(2, STORIES[1]["title"])
+        assert index.search("bird") == [2]
+
+    def test_remove(self):
+        index = TitleIndex(STORIES)
+        index.remove(1)
+        index.remove(99)
+        assert index.search("aukus") == []
+        assert len(index) == 2
+
+    def test_rebuild_after_churn(self):
+        index = TitleIndex(STORIES)
+        for i in range(50):
+            index.update(1, f"title number {i}")
+        assert index.search("number 4") == [1]
+        assert index.search("number 49") == [1]
+        assert index._entries < 200
@@ -0,0 +1,124 @@
+"""Tests for slow_queries module"""
+
+# pylint: skip-file
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from query_registry import QueryRegistry
+from slow_queries import (CAPTURED, DISABLED, FAILED, QUEUE_FULL, RATE_LIMITED,
+                          SlowQueryLog, read_only)
+
+
+def fake_connection(plan=("Seq Scan on stories", "Execution Time: 1.0 ms"), error=None):
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchall.return_value = [(line,) for line in plan]
+    if error is not None:
+        cur.execute.side_effect = [None, error]
+
+    @contextmanager
+    def connection():
+        yield conn
+
+    return connection, conn, cur
+
+
+class TestRecord:
+    def test_ignores_fast_queries(self):
+        log = SlowQueryLog(threshold=0.1)
+        assert log.record("get_stories", "get_stories__asc", "SELECT 1", (), 0.05) is None
+        assert log.recent() == []
+
+    def test_ring_buffer(self):
+        log = SlowQueryLog(threshold=0.1, capacity=2)
+        for i in range(3):
+            log.record("get_stories", f"statement_{i}", "SELECT $1", (i,), 0.2)
+        recent = log.recent()
+        assert [entry["params"] for entry in recent] == [[2], [1]]
+        assert all(entry["explain"] == DISABLED for entry in recent)
+        assert log.stats()["recorded"] == 3
+        assert log.get(recent[0]["id"])["statement"] == "statement_2"
+
+    def test_params_are_serializable(self):
+        log = SlowQueryLog(threshold=0.0)
+        entry = log.record("insert_stories", "insert_stories", "SELECT $1", ([1, 2], object()), 0.1)
+        params = entry.to_dict()["params"]
+        assert params[0] == [1, 2]
+        assert isinstance(params[1], str)
+
+
+class TestExplain:
+    def test_captures_plan_and_rolls_back(self):
+        connection, conn, cur = fake_connection()
+        log = SlowQueryLog(threshold=0.0, connection=connection)
+        entry = log.record("get_story", "get_story", "SELECT * FROM stories WHERE id = $1", (7,), 0.5)
+        assert log.wait_idle()
+        captured = log.get(entry.id)
+        assert captured["explain"] == CAPTURED
+        assert captured["plan"] == "Seq Scan on stories\nExecution Time: 1.0 ms"
+        statement, params = cur.execute.call_args.args
+        assert statement == "EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM stories WHERE id = %(p1)s"
+        assert params == {"p1": 7}
+        assert conn.rollback.called
+
+    def test_writes_are_planned_not_run(self):
+        connection, conn, cur = fake_connection()
+        log = SlowQueryLog(threshold=0.0, connection=connection)
+        log.record("apply_votes", "apply_votes",
+                   "WITH new_votes AS (INSERT INTO votes (story_id) VALUES ($1) RETURNING id) "
+                   "SELECT id FROM new_votes", (7,), 0.5)
+        assert log.wait_idle()
+        statement, params = cur.execute.call_args.args
+        assert statement.startswith("EXPLAIN WITH new_votes AS (INSERT")
+        assert "ANALYZE" not in statement
+
+    def test_read_only(self):
+        assert read_only("SELECT * FROM stories WHERE updated_at > $1")
+        assert read_only("WITH s AS (SELECT id FROM stories) SELECT id FROM s")
+        assert not read_only("UPDATE stories SET score = 0")
+        assert not read_only("WITH d AS (DELETE FROM votes RETURNING id) SELECT id FROM d")
+        assert not read_only("SELECT id FROM stories ORDER BY id FOR NO KEY UPDATE")
+        assert not read_only("SELECT id FROM stories FOR SHARE")
+
+    def test_rate_limited_per_statement(self):
+        connection, conn, cur = fake_connection()
+        log = SlowQueryLog(threshold=0.0, connection=connection, explain_interval=60)
+        first = log.record("get_story", "get_story", "SELECT $1", (1,), 0.5)
+        second = log.record("get_story", "get_story", "SELECT $1", (2,), 0.5)
+        other = log.record("get_stories", "get_stories__asc", "SELECT $1", (3,), 0.5)
+        assert log.wait_idle()
+        assert second.explain == RATE_LIMITED
+        assert first.explain == other.explain == CAPTURED
+        assert log.stats()["explained"] == 2
+
+    def test_queue_full(self):
+        connection, conn, cur = fake_connection()
+        log = SlowQueryLog(threshold=0.0, connection=connection, max_pending=1)
+        with patch.object(log, "_thread", MagicMock()):
+            log.record("a", "a", "SELECT 1", (), 0.5)
+            entry = log.record("b", "b", "SELECT 1", (), 0.5)
+        assert entry.explain == QUEUE_FULL
+
+    def test_failure(self):
+        connection, conn, cur = fake_connection(error=RuntimeError("canceling statement"))
+        log = SlowQueryLog(threshold=0.0, connection=connection)
+        entry = log.record("get_story", "get_story", "SELECT $1", (1,), 0.5)
+        assert log.wait_idle()
+        assert entry.explain == FAILED
+        assert entry.error == "canceling statement"
+        assert conn.rollback.called
+
+
+class TestRegistryHook:
+    def test_registry_records_slow_statements(self, tmp_path):
+        (tmp_path / "get_story.sql").write_text("SELECT * FROM stories WHERE id = $1;\n")
+        (tmp_path / "lock.sql").write_text("LOCK TABLE votes;\nSELECT 1;")
+        registry = QueryRegistry(tmp_path)
+        registry.slow_log = SlowQueryLog(threshold=0.0)
+        registry.execute(MagicMock(), "get_story", (5,))
+        registry.execute(MagicMock(), "lock")
+        entry, = registry.slow_log.recent()
+        assert entry["query"] == "get_story"
+        assert entry["params"] == [5]
@@ -7,11 +7,29 @@ import os
 import sys
 from unittest.mock import MagicMock
 
-from sql_methods import (delete_story,
+import pytest
+
+from psycopg2.errors import DeadlockDetected, ForeignKeyViolation, UniqueViolation
+
+from sql_methods import (add_months,
+                         apply_votes,
+                         compact_votes,
+                         delete_story,
+                         decode_cursor,
+                         encode_cursor,
+                         ensure_vote_partitions,
+                         get_stories_by_id,
                          get_stories_data,
+                         get_stories_page,
+                         hot_score,
+                         insert_stories,
                          insert_story,
+                         insert_votes,
+                         normalize_url,
                          patch_story,
-                         update_score)
+                         reconcile_scores,
+                         update_score,
+                         vote_partitions)
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
@@ -88,6 +106,12 @@ class TestGetStoriesData:
         assert res["message"] == "No stories were found"
         assert mock_fetch.called
 
+    def test_get_stories_data_invalid_sort(self):
+        conn = MagicMock()
+        res = get_stories_data(conn, "", "id; DROP TABLE stories", False)
+        assert res["message"] == "Invalid sort"
+        assert not conn.cursor().execute.called
+
     def test_get_stories_bad_args(self):
         conn = MagicMock()
         res = get_stories_data(conn, 1, 1, "foo")
@@ -95,16 +119,87 @@ class TestGetStoriesData:
         assert res["message"] == "Invalid argument type(s)"
 
 
+class TestGetStoriesPage:
+    def make_rows(self, count):
+        return [{"id": i, "title": f"story {i}", "url": "foo",
+                 "created_at": datetime.datetime(2024, 2, 20, 15, 16, i),
+                 "updated_at": datetime.datetime(2024, 2, 20, 15, 16, i),
+                 "score": i} for i in range(count)]
+
+    def test_get_stories_page_next_cursor(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = self.make_rows(3)
+        res = get_stories_page(conn, "", "created_at", False, 2)
+        assert len(res["stories"]) == 2
+        assert decode_cursor(res["next_cursor"], "created_at", False) == \
+            (datetime.datetime(2024, 2, 20, 15, 16, 1), 1)
+
+    def test_get_stories_page_last_page(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = self.make_rows(2)
+        cursor = encode_cursor("score", True, {"id": 5, "score": 5})
+        res = get_stories_page(conn, "", "score", True, 2, cursor)
+        assert len(res["stories"]) == 2
+        assert res["next_cursor"] is None
+
+    def test_get_stories_page_empty_later_page(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = []
+        cursor = encode_cursor("title", False, {"id": 5, "title": "foo"})
+        res = get_stories_page(conn, "", "title", False, 2, cursor)
+        assert res == {"stories": [], "next_cursor": None}
+
+    def test_get_stories_page_errors(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = []
+        assert get_stories_page(conn, "", "title", False, 2)["message"] == "No stories were found"
+        assert get_stories_page(conn, "", "url", False, 2)["message"] == "Invalid sort"
+        assert "Limit" in get_stories_page(conn, "", "title", False, 0)["message"]
+        assert get_stories_page(conn, "", "title", False, 2, "foo")["message"] == "Invalid cursor"
+
+    def test_cursor_for_other_ordering_rejected(self):
+        cursor = encode_cursor("score", True, {"id": 5, "score": 5})
+        assert decode_cursor(cursor, "score", True) == (5, 5)
+        assert decode_cursor(cursor, "score", False) is None
+        assert decode_cursor(cursor, "title", True) is None
+
+    def test_hot_cursor(self):
+        cursor = encode_cursor("hot_score", True, {"id": 5, "hot_score": 37801.123456789})
+        assert decode_cursor(cursor, "hot_score", True) == (37801.123456789, 5)
+        cursor = encode_cursor("hot_score", True, {"id": 5, "hot_score": "37801"})
+        assert decode_cursor(cursor, "hot_score", True) is None
+
+
+class TestHotScore:
+    def test_votes_and_age(self):
+        posted = datetime.datetime(2024, 1, 1)
+        base = hot_score(0, posted)
+        assert base == posted.replace(tzinfo=datetime.timezone.utc).timestamp() / 45000
+        assert hot_score(1, posted) == base
+        assert hot_score(10, posted) == base + 1
+        assert hot_score(-100, posted) == base - 2
+        assert hot_score(10, posted) == hot_score(0, posted + datetime.timedelta(seconds=45000))
+
+
 class TestInsertStory:
     def test_insert_story(self):
         conn = MagicMock()
         mock_fetch = conn.cursor().fetchall
-        mock_fetch.return_value = [1]
+        mock_fetch.return_value = [{"id": 1, "created": True}]
 
         res = insert_story(conn, "foo", "bar")
         res["message"] == "Update score successful."
+        assert res["id"] == 1
         assert mock_fetch.called
 
+    def test_insert_story_duplicate(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = [{"id": 5, "created": False}]
+
+        res = insert_story(conn, "foo", "bar")
+        assert res["error"] and res["duplicate"]
+        assert res["id"] == 5
+
     def test_insert_story_fail(self):
         conn = MagicMock()
         mock_fetch = conn.cursor().fetchall
@@ -126,27 +221,28 @@ class TestUpdateScore:
     def test_update_score(self):
         conn = MagicMock()
         mock_fetch = conn.cursor().fetchall
-        mock_fetch.return_value = [1]
+        mock_fetch.return_value = [{"found": True, "vote_id": 1}]
 
         res = update_score(conn, 1, "u")
-        res["message"] == "Update score successful."
-        assert mock_fetch.called
+        assert res["message"] == "Update score successful."
+        assert conn.cursor().execute.call_args.args[0].startswith("EXECUTE update_score")
 
-    def test_update_score_fail_first_query(self):
+    def test_update_score_incorrect_id(self):
         conn = MagicMock()
         mock_fetch = conn.cursor().fetchall
-        mock_fetch.side_effect = [[], [1]]
+        mock_fetch.return_value = [{"found": False, "vote_id": None}]
 
         res = update_score(conn, -1, "u")
         assert res["error"]
         assert res["message"] == "Incorrect ID."
+        assert mock_fetch.call_count == 1
 
-    def test_update_score_fail_second_query(self):
+    def test_update_score_fail(self):
         conn = MagicMock()
         mock_fetch = conn.cursor().fetchall
-        mock_fetch.side_effect = [[1], []]
+        mock_fetch.return_value = [{"found": True, "vote_id": None}]
 
-        res = update_score(conn, -1, "u")
+        res = update_score(conn, 1, "u")
         assert res["error"]
         assert res["message"] == "Update score failed."
         assert mock_fetch.called
@@ -158,6 +254,199 @@ class TestUpdateScore:
         assert res["message"] == "Invalid argument type(s)"
 
 
+class TestApplyVotes:
+    def test_apply_votes(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = [{"position": 1, "story_id": 1, "found": True},
+                                               {"position": 2, "story_id": 99, "found": False}]
+
+        res = apply_votes(conn, [(1, "u"), (99, "d")])
+        assert res == {"success": True, "found": [True, False]}
+        assert conn.cursor().execute.call_args.args[1] == ([1, 99], ["u", "d"])
+        assert conn.commit.called
+
+    def test_apply_votes_story_deleted(self):
+        conn = MagicMock()
+        conn.cursor().execute.side_effect = ForeignKeyViolation
+
+        res = apply_votes(conn, [(1, "u")])
+        assert res["error"]
+        assert conn.rollback.called
+
+    def test_apply_votes_deadlock(self):
+        conn = MagicMock()
+        conn.cursor().execute.side_effect = DeadlockDetected
+
+        res = apply_votes(conn, [(2, "u"), (1, "u")])
+        assert res["error"]
+        assert res["message"] == "Votes conflicted with another batch, try again."
+        assert conn.rollback.called
+        assert not conn.commit.called
+
+    def test_apply_votes_empty(self):
+        conn = MagicMock()
+        assert apply_votes(conn, []) == {"success": True, "found": []}
+        assert not conn.cursor().execute.called
+
+    def test_apply_votes_bad_args(self):
+        conn = MagicMock()
+        assert apply_votes(conn, [(1, 2)])["message"] == "Invalid argument type(s)"
+
+
+class TestInsertStories:
+    def test_insert_stories(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = [{"id": 10}]
+
+        res = insert_stories(conn, [("https://bbc.co.uk/news/1", "foo"),
+                                    ("https://bbc.co.uk/news/1/", "foo"),
+                                    ("https://bbc.co.uk/news/2", "bar")])
+        assert res == {"success": True, "inserted": 1, "skipped": 2, "ids": [10]}
+        statement, params = conn.cursor().execute.call_args.args
+        assert statement.startswith("EXECUTE insert_stories")
+        assert params == (["https://bbc.co.uk/news/1", "https://bbc.co.uk/news/2"], ["foo", "bar"])
+        assert conn.commit.called
+
+    def test_insert_stories_empty(self):
+        conn = MagicMock()
+        assert insert_stories(conn, [])["inserted"] == 0
+        assert not conn.cursor().execute.called
+
+    def test_insert_stories_bad_args(self):
+        conn = MagicMock()
+        res = insert_stories(conn, [("foo", 1)])
+        assert res["message"] == "Invalid argument type(s)"
+
+    def test_get_stories_by_id(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = [{"id": 2}]
+        assert get_stories_by_id(conn, [2, 9]) == [{"id": 2}]
+        statement, params = conn.cursor().execute.call_args.args
+        assert statement.startswith("EXECUTE get_stories_by_id")
+        assert params == ([2, 9],)
+
+    def test_get_stories_by_id_empty(self):
+        conn = MagicMock()
+        assert get_stories_by_id(conn, []) == []
+        assert not conn.cursor().execute.called
+        assert get_stories_by_id(conn, ["1"])["error"]
+
+    def test_normalize_url(self):
+        assert normalize_url("HTTPS://www.BBC.co.uk/news/12345678/#comments") == \
+            "https://www.bbc.co.uk/news/12345678"
+
+
+class TestInsertVotes:
+    def test_insert_votes(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = [{"id": 1, "votes": 2}]
+
+        res = insert_votes(conn, [(1, "u"), (1, "d"), (99, "u")])
+        assert res == {"success": True, "inserted": 2, "skipped": 1}
+        assert conn.commit.called
+
+    def test_insert_votes_deadlock(self):
+        conn = MagicMock()
+        conn.cursor().execute.side_effect = DeadlockDetected
+
+        res = insert_votes(conn, [(2, "u"), (1, "u")])
+        assert res["error"]
+        assert conn.rollback.called
+        assert not conn.commit.called
+
+    def test_insert_votes_empty(self):
+        conn = MagicMock()
+        assert insert_votes(conn, [])["inserted"] == 0
+        assert not conn.cursor().execute.called
+
+    def test_insert_votes_bad_args(self):
+        conn = MagicMock()
+        res = insert_votes(conn, [("1", "u")])
+        assert res["message"] == "Invalid argument type(s)"
+
+
+class TestReconcileScores:
+    def test_reconcile_scores(self):
+        conn = MagicMock()
+        mock_fetch = conn.cursor().fetchall
+        mock_fetch.return_value = [{"id": 1, "stored_score": 2, "actual_score": 3}]
+
+        res = reconcile_scores(conn)
+        assert res[0]["actual_score"] == 3
+        assert conn.commit.called
+
+    def test_reconcile_scores_dry_run(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = []
+
+        assert reconcile_scores(conn, fix=False) == []
+        assert conn.rollback.called
+        assert not conn.commit.called
+
+
+class TestVotePartitions:
+    def test_add_months(self):
+        month = datetime.datetime(2026, 11, 1)
+        assert add_months(month, 2) == datetime.datetime(2027, 1, 1)
+        assert add_months(month, -11) == datetime.datetime(2025, 12, 1)
+
+    def test_vote_partitions_skips_default(self):
+        conn = MagicMock()
+        conn.cursor().fetchall.return_value = [{"name": "votes_2026_09"},
+                                               {"name": "votes_default"}]
+        assert vote_partitions(conn) == {"votes_2026_09": datetime.datetime(2026, 9, 1)}
+
+    def test_ensure_creates_missing_months(self):
+        conn = MagicMock()
+        cur = conn.cursor()
+        cur.fetchall.side_effect = [[{"month": datetime.datetime(2025, 3, 1)}],
+                                    [{"name": "votes_2026_10"}, {"name": "votes_default"}]]
+
+        created = ensure_vote_partitions(conn, datetime.datetime(2026, 10, 18), ahead=1)
+        assert created == ["votes_2025_03", "votes_2026_11"]
+        statement, params = cur.execute.call_args.args
+        assert "CREATE TABLE votes_2026_11\nPARTITION OF votes" in statement
+        assert params == {"p1": datetime.datetime(2026, 11, 1),
+                          "p2": datetime.datetime(2026, 12, 1)}
+
+    def test_compact_votes_closed_months_only(self):
+        conn = MagicMock()
+        cur = conn.cursor()
+        cur.fetchall.side_effect = [[{"name": "votes_2026_09"}, {"name": "votes_2026_08"}], []]
+        cur.fetchone.return_value = {"votes": 40, "rollups": 3}
+
+        compacted = compact_votes(conn, datetime.datetime(2026, 9, 1))
+        assert compacted == [{"partition": "votes_2026_08", "votes": 40, "rollups": 3}]
+        roll_up, drop = [call.args[0] for call in cur.execute.call_args_list[-2:]]
+        assert "LOCK TABLE votes_2026_08 IN SHARE MODE" in roll_up
+        assert "LOCK TABLE votes " not in roll_up
+        assert "DETACH PARTITION votes_2026_08" in drop
+        assert "DROP TABLE votes_2026_08" in drop
+        assert conn.commit.called
+
+    def test_compact_votes_only_drops_rolled_up_month(self):
+        conn = MagicMock()
+        cur = conn.cursor()
+        cur.fetchall.side_effect = [[{"name": "votes_2026_08"}],
+                                    [{"month": datetime.datetime(2026, 8, 1)}]]
+        cur.fetchone.return_value = {"votes": 40, "rollups": 3}
+
+        compact_votes(conn, datetime.datetime(2026, 9, 1))
+        statements = [call.args[0] for call in cur.execute.call_args_list]
+        assert not any("INSERT INTO vote_rollups" in statement for statement in statements)
+        assert "DETACH PARTITION votes_2026_08" in statements[-1]
+
+    def test_compact_votes_rolls_back_on_error(self):
+        conn = MagicMock()
+        cur = conn.cursor()
+        cur.fetchall.side_effect = [[{"name": "votes_2026_08"}], []]
+        cur.execute.side_effect = [None, None, None, None, RuntimeError("lock timeout")]
+
+        with pytest.raises(RuntimeError):
+            compact_votes(conn, datetime.datetime(2026, 10, 1))
+        assert conn.rollback.called
+
+
 class TestPatchStory:
     def test_patch_story(self):
         conn = MagicMock()
@@ -178,6 +467,14 @@ class TestPatchStory:
         assert res["error"]
         assert mock_fetch.called
 
+    def test_patch_story_duplicate_url(self):
+        conn = MagicMock()
+        conn.cursor().execute.side_effect = UniqueViolation
+
+        res = patch_story(conn, 1, "foo", "bar")
+        assert res["message"] == "A story with that URL already exists."
+        assert conn.rollback.called
+
     def test_patch_story_bad_args(self):
         conn = MagicMock()
         res = patch_story(conn, "a", 1, 1)
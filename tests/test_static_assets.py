@@ -0,0 +1,67 @@
+"""Tests for static_assets module"""
+
+# pylint: skip-file
+import gzip
+
+import pytest
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from static_assets import IDENTITY, StaticAssets, choose_encoding, encodings
+
+
+@pytest.fixture
+def assets(tmp_path):
+    (tmp_path / "app.css").write_text("body { color: red; }\n" * 50)
+    (tmp_path / "tiny.js").write_text("x()")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "index.html").write_text(
+        '<link href="../static/app.css"><script src="/static/tiny.js"></script>'
+        '<img src="../static/missing.png">')
+    return StaticAssets(str(tmp_path))
+
+
+def accept(header: str) -> Accept:
+    return parse_accept_header(header, Accept)
+
+
+class TestStaticAssets:
+    def test_fingerprinted_urls(self, assets):
+        url = assets.url_for("app.css")
+        assert url.startswith("/assets/app.") and url.endswith(".css")
+        asset = assets.asset(url.removeprefix("/assets/"))
+        assert asset.mimetype == "text/css"
+        assert assets.asset("app.css") is None
+
+    def test_fingerprint_follows_contents(self, tmp_path, assets):
+        before = assets.url_for("app.css")
+        (tmp_path / "app.css").write_text("body { color: blue; }\n" * 50)
+        assert StaticAssets(str(tmp_path)).url_for("app.css") != before
+
+    def test_pages_link_to_fingerprints(self, assets):
+        page = assets.page("sub/index.html")
+        html = page.bodies[IDENTITY].decode()
+        assert f'href="{assets.url_for("app.css")}"' in html
+        assert f'src="{assets.url_for("tiny.js")}"' in html
+        assert 'src="../static/missing.png"' in html
+
+    def test_precompressed(self, assets):
+        asset = assets.asset(assets.url_for("app.css").removeprefix("/assets/"))
+        assert set(asset.bodies) == {IDENTITY, *encodings()}
+        assert gzip.decompress(asset.bodies["gzip"]) == asset.bodies[IDENTITY]
+
+    def test_small_files_not_compressed(self, assets):
+        asset = assets.asset(assets.url_for("tiny.js").removeprefix("/assets/"))
+        assert set(asset.bodies) == {IDENTITY}
+
+
+class TestChooseEncoding:
+    def test_gzip(self):
+        assert choose_encoding(accept("gzip, deflate"), {IDENTITY: b"", "gzip": b""}) == "gzip"
+
+    def test_not_accepted(self):
+        assert choose_encoding(accept(""), {IDENTITY: b"", "gzip": b""}) == IDENTITY
+        assert choose_encoding(accept("gzip;q=0"), {IDENTITY: b"", "gzip": b""}) == IDENTITY
+
+    def test_not_available(self):
+        assert choose_encoding(accept("gzip"), {IDENTITY: b""}) == IDENTITY
@@ -0,0 +1,445 @@
+"""Conformance tests run against every storage backend."""
+
+# pylint: skip-file
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+from os import environ
+from pathlib import Path
+
+import psycopg2
+import pytest
+
+from connection_pool import ConnectionPool
+from file_store import FileStore
+from sql_methods import (QUERIES,
+                         apply_votes,
+                         compact_votes,
+                         delete_story,
+                         ensure_vote_partitions,
+                         reconcile_scores)
+from sql_methods import hot_score
+from storage import FileStorage, PostgresStorage, SQLiteStorage
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+QUERY_DIRECTORY = Path(__file__).parent.parent / "queries"
+SCHEMA = f"storage_conformance_{os.getpid()}"
+
+
+def database_config():
+    try:
+        return {"user": environ["DATABASE_USERNAME"],
+                "password": environ["DATABASE_PASSWORD"],
+                "host": environ["DATABASE_IP"],
+                "port": environ["DATABASE_PORT"],
+                "database": environ["DATABASE_NAME"]}
+    except KeyError:
+        return None
+
+
+@pytest.fixture
+def postgres_storage():
+    """A PostgresStorage on the migrated schema, built in a throwaway Postgres schema."""
+    config = database_config()
+    if config is None:
+        pytest.skip("No database configured.")
+    try:
+        admin = psycopg2.connect(**config)
+    except psycopg2.OperationalError:
+        pytest.skip("Database unreachable.")
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"SET search_path TO {SCHEMA}")
+        scripts = [QUERY_DIRECTORY / "tables.sql", QUERY_DIRECTORY / "create_votes_table.sql",
+                   *sorted((QUERY_DIRECTORY / "migrations").glob("*.sql"))]
+        for script in scripts:
+            try:
+                cur.execute(script.read_text(encoding="utf-8"))
+            except psycopg2.Error:
+                # Optional extensions such as pg_trgm may not be installed.
+                cur.execute("ROLLBACK")
+    pool = ConnectionPool({**config, "options": f"-c search_path={SCHEMA}"}, min_size=0)
+    try:
+        yield PostgresStorage(pool)
+    finally:
+        pool.close()
+        with admin.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        admin.close()
+
+
+@pytest.fixture(params=["file", "sqlite", "postgres"])
+def storage(request, tmp_path):
+    if request.param == "file":
+        backend = FileStorage(FileStore(str(tmp_path / "stories.json")))
+    elif request.param == "sqlite":
+        backend = SQLiteStorage(str(tmp_path / "stories.db"))
+    else:
+        backend = request.getfixturevalue("postgres_storage")
+    yield backend
+    if request.param != "postgres":
+        backend.close()
+
+
+def add_stories(storage, *titles):
+    """Inserts one story per title and returns their ids in the same order."""
+    for i, title in enumerate(titles):
+        assert storage.insert_story(f"https://example.com/{i}", title)["success"]
+    ids = {row["title"]: row["id"] for row in storage.list_stories("", "", False)}
+    return [ids[title] for title in titles]
+
+
+def scores(storage):
+    return {row["title"]: row["score"] for row in storage.list_stories("", "", False)}
+
+
+class TestListing:
+    def test_empty(self, storage):
+        assert storage.list_stories("", "", False)["message"] == "No stories were found"
+        assert storage.list_stories_page("", "", False, 10)["message"] == "No stories were found"
+
+    def test_rows(self, storage):
+        add_stories(storage, "Apple")
+        row, = storage.list_stories("", "", False)
+        assert set(row) == {"id", "title", "url", "created_at", "updated_at", "score",
+                            "hot_score"}
+        assert row["url"] == "https://example.com/0"
+        assert row["score"] == 0
+        assert row["hot_score"] == pytest.approx(hot_score(0, row["created_at"]))
+        assert isinstance(row["created_at"], datetime.datetime)
+        assert isinstance(row["updated_at"], datetime.datetime)
+
+    def test_search_is_case_insensitive_substring(self, storage):
+        add_stories(storage, "Apple pie", "Banana split", "Pineapple")
+        titles = [row["title"] for row in storage.list_stories("APPLE", "title", False)]
+        assert titles == ["Apple pie", "Pineapple"]
+        assert storage.list_stories("kiwi", "", False)["message"] == "No stories were found"
+
+    def test_sort_and_order(self, storage):
+        add_stories(storage, "Cherry", "Apple", "Banana")
+        assert [row["title"] for row in storage.list_stories("", "title", False)] == \
+            ["Apple", "Banana", "Cherry"]
+        assert [row["title"] for row in storage.list_stories("", "title", True)] == \
+            ["Cherry", "Banana", "Apple"]
+        assert [row["title"] for row in storage.list_stories("", "created_at", False)] == \
+            ["Cherry", "Apple", "Banana"]
+
+    def test_ties_break_on_id(self, storage):
+        ids = add_stories(storage, "Apple", "Banana", "Cherry")
+        assert [row["id"] for row in storage.list_stories("", "score", False)] == ids
+        assert [row["id"] for row in storage.list_stories("", "score", True)] == ids[::-1]
+
+    def test_hot_follows_votes(self, storage):
+        up, plain, down = add_stories(storage, "Up", "Plain", "Down")
+        storage.apply_votes([(up, "u")] * 10 + [(down, "d")] * 10)
+        rows = storage.list_stories("", "hot_score", True)
+        assert [row["title"] for row in rows] == ["Up", "Plain", "Down"]
+        assert rows[0]["hot_score"] == pytest.approx(hot_score(10, rows[0]["created_at"]))
+
+    def test_columns_match_rows(self, storage):
+        ids = add_stories(storage, "Cherry", "Apple pie", "Banana")
+        storage.vote(ids[2], "u")
+        rows = storage.list_stories("", "score", True)
+        res = storage.list_story_columns("", "score", True)
+        assert res["columns"] == ["id", "title", "url", "created_at", "updated_at", "score",
+                                  "hot_score"]
+        assert [row[0] for row in res["rows"]] == [row["id"] for row in rows]
+        assert res["rows"][0][3] == pytest.approx(
+            rows[0]["created_at"].replace(tzinfo=datetime.timezone.utc).timestamp())
+        assert [row[1] for row in storage.list_story_columns("PIE", "", False)["rows"]] == \
+            ["Apple pie"]
+        assert storage.list_story_columns("kiwi", "", False)["message"] == \
+            "No stories were found"
+        assert storage.list_story_columns("", "url", False)["message"] == "Invalid sort"
+
+    def test_get_stories_by_id(self, storage):
+        banana = storage.insert_story("https://example.com/b", "Banana")["id"]
+        apple = storage.insert_story("https://example.com/a", "Apple")["id"]
+        storage.vote(apple, "u")
+        rows = storage.get_stories([apple, banana + apple + 100, banana])
+        assert [(row["title"], row["score"]) for row in rows] == [("Banana", 0), ("Apple", 1)]
+        assert set(rows[0]) == set(storage.list_stories("", "", False)[0])
+        assert storage.get_stories([]) == []
+        assert storage.get_stories(["1"])["message"] == "Invalid argument type(s)"
+
+    def test_invalid_arguments(self, storage):
+        add_stories(storage, "Apple")
+        assert storage.list_stories("", "url", False)["message"] == "Invalid sort"
+        assert storage.list_stories(1, "", False)["message"] == "Invalid argument type(s)"
+        assert storage.list_stories_page("", "title", False, 0)["error"]
+        assert storage.list_stories_page("", "title", False, 10, "nope")["message"] == \
+            "Invalid cursor"
+
+
+class TestPagination:
+    @pytest.mark.parametrize("sort", ["title", "created_at", "updated_at", "score", "hot_score"])
+    @pytest.mark.parametrize("order", [False, True])
+    def test_pages_match_full_listing(self, storage, sort, order):
+        ids = add_stories(storage, *[f"Story {letter}" for letter in "GBEADFC"])
+        storage.apply_votes([(ids[0], "u"), (ids[3], "u"), (ids[5], "d")])
+        expected = [row["id"] for row in storage.list_stories("", sort, order)]
+
+        seen, cursor = [], None
+        while True:
+            page = storage.list_stories_page("", sort, order, 3, cursor)
+            seen += [row["id"] for row in page["stories"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == expected
+
+    def test_cursor_past_the_end(self, storage):
+        add_stories(storage, "Apple", "Banana")
+        page = storage.list_stories_page("", "title", False, 1)
+        last = storage.list_stories_page("", "title", False, 1, page["next_cursor"])
+        assert last["next_cursor"] is None
+        assert [row["title"] for row in last["stories"]] == ["Banana"]
+
+
+class TestWrites:
+    def test_duplicate_urls_are_rejected(self, storage):
+        apple = storage.insert_story("https://example.com/a", "Apple")["id"]
+        res = storage.insert_story("https://EXAMPLE.com/a/#top", "Again")
+        assert res["error"] and res["duplicate"] and res["id"] == apple
+        res = storage.insert_stories([("https://example.com/b", "Banana"),
+                                      ("https://example.com/b/", "Banana again"),
+                                      ("https://example.com/a", "Apple again"),
+                                      ("https://example.com/c", "Cherry")])
+        assert res["success"] and res["inserted"] == 2 and res["skipped"] == 2
+        assert [row["title"] for row in storage.get_stories(res["ids"])] == ["Banana", "Cherry"]
+        assert sorted(scores(storage)) == ["Apple", "Banana", "Cherry"]
+
+    def test_empty_batch(self, storage):
+        assert storage.insert_stories([]) == {"success": True, "inserted": 0, "skipped": 0,
+                                              "ids": []}
+
+    def test_vote(self, storage):
+        apple, = add_stories(storage, "Apple")
+        assert storage.vote(apple, "u")["success"]
+        assert storage.vote(apple, "u")["success"]
+        assert storage.vote(apple, "d")["success"]
+        assert storage.vote(apple + 100, "u")["message"] == "Incorrect ID."
+        assert scores(storage) == {"Apple": 1}
+
+    def test_apply_votes(self, storage):
+        apple, banana = add_stories(storage, "Apple", "Banana")
+        res = storage.apply_votes([(apple, "u"), (banana + 100, "u"), (banana, "d"),
+                                   (apple, "u")])
+        assert res == {"success": True, "found": [True, False, True, True]}
+        assert scores(storage) == {"Apple": 2, "Banana": -1}
+        assert storage.apply_votes([]) == {"success": True, "found": []}
+
+    def test_insert_votes(self, storage):
+        apple, = add_stories(storage, "Apple")
+        res = storage.insert_votes([(apple, "u"), (apple + 100, "d"), (apple, "u")])
+        assert res == {"success": True, "inserted": 2, "skipped": 1}
+        assert scores(storage) == {"Apple": 2}
+
+    def test_patch(self, storage):
+        apple, banana = add_stories(storage, "Apple", "Banana")
+        assert storage.patch_story(apple, "", "Apricot")["success"]
+        assert storage.patch_story(banana, "https://example.com/new", "")["success"]
+        rows = {row["id"]: row for row in storage.list_stories("", "", False)}
+        assert (rows[apple]["title"], rows[apple]["url"]) == ("Apricot", "https://example.com/0")
+        assert (rows[banana]["title"], rows[banana]["url"]) == ("Banana", "https://example.com/new")
+        assert rows[apple]["updated_at"] >= rows[apple]["created_at"]
+
+    def test_patch_to_taken_url(self, storage):
+        apple, banana = add_stories(storage, "Apple", "Banana")
+        assert storage.patch_story(banana, "https://example.com/0/", "")["message"] == \
+            "A story with that URL already exists."
+        assert storage.patch_story(apple, "https://example.com/0#again", "")["success"]
+        assert storage.insert_story("https://example.com/1", "Banana again")["error"]
+
+    def test_patch_missing(self, storage):
+        assert storage.patch_story(1, "https://example.com/x", "X")["message"] == \
+            "Update story failed."
+
+    def test_delete(self, storage):
+        apple, banana = add_stories(storage, "Apple", "Banana")
+        storage.vote(apple, "u")
+        assert storage.delete_story(apple)["success"]
+        assert storage.delete_story(apple)["message"] == "Update story failed."
+        assert storage.vote(apple, "u")["message"] == "Incorrect ID."
+        assert scores(storage) == {"Banana": 0}
+        assert storage.insert_story("https://example.com/0", "Apple again")["success"]
+
+    def test_invalid_types(self, storage):
+        invalid = {"error": True, "message": "Invalid argument type(s)"}
+        assert storage.insert_story(1, "Apple") == invalid
+        assert storage.insert_stories([("https://example.com", 1)]) == invalid
+        assert storage.vote("1", "u") == invalid
+        assert storage.apply_votes([(1,)]) == invalid
+        assert storage.patch_story(1, None, "Apple") == invalid
+        assert storage.delete_story("1") == invalid
+
+
+class TestBackends:
+    def test_ping(self, storage):
+        assert storage.ping() == {"success": True}
+
+    def test_postgres_ping_reports_unreachable_database(self):
+        pool = ConnectionPool({"host": "127.0.0.1", "port": 1, "connect_timeout": 1},
+                              lazy=True)
+        res = PostgresStorage(pool).ping()
+        assert res["error"]
+        assert res["message"]
+
+    def test_file_storage_survives_restart(self, tmp_path):
+        path = str(tmp_path / "stories.json")
+        storage = FileStorage(FileStore(path))
+        storage.insert_story("https://example.com/a", "Apple")
+        storage.close()
+
+        storage = FileStorage(FileStore(path))
+        assert storage.insert_story("https://example.com/a/", "Apple again")["error"]
+        storage.close()
+
+    def test_sqlite_uses_wal(self, tmp_path):
+        storage = SQLiteStorage(str(tmp_path / "stories.db"))
+        assert storage.stats()["journal_mode"] == "wal"
+        storage.close()
+
+    def test_sqlite_adds_hot_score_to_old_databases(self, tmp_path):
+        path = str(tmp_path / "stories.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE stories (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT,"
+                     " url TEXT, normalized_url TEXT UNIQUE, score INTEGER NOT NULL DEFAULT 0,"
+                     " created_at TEXT, updated_at TEXT)")
+        conn.execute("INSERT INTO stories (title, url, normalized_url, score, created_at,"
+                     " updated_at) VALUES ('Old', 'https://example.com/old',"
+                     " 'https://example.com/old', 10, '2024-01-01T00:00:00.000000',"
+                     " '2024-01-01T00:00:00.000000')")
+        conn.commit()
+        conn.close()
+
+        storage = SQLiteStorage(path)
+        row, = storage.list_stories("", "hot_score", True)
+        assert row["hot_score"] == pytest.approx(hot_score(10, datetime.datetime(2024, 1, 1)))
+        storage.close()
+
+    def test_sqlite_connection_per_thread(self, tmp_path):
+        storage = SQLiteStorage(str(tmp_path / "stories.db"))
+        threads = [threading.Thread(target=storage.insert_story,
+                                    args=(f"https://example.com/{i}", f"Story {i}"))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(storage.list_stories("", "", False)) == 4
+        assert storage.stats()["connections"] == 5
+        storage.close()
+
+
+class TestVoteCompaction:
+    """Compaction and story deletes lock stories and votes in the same order,
+    so either one waits for the other instead of deadlocking, and votes are
+    only held up while the compacted partition is dropped."""
+
+    def seed(self, pool):
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("INSERT INTO stories (title, url) VALUES ('Kept', 'https://a.example'), "
+                        "('Deleted', 'https://b.example') RETURNING id")
+            kept, deleted = [row[0] for row in cur.fetchall()]
+            cur.execute("INSERT INTO votes (story_id, vote, created_at) "
+                        "SELECT id, 'u', '2020-01-05' FROM stories, generate_series(1, 3)")
+            conn.commit()
+            ensure_vote_partitions(conn, datetime.datetime.now())
+            reconcile_scores(conn)
+        return kept, deleted
+
+    def run_in_thread(self, func, *args):
+        result = {}
+
+        def target():
+            try:
+                result["value"] = func(*args)
+            except Exception as err:
+                result["error"] = err
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join(0.3)
+        assert thread.is_alive(), result
+        return thread, result
+
+    def rollups(self, pool):
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT story_id, ups FROM vote_rollups ORDER BY story_id")
+            rows = cur.fetchall()
+            assert reconcile_scores(conn, fix=False) == []
+        return rows
+
+    def test_compaction_waits_for_delete_in_flight(self, postgres_storage):
+        pool = postgres_storage.pool
+        kept, deleted = self.seed(pool)
+        with pool.connection() as deleting, pool.connection() as compacting:
+            QUERIES.execute(deleting.cursor(), "delete_story", (deleted,))
+            thread, result = self.run_in_thread(compact_votes, compacting,
+                                                datetime.datetime(2020, 2, 1))
+            deleting.commit()
+            thread.join(10)
+        assert result == {"value": [{"partition": "votes_2020_01", "votes": 3, "rollups": 1}]}
+        assert self.rollups(pool) == [(kept, 3)]
+
+    def test_delete_waits_for_compaction_in_flight(self, postgres_storage):
+        pool = postgres_storage.pool
+        kept, deleted = self.seed(pool)
+        with pool.connection() as blocking, pool.connection() as compacting, \
+                pool.connection() as deleting:
+            # Holds compaction up at its rollup insert, after it has taken its
+            # locks on votes, while the delete starts.
+            blocking.cursor().execute("LOCK TABLE vote_rollups IN SHARE MODE")
+            compaction, compacted = self.run_in_thread(compact_votes, compacting,
+                                                       datetime.datetime(2020, 2, 1))
+            delete, deleted_result = self.run_in_thread(delete_story, deleting, deleted)
+            blocking.rollback()
+            compaction.join(10)
+            delete.join(10)
+        assert compacted == {"value": [{"partition": "votes_2020_01", "votes": 6, "rollups": 2}]}
+        assert deleted_result == {"value": {"success": True,
+                                            "message": "Delete story successful."}}
+        assert self.rollups(pool) == [(kept, 3)]
+
+    def test_votes_recorded_while_rolling_up(self, postgres_storage):
+        pool = postgres_storage.pool
+        kept, _ = self.seed(pool)
+        with pool.connection() as blocking, pool.connection() as compacting, \
+                pool.connection() as voting:
+            # Holds compaction up at its rollup insert, after it has locked
+            # the partition, while a vote is recorded.
+            blocking.cursor().execute("LOCK TABLE vote_rollups IN SHARE MODE")
+            compaction, compacted = self.run_in_thread(compact_votes, compacting,
+                                                       datetime.datetime(2020, 2, 1))
+            voting.cursor().execute("SET lock_timeout = '2s'")
+            try:
+                voted = apply_votes(voting, [(kept, "u")])
+            finally:
+                blocking.rollback()
+                compaction.join(10)
+            voting.cursor().execute("RESET lock_timeout")
+        assert voted == {"success": True, "found": [True]}
+        assert compacted == {"value": [{"partition": "votes_2020_01", "votes": 6, "rollups": 2}]}
+
+    def test_drop_retried_after_failure(self, postgres_storage):
+        pool = postgres_storage.pool
+        kept, deleted = self.seed(pool)
+        with pool.connection() as blocking, pool.connection() as compacting:
+            blocking.cursor().execute("SELECT COUNT(*) FROM votes")
+            compacting.cursor().execute("SET lock_timeout = '100ms'")
+            with pytest.raises(psycopg2.errors.LockNotAvailable):
+                compact_votes(compacting, datetime.datetime(2020, 2, 1))
+            compacting.cursor().execute("RESET lock_timeout")
+            blocking.rollback()
+            # Rolled up but still attached: reconcile_scores counts it once.
+            assert reconcile_scores(compacting, fix=False) == []
+            assert compact_votes(compacting, datetime.datetime(2020, 2, 1)) == [
+                {"partition": "votes_2020_01", "votes": 6, "rollups": 2}]
+        assert self.rollups(pool) == [(kept, 3), (deleted, 3)]
@@ -0,0 +1,83 @@
+"""Tests for vote_buffer module"""
+
+# pylint: skip-file
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from vote_buffer import VoteBuffer, VoteBufferFullError
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+class TestFlushing:
+    def test_flushes_on_interval(self):
+        flush = MagicMock(side_effect=len)
+        buffer = VoteBuffer(flush, batch_size=100, flush_interval=0.01)
+        buffer.submit(1, "u")
+        buffer.submit(2, "d")
+        wait_for(lambda: buffer.stats()["written"] == 2)
+        flush.assert_called_once_with([(1, "u"), (2, "d")])
+        buffer.close()
+
+    def test_flushes_full_batches(self):
+        batches = []
+        buffer = VoteBuffer(lambda votes: batches.append(votes) or len(votes),
+                            batch_size=3, flush_interval=60)
+        for i in range(7):
+            buffer.submit(i, "u")
+        wait_for(lambda: len(batches) == 2)
+        assert [len(batch) for batch in batches] == [3, 3]
+        buffer.close()
+        assert len(batches) == 3
+        assert buffer.stats()["flush_size_max"] == 3
+
+    def test_records_skipped_votes(self):
+        buffer = VoteBuffer(lambda votes: len(votes) - 1, flush_interval=0.01)
+        buffer.submit(1, "u")
+        buffer.close()
+        stats = buffer.stats()
+        assert stats["written"] == 0
+        assert stats["skipped"] == 1
+        assert stats["flushes"] == 1
+
+    def test_retries_failed_flush(self):
+        flush = MagicMock(side_effect=[RuntimeError("db down"), 1])
+        buffer = VoteBuffer(flush, flush_interval=0.01)
+        buffer.submit(1, "u")
+        wait_for(lambda: buffer.stats()["written"] == 1)
+        assert buffer.stats()["flush_errors"] == 1
+        buffer.close()
+
+
+class TestBackpressure:
+    def test_rejects_when_full(self):
+        release = threading.Event()
+        buffer = VoteBuffer(lambda votes: release.wait(2) and len(votes),
+                            batch_size=1, flush_interval=0.01, max_size=1)
+        buffer.submit(1, "u")
+        wait_for(lambda: buffer.stats()["queued"] == 0)
+        buffer.submit(2, "u")
+        with pytest.raises(VoteBufferFullError):
+            buffer.submit(3, "u", timeout=0.01)
+        assert buffer.stats()["rejected"] == 1
+        release.set()
+        buffer.close()
+        assert buffer.stats()["written"] == 2
+
+    def test_rejects_after_close(self):
+        buffer = VoteBuffer(len)
+        buffer.close()
+        with pytest.raises(VoteBufferFullError):
+            buffer.submit(1, "u")
+
+    def test_bad_sizes(self):
+        with pytest.raises(ValueError):
+            VoteBuffer(len, batch_size=10, max_size=5)
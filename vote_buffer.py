@@ -0,0 +1,142 @@
+"""Write-behind buffer for votes.
+Votes are acknowledged once they are queued in memory and a background thread
+writes them to the database in batches, either every flush interval or as
+soon as a full batch has built up."""
+
+import threading
+import time
+from collections import deque
+
+
+class VoteBufferFullError(Exception):
+    """Raised when a vote cannot be queued because the buffer is full or closed."""
+
+
+class VoteBuffer:
+    """Bounded queue of (story id, vote) pairs flushed by a background thread.
+    flush is called with a list of votes and returns how many were written."""
+
+    def __init__(self, flush, batch_size: int = 500, flush_interval: float = 0.05,
+                 max_size: int = 10000):
+        if batch_size < 1 or max_size < batch_size:
+            raise ValueError("Buffer sizes must satisfy 1 <= batch_size <= max_size.")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._flush = flush
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._accepted = 0
+        self._rejected = 0
+        self._written = 0
+        self._skipped = 0
+        self._lost = 0
+        self._flushes = 0
+        self._flush_errors = 0
+        self._flush_size_last = 0
+        self._flush_size_max = 0
+        self._flush_latency_total = 0.0
+        self._flush_latency_last = 0.0
+        self._flush_latency_max = 0.0
+        self._thread = threading.Thread(target=self._run, name="vote-buffer", daemon=True)
+        self._thread.start()
+
+    def submit(self, story_id: int, vote: str, timeout: float = 0.0) -> None:
+        """Queues a vote, waiting up to timeout seconds for space when the buffer is full."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._closed and len(self._queue) >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._closed or len(self._queue) >= self.max_size:
+                self._rejected += 1
+                raise VoteBufferFullError("Vote buffer is full." if not self._closed
+                                          else "Vote buffer is closed.")
+            self._queue.append((story_id, vote))
+            self._accepted += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stops accepting votes and waits for the queued ones to be flushed."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        """Returns queue depth plus flush size and latency metrics."""
+        with self._cond:
+            return {"queued": len(self._queue),
+                    "max_size": self.max_size,
+                    "batch_size": self.batch_size,
+                    "flush_interval": self.flush_interval,
+                    "accepted": self._accepted,
+                    "rejected": self._rejected,
+                    "written": self._written,
+                    "skipped": self._skipped,
+                    "lost": self._lost,
+                    "flushes": self._flushes,
+                    "flush_errors": self._flush_errors,
+                    "flush_size_last": self._flush_size_last,
+                    "flush_size_max": self._flush_size_max,
+                    "flush_size_avg": (round((self._written + self._skipped) / self._flushes, 2)
+                                       if self._flushes else 0),
+                    "flush_latency_last": round(self._flush_latency_last, 6),
+                    "flush_latency_max": round(self._flush_latency_max, 6),
+                    "flush_latency_avg": (round(self._flush_latency_total / self._flushes, 6)
+                                          if self._flushes else 0)}
+
+    def _run(self) -> None:
+        """Background loop that takes batches off the queue and flushes them."""
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and len(self._queue) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._queue:
+                    if self._closed:
+                        return
+                    continue
+                batch = [self._queue.popleft()
+                         for _ in range(min(self.batch_size, len(self._queue)))]
+                closing = self._closed
+                self._cond.notify_all()
+
+            if not self._flush_batch(batch):
+                with self._cond:
+                    if closing:
+                        self._lost += len(batch)
+                    else:
+                        self._queue.extendleft(reversed(batch))
+                time.sleep(self.flush_interval)
+
+    def _flush_batch(self, batch: list[tuple[int, str]]) -> bool:
+        """Writes one batch, recording its size and latency; returns False on failure."""
+        start = time.perf_counter()
+        try:
+            written = self._flush(batch)
+        except Exception as err:  # pylint: disable=broad-except
+            print(err)
+            print("Could not flush vote buffer.")
+            with self._cond:
+                self._flush_errors += 1
+            return False
+
+        latency = time.perf_counter() - start
+        with self._cond:
+            self._flushes += 1
+            self._written += written
+            self._skipped += len(batch) - written
+            self._flush_size_last = len(batch)
+            self._flush_size_max = max(self._flush_size_max, len(batch))
+            self._flush_latency_last = latency
+            self._flush_latency_max = max(self._flush_latency_max, latency)
+            self._flush_latency_total += latency
+        return True